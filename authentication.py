@@ -1,56 +1,146 @@
 
-from passlib.context import CryptContext
-from dotenv import dotenv_values
+from dataclasses import dataclass
+from functools import lru_cache
+from datetime import datetime, timedelta, timezone
+from typing import Optional
 import jwt
-from models import User
+from models import User, Business
+from cache import TTLCache
+from worker_pool import WorkerPool
+from settings import settings
 from fastapi import status
 from fastapi.exceptions import HTTPException
 
-# Load environment variables
-config_credentials = dotenv_values(".env")
+BCRYPT_ROUNDS = settings.get_int("BCRYPT_ROUNDS", 12)
+REHASH_ON_LOGIN = settings.get_flag("REHASH_ON_LOGIN", True)
+ACCESS_TOKEN_EXPIRE_MINUTES = settings.get_int("ACCESS_TOKEN_EXPIRE_MINUTES", 60)
 
+# Users change rarely, so authenticated requests reuse a recent copy instead of a query each.
+# Entries are dropped from the post_save(User) hook; the TTL bounds staleness across nodes.
+user_cache = TTLCache(
+    maxsize=settings.get_int("USER_CACHE_SIZE", 10000),
+    ttl=settings.get_float("USER_CACHE_TTL", 60),
+)
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+@lru_cache(maxsize=None)
+def password_context():
+    # passlib and its bcrypt backend load on the first login or signup, not at boot.
+    from passlib.context import CryptContext
+
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return password_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return password_context().hash(password)
 
-async def verify_token(token: str):
+def verify_and_update_password(plain_password, hashed_password):
+    return password_context().verify_and_update(plain_password, hashed_password)
+
+hash_pool = WorkerPool(
+    name="bcrypt",
+    kind=settings.get("HASH_EXECUTOR") or "thread",
+    workers=settings.get_int("HASH_WORKERS", 0) or None,
+    max_concurrency=settings.get_int("HASH_MAX_CONCURRENCY", 0) or None,
+)
+
+async def hash_password_async(password: str) -> str:
+    return await hash_pool.run(get_password_hash, password)
+
+
+def credentials_exception():
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+@dataclass(frozen=True)
+class TokenClaims:
+    id: int
+    username: str
+    is_verified: bool
+    business_id: Optional[int]
+
+
+def create_access_token(user: User, business_id: Optional[int]) -> str:
+    now = datetime.now(timezone.utc)
+    payload = {
+        "id": user.id,
+        "username": user.username,
+        "verified": user.is_verified,
+        "business_id": business_id,
+        "iat": now,
+        "exp": now + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
+    }
+    return jwt.encode(payload, settings["SECRET_KEY"], algorithm="HS256")
+
+
+def decode_access_token(token: str) -> TokenClaims:
+    """Authorize from the token alone; no database access."""
     try:
-        payload = jwt.decode(token, config_credentials["SECRET_KEY"],algorithms= ["HS256"])
-        user = await User.get(id=payload.get("id"))
-        
-    except:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
-            headers={"WWW-Authenticate": "Bearer"},
+        payload = jwt.decode(
+            token, settings["SECRET_KEY"], algorithms=["HS256"], options={"require": ["exp", "iat", "id"]}
+        )
+        return TokenClaims(
+            id=int(payload["id"]),
+            username=payload.get("username", ""),
+            is_verified=bool(payload.get("verified", False)),
+            business_id=payload.get("business_id"),
         )
-        
+    except (jwt.PyJWTError, TypeError, ValueError):
+        raise credentials_exception()
+
+
+async def get_user_by_id(user_id: int) -> Optional[User]:
+    user = user_cache.get(user_id)
+    if user is None:
+        user = await User.get_or_none(id=user_id)
+        if user is not None:
+            user_cache.set(user_id, user)
+    return user
+
+
+async def verify_token(token: str):
+    try:
+        payload = jwt.decode(token, settings["SECRET_KEY"], algorithms=["HS256"])
+        user = await get_user_by_id(int(payload.get("id")))
+    except (jwt.PyJWTError, TypeError, ValueError):
+        raise credentials_exception()
+
+    if user is None:
+        raise credentials_exception()
     return user
 
 
 async def authenticate_user(username: str, password: str):
     user = await User.get_or_none(username=username)
+    if not user:
+        return None
 
-    if user and verify_password(password, user.password):
-        return user
+    verified, new_hash = await hash_pool.run(verify_and_update_password, password, user.password)
+    if not verified:
+        return None
 
-    return None
+    # The configured cost factor changed since this hash was made; upgrade it while we have the password.
+    if new_hash and REHASH_ON_LOGIN:
+        await User.filter(id=user.id).update(password=new_hash)
+        user.password = new_hash
+        user_cache.pop(user.id)
+
+    return user
 
 async def token_generator(username: str, password: str):
     user = await authenticate_user(username, password)
 
     if user:
-        return jwt.encode({"id": user.id}, config_credentials["SECRET_KEY"], algorithm="HS256")
+        business = await Business.get_or_none(owner_id=user.id).only("id")
+        return create_access_token(user, business.id if business else None)
 
     raise HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Incorrect username or password",
         headers={"WWW-Authenticate": "Bearer"},
     ) 
-
-    
\ No newline at end of file
@@ -0,0 +1,85 @@
+"""
+Outbound email throughput benchmark.
+
+Queues N verification emails in the outbox of a scratch SQLite database built by the migrations
+and drains them through the local SMTP sink, once with the batched outbox worker (one pooled
+connection) and once the old way (a fresh SMTP session per message).
+
+    python -m benchmarks.bench_email --messages 1000 --latency 0.002
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+
+import aiosmtplib
+from tortoise import Tortoise
+
+import migrate
+from benchmarks._common import Timer, report
+from database import build_tortoise_config
+from email_utils import render_verification_email, send_verification_email
+from mail_queue import OutboxWorker, SMTPConnection
+from models import OutboundEmail, User
+from smtp_sink import SMTPSink
+
+
+async def outbox_run(sink: SMTPSink, messages: int, batch_size: int) -> dict:
+    for i in range(messages):
+        user = User(id=i + 1, username=f"user{i}", email=f"user{i}@example.com")
+        await send_verification_email(email_to=user.email, instance=user)
+
+    connection = SMTPConnection(sink.host, sink.port, None, None, start_tls=False)
+    worker = OutboxWorker(connection, batch_size=batch_size)
+    sessions_before = sink.sessions
+    with Timer() as timer:
+        while await worker.run_once():
+            pass
+    await connection.close()
+    return {
+        "sent": worker.sent,
+        "seconds": round(timer.elapsed, 3),
+        "messages_per_second": round(worker.sent / timer.elapsed, 1),
+        "smtp_sessions": sink.sessions - sessions_before,
+    }
+
+
+async def per_message_run(sink: SMTPSink, messages: int) -> dict:
+    sessions_before = sink.sessions
+    with Timer() as timer:
+        for i in range(messages):
+            message = render_verification_email(f"user{i}@example.com", {"id": i + 1, "username": f"user{i}"})
+            await aiosmtplib.send(message, hostname=sink.host, port=sink.port, start_tls=False)
+    return {
+        "sent": messages,
+        "seconds": round(timer.elapsed, 3),
+        "messages_per_second": round(messages / timer.elapsed, 1),
+        "smtp_sessions": sink.sessions - sessions_before,
+    }
+
+
+async def main(args):
+    workdir = tempfile.mkdtemp()
+    await Tortoise.init(config=build_tortoise_config(f"sqlite://{os.path.join(workdir, 'bench.sqlite3')}"))
+    await migrate.upgrade()
+    sink = await SMTPSink(latency=args.latency).start()
+    try:
+        results = {
+            "messages": args.messages,
+            "smtp_reply_latency_ms": args.latency * 1000,
+            "outbox_batched": await outbox_run(sink, args.messages, args.batch_size),
+            "per_message_session": await per_message_run(sink, args.messages),
+            "outbox_pending": await OutboundEmail.filter(status="pending").count(),
+        }
+    finally:
+        await sink.stop()
+        await Tortoise.close_connections()
+    report(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.0, help="artificial delay per SMTP reply, in seconds")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,101 @@
+"""
+Micro-benchmark: cost of rendering one verification email body.
+
+Compares the old per-call f-string document, a plain Jinja render per message, and the
+precompiled templates now used by email_utils (HTML and text parts).
+
+    python -m benchmarks.bench_email_render --iterations 100000
+"""
+import argparse
+import timeit
+
+from benchmarks._common import report
+from email_utils import VERIFICATION_HTML, VERIFICATION_TEXT, render_verification_email
+from rendering import jinja_environment
+
+TOKEN = "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9.eyJpZCI6NDIsInVzZXJuYW1lIjoiYWxpY2UifQ.signature"
+
+
+def legacy_fstring(token: str) -> str:
+    # The document send_verification_email used to rebuild on every call.
+    return f"""
+        <!DOCTYPE html>
+        <html >
+        <head>
+            <style>
+                body {{
+                    font-family: Arial, sans-serif;
+                    background-color: #f5f5f5;
+                    margin: 0;
+                    padding: 0;
+                }}
+                .container {{
+                    max-width: 600px;
+                    margin: 0 auto;
+                    padding: 20px;
+                    background-color: #fff;
+                    border-radius: 5px;
+                    box-shadow: 0 2px 4px rgba(0, 0, 0, 0.1);
+                }}
+                h1 {{
+                    color: #333;
+                    font-size: 24px;
+                    margin-bottom: 20px;
+                }}
+                p {{
+                    color: #666;
+                    font-size: 16px;
+                    margin-bottom: 20px;
+                }}
+                .button {{
+                    display: inline-block;
+                    padding: 10px 20px;
+                    background-color: #007BFF;
+                    color: #fff;
+                    text-decoration: none;
+                    border-radius: 5px;
+                }}
+                .button:hover {{
+                    background-color: #0056b3;
+                }}
+            </style>
+        </head>
+        <body>
+            <div class="container">
+                <h1>Account Verification</h1>
+                <p>Click the button below to verify your account:</p>
+                <a href="https://e-com-fastapi.onrender.com/verify/{token}" class="button">Verify Account</a>
+            </div>
+        </body>
+        </html>
+    """
+
+
+def per_call(fn, iterations: int) -> float:
+    return round(timeit.timeit(fn, number=iterations) / iterations * 1e6, 3)
+
+
+def main(args):
+    url = "https://e-com-fastapi.onrender.com/verify/" + TOKEN
+    html_template = jinja_environment().get_template("email/verification.html")
+    text_template = jinja_environment().get_template("email/verification.txt")
+    n = args.iterations
+    report({
+        "iterations": n,
+        "us_per_email": {
+            "legacy_fstring_html": per_call(lambda: legacy_fstring(TOKEN), n),
+            "jinja_render_html_and_text": per_call(
+                lambda: (html_template.render(verify_url=url), text_template.render(verify_url=url)), n
+            ),
+            "precompiled_html_and_text": per_call(lambda: (VERIFICATION_HTML.render(url), VERIFICATION_TEXT.render(url)), n),
+            "full_message_with_token": per_call(
+                lambda: render_verification_email("alice@example.com", {"id": 42, "username": "alice"}), n // 10 or 1
+            ),
+        },
+    })
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=50000)
+    main(parser.parse_args())
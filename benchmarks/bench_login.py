@@ -0,0 +1,65 @@
+"""
+Login throughput benchmark.
+
+Hammers POST /token with concurrent logins while a separate probe keeps calling an
+unrelated endpoint, so you can see whether bcrypt work is stalling the event loop.
+
+    uvicorn main:app --port 8000
+    python -m benchmarks.bench_login --username alice --password secret --concurrency 32
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from benchmarks._common import report, summarize
+
+
+async def login_worker(client: httpx.AsyncClient, args, deadline: float, latencies: list, failures: list):
+    form = {"username": args.username, "password": args.password}
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        response = await client.post("/token", data=form)
+        latencies.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            failures.append(response.status_code)
+
+
+async def probe_worker(client: httpx.AsyncClient, path: str, deadline: float, latencies: list):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        await client.get(path)
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(0.01)
+
+
+async def main(args):
+    logins, probes, failures = [], [], []
+    limits = httpx.Limits(max_connections=args.concurrency + 1)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60) as client:
+        start = time.perf_counter()
+        deadline = start + args.duration
+        await asyncio.gather(
+            probe_worker(client, args.probe_path, deadline, probes),
+            *(login_worker(client, args, deadline, logins, failures) for _ in range(args.concurrency)),
+        )
+        elapsed = time.perf_counter() - start
+
+    report({
+        "concurrency": args.concurrency,
+        "token": summarize(logins, elapsed),
+        "token_failures": len(failures),
+        "probe": {"path": args.probe_path, **summarize(probes, elapsed)},
+    })
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--username", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--probe-path", default="/")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,135 @@
+"""
+Search benchmark against a synthetic catalog.
+
+Builds a scratch SQLite database through the migrations, bulk-loads --products products spread
+over --businesses businesses, rebuilds the full-text index, then times ranked index lookups
+(strict and relaxed/typo queries) against the LIKE scan clients would otherwise need.
+
+    python -m benchmarks.bench_search --products 1000000 --queries 200
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import tempfile
+import time
+
+from tortoise import Tortoise
+from tortoise.connection import connections
+
+import migrate
+from benchmarks._common import report, summarize
+from database import build_tortoise_config
+from search import rebuild_index, search_product_ids
+
+WORDS = [
+    "wireless", "cotton", "leather", "organic", "steel", "smart", "classic", "portable", "vintage", "premium",
+    "headphones", "shirt", "wallet", "phone", "watch", "kettle", "lamp", "backpack", "sneakers", "blender",
+    "charger", "mattress", "sofa", "camera", "jacket", "saree", "panjabi", "rice", "honey", "tea",
+]
+CATEGORIES = ["electronics", "fashion", "home", "grocery", "beauty", "sports", "toys", "books"]
+CITIES = ["Dhaka", "Chittagong", "Khulna", "Rajshahi", "Sylhet", "Barisal", "Rangpur", "Comilla"]
+SYLLABLES = ["ka", "ri", "mo", "ta", "len", "shu", "bra", "no", "vik", "del", "sa", "po", "zen", "tur", "mi", "gor"]
+# Real words first, then made-up brand/model words; picked with Zipf-like weights so a few
+# terms are very common and most are rare, as in a real catalog.
+VOCABULARY = WORDS + list(dict.fromkeys(
+    "".join(random.Random(i).sample(SYLLABLES, 3)) for i in range(4000)
+))
+CUM_WEIGHTS = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(VOCABULARY))))
+
+
+def words(k: int) -> list:
+    return random.choices(VOCABULARY, cum_weights=CUM_WEIGHTS, k=k)
+
+
+def typo(word: str) -> str:
+    # Swap two adjacent letters anywhere in the word.
+    i = random.randrange(len(word) - 1)
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+
+async def seed(products: int, businesses: int, batch: int = 20000):
+    connection = connections.get("default")
+    now = "2024-01-01 00:00:00"
+    await connection.execute_many(
+        'INSERT INTO "user" ("id", "username", "email", "password", "is_verified", "join_data") VALUES (?, ?, ?, ?, 0, ?)',
+        [[i, f"bench{i}", f"bench{i}@example.com", "x", now] for i in range(1, businesses + 1)],
+    )
+    await connection.execute_many(
+        'INSERT INTO "business" ("id", "businessname", "city", "region", "business_description", "logo", "owner_id") '
+        "VALUES (?, ?, ?, 'Unspecified', ?, 'default.jpg', ?)",
+        [
+            [i, f"{words(1)[0].title()} Mart {i}", random.choice(CITIES), " ".join(words(6)), i]
+            for i in range(1, businesses + 1)
+        ],
+    )
+    for start in range(1, products + 1, batch):
+        await connection.execute_many(
+            'INSERT INTO "product" ("id", "product_name", "category", "original_price", "new_price", '
+            '"percentage_discount", "offer_expires", "product_image", "date_published", "business_id") '
+            "VALUES (?, ?, ?, '100.00', '50.00', 50, '2030-01-01', 'productDefault.jpg', ?, ?)",
+            [
+                [i, " ".join(words(3)), random.choice(CATEGORIES), now, random.randint(1, businesses)]
+                for i in range(start, min(start + batch, products + 1))
+            ],
+        )
+
+
+async def time_queries(queries, fn) -> dict:
+    latencies = []
+    start = time.perf_counter()
+    for q in queries:
+        t0 = time.perf_counter()
+        await fn(q)
+        latencies.append(time.perf_counter() - t0)
+    return summarize(latencies, time.perf_counter() - start)
+
+
+async def like_scan(q: str):
+    # Every term must appear in some column, as in the strict full-text match.
+    terms = q.split()
+    term_match = '(p."product_name" LIKE ? OR p."category" LIKE ? OR b."businessname" LIKE ? OR b."city" LIKE ? OR b."business_description" LIKE ?)'
+    await connections.get("default").execute_query(
+        'SELECT p."id" FROM "product" p JOIN "business" b ON b."id" = p."business_id" '
+        f'WHERE {" AND ".join([term_match] * len(terms))} ORDER BY p."date_published" DESC, p."id" DESC LIMIT 20',
+        [f"%{term}%" for term in terms for _ in range(5)],
+    )
+
+
+async def main(args):
+    workdir = tempfile.mkdtemp(prefix="bench_search_")
+    await Tortoise.init(config=build_tortoise_config(f"sqlite://{os.path.join(workdir, 'search.sqlite3')}"))
+    try:
+        await migrate.upgrade()
+        t0 = time.perf_counter()
+        await seed(args.products, args.businesses)
+        seeded = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        await rebuild_index()
+        indexed = time.perf_counter() - t0
+
+        strict = [" ".join(words(random.randint(1, 2))) for _ in range(args.queries)]
+        prefixes = [word[:4] for word in words(args.queries)]
+        typos = [typo(word) for word in words(args.queries) if len(word) > 4]
+        search = lambda q: search_product_ids(q, 20, 0)
+        report({
+            "products": args.products,
+            "seed_s": round(seeded, 2),
+            "index_build_s": round(indexed, 2),
+            "fts_strict": await time_queries(strict, search),
+            "fts_prefix": await time_queries(prefixes, search),
+            "fts_typo_relaxed": await time_queries(typos, search),
+            "like_scan": await time_queries(strict[: args.like_queries], like_scan),
+        })
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=1_000_000)
+    parser.add_argument("--businesses", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--like-queries", type=int, default=20, help="the scan is slow; time fewer of them")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,178 @@
+"""
+Cold-start benchmark: import time, time until N workers are ready, first-request latency and memory.
+
+Imports main in fresh interpreters (--repeat times) and lists the slowest modules by self time.
+Then starts the app with --workers workers twice, once under `uvicorn --workers` (each worker
+imports everything itself) and once under serve.py (one preloaded image, forked), against a
+scratch SQLite database with placeholder credentials. For each it reports when the first and
+the last worker answered /ready, the latency of the first requests (a login and a product page,
+which pull in whatever was deferred), and total RSS and PSS of the process tree (Linux only).
+
+    python -m benchmarks.bench_startup --workers 4
+"""
+import argparse
+import asyncio
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks._common import report, summarize
+from benchmarks.bench_streaming import free_port
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORT_PROBE = "import time; start = time.perf_counter(); import main; print(time.perf_counter() - start)"
+
+
+def run_python(workdir: str, *args: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *args], cwd=workdir, env={**os.environ, "PYTHONPATH": REPO_DIR},
+        capture_output=True, text=True, check=True,
+    )
+
+
+def import_times(workdir: str, repeat: int, top: int) -> dict:
+    seconds = [float(run_python(workdir, "-c", IMPORT_PROBE).stdout) for _ in range(repeat)]
+    # -X importtime lines: "import time: <self us> | <cumulative us> | <indented module>"
+    profile = run_python(workdir, "-X", "importtime", "-c", "import main").stderr
+    modules = []
+    for line in profile.splitlines():
+        match = re.match(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)", line)
+        if match:
+            modules.append((int(match[1]), int(match[2]), match[4]))
+    cumulative = {name: total for _, total, name in modules}
+    return {
+        "median_ms": round(statistics.median(seconds) * 1000, 1),
+        "min_ms": round(min(seconds) * 1000, 1),
+        "slowest_self_ms": {name: round(own / 1000, 1) for own, _, name in sorted(modules, reverse=True)[:top]},
+        "cumulative_ms": {
+            name: round(cumulative[name] / 1000, 1)
+            for name in ("fastapi", "tortoise", "models", "authentication", "email_utils", "passlib.context", "jinja2", "PIL")
+            if name in cumulative
+        },
+    }
+
+
+def process_tree(pid: int) -> list:
+    pids, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        pids.append(current)
+        try:
+            with open(f"/proc/{current}/task/{current}/children") as children:
+                pending.extend(int(child) for child in children.read().split())
+        except OSError:
+            pass
+    return pids
+
+
+def memory_mb(pid: int) -> dict:
+    totals = {"Rss": 0, "Pss": 0}
+    for member in process_tree(pid):
+        try:
+            with open(f"/proc/{member}/smaps_rollup") as rollup:
+                for line in rollup:
+                    key = line.split(":", 1)[0]
+                    if key in totals:
+                        totals[key] += int(line.split()[1])
+        except OSError:
+            pass
+    return {"rss_mb": round(totals["Rss"] / 1024, 1), "pss_mb": round(totals["Pss"] / 1024, 1)}
+
+
+async def measure_server(workdir: str, command: list, workers: int, requests: int, timeout: float) -> dict:
+    start = time.perf_counter()
+    server = subprocess.Popen(command, cwd=workdir, env={**os.environ, "PYTHONPATH": REPO_DIR})
+    try:
+        ready_at = {}
+        # No keep-alive: every probe is a new connection, so it can land on any worker.
+        limits = httpx.Limits(max_keepalive_connections=0)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{command[command.index('--port') + 1]}", limits=limits) as client:
+            while len(ready_at) < workers and time.perf_counter() - start < timeout:
+                try:
+                    response = await client.get("/ready")
+                    if response.status_code == 200:
+                        ready_at.setdefault(response.json()["pid"], time.perf_counter() - start)
+                        continue
+                except httpx.TransportError:
+                    pass
+                await asyncio.sleep(0.02)
+            if not ready_at:
+                raise SystemExit(f"{command[2]} never became ready")
+
+            first = {}
+            for name, send in (
+                ("login", lambda: client.post("/token", data={"username": "bench1", "password": "bench-password"})),
+                ("product", lambda: client.get("/products/1")),
+            ):
+                latencies = []
+                for _ in range(requests):
+                    request_start = time.perf_counter()
+                    (await send()).raise_for_status()
+                    latencies.append(time.perf_counter() - request_start)
+                first[name] = {"first_ms": round(latencies[0] * 1000, 1), **summarize(latencies, sum(latencies))}
+        return {
+            "first_worker_ready_s": round(min(ready_at.values()), 3),
+            "all_workers_ready_s": round(max(ready_at.values()), 3) if len(ready_at) == workers else None,
+            "workers_seen": len(ready_at),
+            "first_requests": first,
+            **memory_mb(server.pid),
+        }
+    finally:
+        server.terminate()
+        server.wait()
+
+
+async def seed(workdir: str):
+    run_python(workdir, "-c", (
+        "import asyncio\n"
+        "from tortoise import Tortoise\n"
+        "import migrate\n"
+        "from database import build_tortoise_config\n"
+        "from authentication import get_password_hash\n"
+        "from benchmarks.dataset import seed\n"
+        "async def run():\n"
+        "    await Tortoise.init(config=build_tortoise_config())\n"
+        "    await migrate.upgrade()\n"
+        "    await seed(20, 20, 200, get_password_hash('bench-password'))\n"
+        "    await Tortoise.close_connections()\n"
+        "asyncio.run(run())\n"
+    ))
+
+
+async def main(args):
+    workdir = tempfile.mkdtemp(prefix="bench_startup_")
+    with open(os.path.join(workdir, ".env"), "w") as env:
+        env.write(
+            f"DATABASE_URL=sqlite://{os.path.join(workdir, 'bench.sqlite3')}\nEMAIL=bench@example.com\n"
+            "PASSWORD=unused\nSECRET_KEY=bench\nSMTP_HOST=127.0.0.1\nSMTP_PORT=2\n"
+            # Cheap hashes, so login latency shows the import and warm-up cost rather than bcrypt.
+            "BCRYPT_ROUNDS=4\nRATE_LIMIT_ENABLED=false\n"
+        )
+    os.makedirs(os.path.join(workdir, "static", "images"), exist_ok=True)
+    await seed(workdir)
+
+    results = {"workers": args.workers, "import": import_times(workdir, args.repeat, args.top)}
+    port = free_port()
+    launchers = {
+        "uvicorn_workers": [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--workers", str(args.workers), "--log-level", "warning"],
+        "preload_fork": [sys.executable, os.path.join(REPO_DIR, "serve.py"), "--port", str(port), "--workers", str(args.workers), "--log-level", "warning"],
+    }
+    for name, command in launchers.items():
+        results[name] = await measure_server(workdir, command, args.workers, args.requests, args.timeout)
+    report(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters timed importing main")
+    parser.add_argument("--top", type=int, default=10, help="slowest modules to list")
+    parser.add_argument("--requests", type=int, default=20, help="requests per endpoint after startup")
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds to wait for every worker")
+    asyncio.run(main(parser.parse_args()))
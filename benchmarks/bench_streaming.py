@@ -0,0 +1,129 @@
+"""
+Buffered vs streamed list responses: time-to-first-byte, total time and server peak RSS.
+
+Seeds --rows users and businesses into a scratch SQLite database, then for each mode starts a
+fresh uvicorn server against it (placeholder credentials, no mail is sent), downloads the list
+once and reads the server's peak RSS (VmHWM, Linux only) before stopping it.
+
+    python -m benchmarks.bench_streaming --rows 100000
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+from tortoise import Tortoise
+from tortoise.connection import connections
+
+import migrate
+from benchmarks._common import report
+from database import build_tortoise_config
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+async def seed(db_path: str, rows: int, batch: int = 20000):
+    await Tortoise.init(config=build_tortoise_config(f"sqlite://{db_path}"))
+    try:
+        await migrate.upgrade()
+        connection = connections.get("default")
+        for start in range(1, rows + 1, batch):
+            ids = range(start, min(start + batch, rows + 1))
+            await connection.execute_many(
+                'INSERT INTO "user" ("id", "username", "email", "password", "is_verified", "join_data") '
+                "VALUES (?, ?, ?, ?, 1, '2024-01-01 00:00:00+00:00')",
+                [[i, f"bench{i}", f"bench{i}@example.com", "$2b$12$" + "x" * 53] for i in ids],
+            )
+            await connection.execute_many(
+                'INSERT INTO "business" ("id", "businessname", "city", "region", "business_description", "logo", "owner_id") '
+                "VALUES (?, ?, 'Dhaka', 'Dhaka', 'Synthetic business used by the streaming benchmark', 'default.jpg', ?)",
+                [[i, f"bench-shop-{i}", i] for i in ids],
+            )
+    finally:
+        await Tortoise.close_connections()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def peak_rss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmHWM:"):
+                return round(int(line.split()[1]) / 1024, 1)
+    return 0.0
+
+
+def measure(workdir: str, path: str) -> dict:
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=workdir,
+        env={**os.environ, "PYTHONPATH": REPO_DIR},
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=300) as client:
+            for _ in range(300):
+                try:
+                    client.get("/")
+                    break
+                except httpx.TransportError:
+                    time.sleep(0.1)
+            idle_rss = peak_rss_mb(server.pid)
+
+            start = time.perf_counter()
+            first_byte = None
+            size = 0
+            with client.stream("GET", path) as response:
+                for chunk in response.iter_raw():
+                    if first_byte is None:
+                        first_byte = time.perf_counter() - start
+                    size += len(chunk)
+            total = time.perf_counter() - start
+            return {
+                "ttfb_ms": round(first_byte * 1000, 1),
+                "total_ms": round(total * 1000, 1),
+                "bytes": size,
+                "rss_after_startup_mb": idle_rss,
+                "peak_rss_mb": peak_rss_mb(server.pid),
+            }
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main(args):
+    workdir = tempfile.mkdtemp(prefix="bench_streaming_")
+    db_path = os.path.join(workdir, "bench.sqlite3")
+    with open(os.path.join(workdir, ".env"), "w") as env:
+        env.write(
+            f"DATABASE_URL=sqlite://{db_path}\nEMAIL=bench@example.com\nPASSWORD=unused\n"
+            "SECRET_KEY=bench\nSMTP_HOST=127.0.0.1\nSMTP_PORT=2\n"
+        )
+    os.makedirs(os.path.join(workdir, "static"), exist_ok=True)
+    asyncio.run(seed(db_path, args.rows))
+
+    results = {"rows": args.rows}
+    for endpoint in args.endpoint:
+        results[endpoint] = {
+            "buffered": measure(workdir, f"/{endpoint}/"),
+            "streamed": measure(workdir, f"/{endpoint}/?stream=true"),
+        }
+    report(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--endpoint", action="append", choices=["users", "business"], help="default: both")
+    args = parser.parse_args()
+    args.endpoint = args.endpoint or ["users", "business"]
+    main(args)
@@ -0,0 +1,73 @@
+"""
+Image upload throughput benchmark.
+
+Uploads a synthetic photo to POST /uploadfiles/product/{id} at several concurrency levels
+and reports uploads per second and latency percentiles for each level.
+
+    uvicorn main:app --port 8000
+    python -m benchmarks.bench_uploads --username alice --password secret --product-id 1
+"""
+import argparse
+import asyncio
+import io
+import time
+
+import httpx
+from PIL import Image
+
+from benchmarks._common import report, summarize
+
+
+def synthetic_image(width: int, height: int, fmt: str) -> bytes:
+    # A gradient compresses like a real photo far better than a flat colour does.
+    img = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    buffer = io.BytesIO()
+    img.save(buffer, fmt)
+    return buffer.getvalue()
+
+
+async def run_level(client: httpx.AsyncClient, args, payload: bytes, concurrency: int) -> dict:
+    latencies, failures = [], []
+    remaining = args.uploads
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            response = await client.post(
+                f"/uploadfiles/product/{args.product_id}",
+                files={"file": (f"bench.{args.format.lower()}", payload)},
+            )
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                failures.append(response.status_code)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return {"concurrency": concurrency, "failures": len(failures), **summarize(latencies, time.perf_counter() - start)}
+
+
+async def main(args):
+    payload = synthetic_image(args.width, args.height, "JPEG" if args.format.lower() in ("jpg", "jpeg") else args.format)
+    async with httpx.AsyncClient(base_url=args.url, timeout=120) as client:
+        token = await client.post("/token", data={"username": args.username, "password": args.password})
+        token.raise_for_status()
+        client.headers["Authorization"] = f"Bearer {token.json()['access_token']}"
+        levels = [await run_level(client, args, payload, c) for c in args.concurrency]
+
+    report({"image": f"{args.width}x{args.height} {args.format}", "bytes": len(payload), "levels": levels})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--username", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--product-id", type=int, required=True)
+    parser.add_argument("--uploads", type=int, default=50, help="uploads per concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--width", type=int, default=3000)
+    parser.add_argument("--height", type=int, default=2000)
+    parser.add_argument("--format", default="jpg")
+    asyncio.run(main(parser.parse_args()))
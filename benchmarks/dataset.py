@@ -0,0 +1,98 @@
+"""
+Synthetic catalog for benchmarks: users, one business per owner, products spread over them.
+
+Rows go in with raw multi-row executes (the ORM's per-object overhead would dominate at millions
+of products), then the search index and catalog aggregates are rebuilt from them. Ids are
+deterministic: user i owns business i, and product p belongs to business (p - 1) % businesses + 1.
+"""
+import random
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from tortoise.connection import connections
+
+from catalog_io import discount_percentage
+from catalog_stats import rebuild_stats
+from database import placeholders
+from search import rebuild_index
+
+WORDS = [
+    "wireless", "cotton", "leather", "organic", "steel", "smart", "classic", "portable", "vintage", "premium",
+    "headphones", "shirt", "wallet", "phone", "watch", "kettle", "lamp", "backpack", "sneakers", "blender",
+    "charger", "mattress", "sofa", "camera", "jacket", "saree", "panjabi", "rice", "honey", "tea",
+]
+CATEGORIES = ["electronics", "fashion", "home", "grocery", "beauty", "sports", "toys", "books"]
+CITIES = ["Dhaka", "Chittagong", "Khulna", "Rajshahi", "Sylhet", "Barisal", "Rangpur", "Comilla"]
+PASSWORD = "bench-password"
+
+
+def business_of(product_id: int, businesses: int) -> int:
+    return (product_id - 1) % businesses + 1
+
+
+def _sqlite_value(value):
+    # What Tortoise writes on SQLite: decimals as text, datetimes as naive UTC text.
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.astimezone(timezone.utc).replace(tzinfo=None).isoformat(" ")
+    return value
+
+
+async def _insert(table: str, columns: list, rows: list, batch: int = 10000):
+    connection = connections.get("default")
+    dialect = connection.capabilities.dialect
+    if dialect == "sqlite":
+        rows = [[_sqlite_value(value) for value in row] for row in rows]
+    names = ", ".join(f'"{column}"' for column in columns)
+    sql = f'INSERT INTO "{table}" ({names}) VALUES ({placeholders(dialect, len(columns))})'
+    for start in range(0, len(rows), batch):
+        await connection.execute_many(sql, rows[start:start + batch])
+
+
+async def seed(users: int, businesses: int, products: int, password_hash: str, seed: int = 0):
+    """Insert the dataset into the (migrated, empty) default connection."""
+    rng = random.Random(seed)
+    dialect = connections.get("default").capabilities.dialect
+    now = datetime.now(timezone.utc)
+
+    await _insert(
+        "user", ["id", "username", "email", "password", "is_verified", "join_data"],
+        [[i, f"bench{i}", f"bench{i}@example.com", password_hash, True, now] for i in range(1, users + 1)],
+    )
+    await _insert(
+        "business", ["id", "businessname", "city", "region", "business_description", "logo", "owner_id"],
+        [
+            [i, f"{rng.choice(WORDS).title()} Mart {i}", rng.choice(CITIES), "unspecified",
+             " ".join(rng.sample(WORDS, 5)), "default.jpg", i]
+            for i in range(1, min(businesses, users) + 1)
+        ],
+    )
+    businesses = min(businesses, users)
+    for start in range(1, products + 1, 50000):
+        rows = []
+        for i in range(start, min(start + 50000, products + 1)):
+            original = Decimal(rng.randint(100, 10000))
+            new = (original * Decimal(rng.randint(30, 100)) / 100).quantize(Decimal("0.01"))
+            expires = now + timedelta(days=rng.randint(-30, 90))
+            rows.append([
+                i, " ".join(rng.sample(WORDS, 3)), rng.choice(CATEGORIES), original, new,
+                discount_percentage(original, new), expires, expires > now, "productDefault.jpg",
+                now - timedelta(minutes=products - i), business_of(i, businesses),
+            ])
+        await _insert(
+            "product",
+            ["id", "product_name", "category", "original_price", "new_price", "percentage_discount",
+             "offer_expires", "offer_active", "product_image", "date_published", "business_id"],
+            rows,
+        )
+
+    if dialect == "postgres":
+        # Explicit ids leave the sequences behind; later inserts through the API need them moved on.
+        for table in ("user", "business", "product"):
+            await connections.get("default").execute_script(
+                f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), COALESCE(MAX(\"id\"), 1)) FROM \"{table}\""
+            )
+
+    await rebuild_index()
+    await rebuild_stats()
@@ -0,0 +1,412 @@
+"""
+Whole-API load and regression suite.
+
+Seeds a synthetic catalog (benchmarks/dataset.py) into a scratch SQLite database, or an empty
+PostgreSQL one given with --db-url, then drives the app with concurrent clients through each
+scenario for --duration seconds: catalog browsing with cursors, product detail, search, /user/me,
+login storms, registration (verification mail goes to a local SMTP sink) and image uploads. The
+app runs either in this process over httpx's ASGI transport, which isolates app and ORM cost, or
+as a uvicorn server, which adds the HTTP stack and allows --workers. The load generator shares
+the machine with the server, so compare runs made on the same hardware only.
+
+Results (throughput, latency percentiles, error counts) are printed or written with --output.
+--baseline compares p99 and throughput with a stored run and exits 1 on a regression past
+--tolerance; --save-baseline stores the run as the new baseline.
+
+    python -m benchmarks.suite --products 200000 --output results.json
+    python -m benchmarks.suite --mode uvicorn --workers 4 --scenario browse --scenario detail
+    python -m benchmarks.suite --save-baseline benchmarks/baseline.json
+    python -m benchmarks.suite --baseline benchmarks/baseline.json --tolerance 0.2
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+from PIL import Image
+
+from benchmarks._common import report, summarize
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class State:
+    """What the scenarios share: dataset shape, logged-in owners and pre-built upload payloads."""
+
+    def __init__(self, args, tokens: Dict[int, str], payloads: List[bytes]):
+        self.users = args.users
+        self.businesses = min(args.businesses, args.users)
+        self.products = args.products
+        self.tokens = tokens
+        self.payloads = payloads
+        self.registered = 0
+        self.run_id = f"{int(time.time()) % 100000}{random.randrange(1000):03d}"
+
+
+Scenario = Callable[[httpx.AsyncClient, State, random.Random, dict], Awaitable[httpx.Response]]
+
+
+def hot_product(state: State, rng: random.Random) -> int:
+    # Most detail views land on a small set of popular products, the rest anywhere in the catalog.
+    if rng.random() < 0.8:
+        return state.products - rng.randrange(min(1000, state.products))
+    return rng.randint(1, state.products)
+
+
+async def browse(client, state, rng, session):
+    from benchmarks.dataset import CATEGORIES
+
+    params = session.get("next")
+    if params is None or session.get("pages", 0) >= 5:
+        params = {"limit": 20}
+        if rng.random() < 0.5:
+            params["category"] = rng.choice(CATEGORIES)
+        if rng.random() < 0.3:
+            params["active_offers_only"] = "true"
+        session["pages"] = 0
+    response = await client.get("/products/", params=params)
+    cursor = response.json().get("next_cursor") if response.status_code == 200 else None
+    session["next"] = {**params, "cursor": cursor} if cursor else None
+    session["pages"] += 1
+    return response
+
+
+async def detail(client, state, rng, session):
+    return await client.get(f"/products/{hot_product(state, rng)}")
+
+
+async def search(client, state, rng, session):
+    from benchmarks.dataset import WORDS
+
+    terms = rng.sample(WORDS, rng.choice((1, 1, 2)))
+    if rng.random() < 0.3:
+        # Typing in progress: the last word is a prefix.
+        terms[-1] = terms[-1][:rng.randint(3, len(terms[-1]))]
+    return await client.get("/products/search", params={"q": " ".join(terms)})
+
+
+async def me(client, state, rng, session):
+    owner = rng.choice(list(state.tokens))
+    return await client.post("/user/me", headers={"Authorization": f"Bearer {state.tokens[owner]}"})
+
+
+async def login_storm(client, state, rng, session):
+    from benchmarks.dataset import PASSWORD
+
+    user = rng.randint(1, state.users)
+    return await client.post("/token", data={"username": f"bench{user}", "password": PASSWORD})
+
+
+async def register(client, state, rng, session):
+    state.registered += 1
+    name = f"reg{state.run_id}x{state.registered}"
+    return await client.post("/users/", json={"username": name, "email": f"{name}@example.com", "password": "bench-password"})
+
+
+async def upload(client, state, rng, session):
+    owner = rng.choice(list(state.tokens))
+    # Products of business b are b, b + businesses, b + 2 * businesses, ...
+    product_id = owner + state.businesses * rng.randrange(max(1, (state.products - owner) // state.businesses + 1))
+    return await client.post(
+        f"/uploadfiles/product/{product_id}",
+        headers={"Authorization": f"Bearer {state.tokens[owner]}"},
+        files={"file": ("bench.jpg", rng.choice(state.payloads), "image/jpeg")},
+    )
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    "browse": browse,
+    "detail": detail,
+    "search": search,
+    "me": me,
+    "login_storm": login_storm,
+    "register": register,
+    "upload": upload,
+}
+
+
+def upload_payloads(count: int, width: int, height: int) -> List[bytes]:
+    """Distinct JPEGs, so uploads are not all deduplicated by content hash after the first."""
+    rng = random.Random(0)
+    base = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    payloads = []
+    for _ in range(count):
+        img = base.copy()
+        for _ in range(16):
+            img.putpixel((rng.randrange(width), rng.randrange(height)), tuple(rng.randrange(256) for _ in range(3)))
+        buffer = io.BytesIO()
+        img.save(buffer, "JPEG", quality=90)
+        payloads.append(buffer.getvalue())
+    return payloads
+
+
+async def run_scenario(client: httpx.AsyncClient, state: State, name: str, concurrency: int, duration: float) -> dict:
+    scenario = SCENARIOS[name]
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    deadline = time.perf_counter() + duration
+
+    async def worker(number: int):
+        rng = random.Random(f"{name}-{number}")
+        session: dict = {}
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                status = (await scenario(client, state, rng, session)).status_code
+            except httpx.HTTPError as exc:
+                status = type(exc).__name__
+            latencies.append(time.perf_counter() - start)
+            statuses[status] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(number) for number in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    errors = sum(count for status, count in statuses.items() if not (isinstance(status, int) and status < 400))
+    return {
+        "concurrency": concurrency,
+        **summarize(latencies, elapsed),
+        "errors": errors,
+        "error_rate": round(errors / len(latencies), 4) if latencies else 0.0,
+        "statuses": {str(status): count for status, count in sorted(statuses.items(), key=str)},
+    }
+
+
+async def run_all(client: httpx.AsyncClient, args, state: State) -> Dict[str, dict]:
+    results = {}
+    for name in args.scenario:
+        concurrency = args.concurrency
+        if name in ("login_storm", "register", "upload"):
+            # CPU-bound on the server's worker pools; more clients only queue.
+            concurrency = min(concurrency, args.heavy_concurrency)
+        if args.warmup:
+            await run_scenario(client, state, name, concurrency, args.warmup)
+        results[name] = await run_scenario(client, state, name, concurrency, args.duration)
+        print(f"{name}: {results[name]['rps']} req/s, p99 {results[name]['p99_ms']} ms, {results[name]['errors']} errors", file=sys.stderr)
+    return results
+
+
+async def prepare_state(client: httpx.AsyncClient, args) -> State:
+    from benchmarks.dataset import PASSWORD
+
+    tokens = {}
+    for owner in range(1, min(args.accounts, args.users, args.businesses) + 1):
+        response = await client.post("/token", data={"username": f"bench{owner}", "password": PASSWORD})
+        response.raise_for_status()
+        tokens[owner] = response.json()["access_token"]
+    state = State(args, tokens, upload_payloads(args.upload_variants, args.image_width, args.image_height))
+    # Seeded product images go through the real upload path, derivatives and all.
+    rng = random.Random("images")
+    for _ in range(args.images):
+        response = await upload(client, state, rng, {})
+        response.raise_for_status()
+    return state
+
+
+def write_env(workdir: str, db_url: str, smtp_port: int, extra: List[str]):
+    # Placeholder credentials only; all mail goes to the local sink.
+    lines = [
+        f"DATABASE_URL={db_url}",
+        "EMAIL=bench@example.com",
+        "PASSWORD=unused",
+        "SECRET_KEY=bench",
+        "SMTP_HOST=127.0.0.1",
+        f"SMTP_PORT={smtp_port}",
+        "SMTP_STARTTLS=false",
+        "SMTP_USE_CREDENTIALS=false",
+        # Every simulated client shares one address; per-client limits would cap the whole run.
+        "RATE_LIMIT_ENABLED=false",
+        *extra,
+    ]
+    with open(os.path.join(workdir, ".env"), "w") as env:
+        env.write("\n".join(lines) + "\n")
+    for directory in ("static/images/products", "static/images/business"):
+        os.makedirs(os.path.join(workdir, directory), exist_ok=True)
+
+
+async def seed_database(args):
+    from tortoise import Tortoise
+    from tortoise.connection import connections
+
+    import migrate
+    from authentication import get_password_hash
+    from benchmarks.dataset import PASSWORD, seed
+    from database import build_tortoise_config
+
+    await Tortoise.init(config=build_tortoise_config())
+    try:
+        await migrate.upgrade()
+        _, rows = await connections.get("default").execute_query('SELECT COUNT(*) AS "users" FROM "user"')
+        if rows[0]["users"]:
+            if args.skip_seed:
+                return
+            raise SystemExit("The database already has users; point --db-url at an empty one or pass --skip-seed.")
+        # Every seeded user shares one hash; bcrypt at the configured cost would otherwise dominate seeding.
+        await seed(args.users, args.businesses, args.products, get_password_hash(PASSWORD))
+    finally:
+        await Tortoise.close_connections()
+
+
+async def run_inprocess(args) -> Dict[str, dict]:
+    import main
+
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            state = await prepare_state(client, args)
+            return await run_all(client, args, state)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def run_uvicorn(args, workdir: str) -> Dict[str, dict]:
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--workers", str(args.workers),
+         "--log-level", "warning", "--no-access-log"],
+        cwd=workdir,
+        env={**os.environ, "PYTHONPATH": REPO_DIR},
+    )
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=120, limits=limits) as client:
+            for _ in range(600):
+                with contextlib.suppress(httpx.TransportError):
+                    await client.get("/")
+                    break
+                await asyncio.sleep(0.1)
+            else:
+                raise SystemExit("uvicorn did not come up")
+            state = await prepare_state(client, args)
+            return await run_all(client, args, state)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Human-readable regressions of `current` against `baseline`; empty when within tolerance."""
+    regressions = []
+    for name, result in current["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if base is None:
+            continue
+        if result["p99_ms"] > base["p99_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p99 {base['p99_ms']} -> {result['p99_ms']} ms")
+        if result["rps"] < base["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {base['rps']} -> {result['rps']} req/s")
+        if result["error_rate"] > base.get("error_rate", 0.0) + 0.01:
+            regressions.append(f"{name}: error rate {base.get('error_rate', 0.0)} -> {result['error_rate']}")
+    return regressions
+
+
+async def main(args) -> int:
+    from smtp_sink import SMTPSink
+
+    workdir = tempfile.mkdtemp(prefix="bench_suite_")
+    db_url = args.db_url or f"sqlite://{os.path.join(workdir, 'bench.sqlite3')}"
+    sink = await SMTPSink().start()
+    try:
+        write_env(workdir, db_url, sink.port, args.env)
+        # The app reads .env and writes uploads relative to the working directory.
+        os.chdir(workdir)
+        sys.path.insert(0, REPO_DIR)
+        await seed_database(args)
+        scenarios = await run_inprocess(args) if args.mode == "inprocess" else await run_uvicorn(args, workdir)
+    finally:
+        await sink.stop()
+
+    results = {
+        "meta": {
+            "mode": args.mode,
+            "workers": args.workers if args.mode == "uvicorn" else None,
+            "database": db_url.split(":", 1)[0],
+            "users": args.users,
+            "businesses": args.businesses,
+            "products": args.products,
+            "images": args.images,
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        },
+        "scenarios": scenarios,
+        "emails_delivered": len(sink.messages),
+    }
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+    else:
+        report(results)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as output:
+            json.dump(results, output, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as stored:
+            baseline = json.load(stored)
+        shape = ("mode", "database", "products", "concurrency")
+        if any(baseline["meta"].get(key) != results["meta"][key] for key in shape):
+            print(f"warning: baseline was recorded with different {'/'.join(shape)}", file=sys.stderr)
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            return 1
+        print(f"no regressions against {args.baseline} (tolerance {args.tolerance:.0%})", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["inprocess", "uvicorn"], default="inprocess")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--db-url", help="empty database to seed (default: scratch SQLite file)")
+    parser.add_argument("--skip-seed", action="store_true", help="reuse a database seeded by an earlier run")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--businesses", type=int, default=500)
+    parser.add_argument("--products", type=int, default=100_000)
+    parser.add_argument("--images", type=int, default=0, help="product images uploaded before measuring")
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS), help="default: all")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--heavy-concurrency", type=int, default=8, help="cap for login, registration and upload")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per scenario")
+    parser.add_argument("--warmup", type=float, default=2.0, help="unmeasured seconds before each scenario")
+    parser.add_argument("--accounts", type=int, default=20, help="owners logged in for authenticated scenarios")
+    parser.add_argument("--upload-variants", type=int, default=32)
+    parser.add_argument("--image-width", type=int, default=1600)
+    parser.add_argument("--image-height", type=int, default=1200)
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="extra .env setting for the app")
+    parser.add_argument("--output", help="write results JSON here instead of stdout")
+    parser.add_argument("--baseline", help="results JSON to compare against")
+    parser.add_argument("--save-baseline", help="also write the results here as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative p99/throughput change")
+    args = parser.parse_args()
+    args.scenario = args.scenario or list(SCENARIOS)
+    sys.exit(asyncio.run(main(args)))
@@ -0,0 +1,56 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+
+_MISSING = object()
+
+
+class TTLCache:
+    """In-process LRU cache whose entries also expire `ttl` seconds after being stored."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # Bumped on every invalidation, so a reader that loaded data before one can avoid caching it.
+        self.generation = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key, _MISSING)
+        if entry is _MISSING or entry[0] < time.monotonic():
+            if entry is not _MISSING:
+                del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any, generation: int = None) -> None:
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return
+        if generation is not None and generation != self.generation:
+            return
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        self.generation += 1
+        self._data.pop(key, None)
+
+    def discard_where(self, predicate: Callable[[Hashable, Any], bool]) -> None:
+        self.generation += 1
+        for key in [key for key, (_, value) in self._data.items() if predicate(key, value)]:
+            del self._data[key]
+
+    def clear(self) -> None:
+        self.generation += 1
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -0,0 +1,218 @@
+"""
+Streaming bulk import and export of products as CSV or NDJSON.
+
+Imports are parsed as the request body arrives, validated against ProductIn and written with
+bulk_create in transactional chunks; rows that fail validation or their chunk's insert are
+reported by row number without stopping the import. Exports walk the table in id order in
+fixed-size batches, so memory stays flat whatever the catalog size.
+"""
+import codecs
+import csv
+import io
+import json
+from datetime import datetime
+from decimal import Decimal
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Set, Tuple
+
+from fastapi import HTTPException, Request
+from pydantic import ValidationError
+from tortoise.exceptions import BaseORMException
+from tortoise.transactions import in_transaction
+
+from models import Product, product_pydantic_in
+from offers import is_active, offer_scheduler
+from settings import settings
+
+IMPORT_CHUNK_SIZE = settings.get_int("IMPORT_CHUNK_SIZE", 1000)
+EXPORT_BATCH_SIZE = settings.get_int("EXPORT_BATCH_SIZE", 1000)
+MAX_REPORTED_ERRORS = 1000
+
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+EXPORT_FIELDS = [
+    "id", "product_name", "category", "original_price", "new_price", "percentage_discount",
+    "offer_expires", "offer_active", "product_image", "date_published", "business_id",
+]
+# Columns an export carries that an import derives itself; dropped so exports re-import as-is.
+DERIVED_FIELDS = {"id", "percentage_discount", "offer_active", "product_image", "date_published", "business_id"}
+
+
+def discount_percentage(original_price: Decimal, new_price: Decimal) -> int:
+    return round((new_price / original_price) * 100) if original_price > 0 else 0
+
+
+def request_format(request: Request, format: Optional[str]) -> str:
+    """The explicit ?format=, else whatever the Content-Type names."""
+    if format is None:
+        content_type = request.headers.get("content-type", "").split(";")[0].strip()
+        format = next((name for name, media_type in FORMATS.items() if media_type == content_type), None)
+    if format not in FORMATS:
+        raise HTTPException(status_code=415, detail="Send text/csv or application/x-ndjson, or pass ?format=csv|ndjson")
+    return format
+
+
+async def _lines(request: Request) -> AsyncIterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    pending = ""
+    async for chunk in request.stream():
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+async def _csv_rows(request: Request) -> AsyncIterator[Tuple[int, object]]:
+    header = None
+    record, number = "", 0
+    async for line in _lines(request):
+        number += 1
+        record = f"{record}\n{line}" if record else line
+        # A quoted field may span lines; the record is complete once its quotes balance.
+        if record.count('"') % 2:
+            continue
+        text, record = record, ""
+        if not text.strip():
+            continue
+        values = next(csv.reader([text]))
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        if len(values) != len(header):
+            yield number, f"Expected {len(header)} columns, got {len(values)}"
+            continue
+        # Empty cells fall back to the model defaults.
+        yield number, {name: value for name, value in zip(header, values) if value != ""}
+    if record:
+        yield number, "Unterminated quoted field"
+
+
+async def _ndjson_rows(request: Request) -> AsyncIterator[Tuple[int, object]]:
+    number = 0
+    async for line in _lines(request):
+        number += 1
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            yield number, f"Invalid JSON: {exc}"
+            continue
+        yield number, row if isinstance(row, dict) else "Expected a JSON object"
+
+
+def _validate(row: dict) -> dict:
+    data = product_pydantic_in.model_validate({k: v for k, v in row.items() if k not in DERIVED_FIELDS})
+    product = data.model_dump(exclude_unset=True)
+    product["percentage_discount"] = discount_percentage(product["original_price"], product["new_price"])
+    return product
+
+
+def _describe(exc: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(map(str, error['loc'])) or 'row'}: {error['msg']}" for error in exc.errors())
+
+
+class ImportReport:
+    def __init__(self):
+        self.created = 0
+        self.failed = 0
+        self.errors: List[Dict[str, object]] = []
+        # Categories that received products, for refreshing their aggregates afterwards.
+        self.categories: Set[str] = set()
+        # Ids of the products created, for indexing them afterwards.
+        self.product_ids: List[int] = []
+
+    def error(self, row: int, message: str):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row, "error": message})
+
+    def as_dict(self) -> dict:
+        return {
+            "created": self.created,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+        }
+
+
+async def _write_chunk(chunk: List[Tuple[int, dict]], business_id: int, report: ImportReport):
+    products = [Product(**product, business_id=business_id) for _, product in chunk]
+    for product in products:
+        product.offer_active = is_active(product.offer_expires)
+    try:
+        async with in_transaction("default"):
+            # bulk_create does not hand back ids, but every id it assigns is above the current maximum.
+            last_id = await Product.all().order_by("-id").first().values_list("id", flat=True)
+            await Product.bulk_create(products)
+            created_ids = await Product.filter(id__gt=last_id or 0, business_id=business_id).values_list("id", flat=True)
+    except BaseORMException as exc:
+        for number, _ in chunk:
+            report.error(number, f"Not saved, its batch failed: {exc}")
+    else:
+        report.created += len(chunk)
+        report.product_ids.extend(created_ids)
+        report.categories.update(product.category for product in products)
+        for expires in {product.offer_expires for product in products if product.offer_active}:
+            offer_scheduler.schedule(expires)
+
+
+async def import_products(request: Request, format: str, business_id: int) -> ImportReport:
+    report = ImportReport()
+    rows = _csv_rows(request) if format == "csv" else _ndjson_rows(request)
+    chunk: List[Tuple[int, dict]] = []
+    async for number, row in rows:
+        if isinstance(row, str):
+            report.error(number, row)
+            continue
+        try:
+            chunk.append((number, _validate(row)))
+        except ValidationError as exc:
+            report.error(number, _describe(exc))
+            continue
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            await _write_chunk(chunk, business_id, report)
+            chunk = []
+    if chunk:
+        await _write_chunk(chunk, business_id, report)
+    return report
+
+
+def _cell(value) -> object:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return f"{value:.2f}"
+    return value
+
+
+def _csv_line(values: Iterable[object]) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerow(values)
+    return buffer.getvalue()
+
+
+def _ndjson_line(row: dict) -> str:
+    return json.dumps({field: _cell(row[field]) for field in EXPORT_FIELDS}) + "\n"
+
+
+async def export_products(format: str, **filters) -> AsyncIterator[str]:
+    """Yield the export one batch at a time, fetching EXPORT_BATCH_SIZE rows per query (keyset on id)."""
+    if format == "csv":
+        yield _csv_line(EXPORT_FIELDS)
+    last_id = 0
+    while True:
+        batch = await (
+            Product.filter(id__gt=last_id, **filters).order_by("id").limit(EXPORT_BATCH_SIZE).values(*EXPORT_FIELDS)
+        )
+        if format == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer, lineterminator="\n")
+            writer.writerows([_cell(row[field]) for field in EXPORT_FIELDS] for row in batch)
+            yield buffer.getvalue()
+        else:
+            yield "".join(_ndjson_line(row) for row in batch)
+        if len(batch) < EXPORT_BATCH_SIZE:
+            return
+        last_id = batch[-1]["id"]
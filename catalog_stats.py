@@ -0,0 +1,148 @@
+"""
+Materialized per-category and per-business catalog aggregates (table created by migration 0004).
+
+Prices are what a product sells for: new_price while its offer is active, original_price once
+offers.py has flagged the offer as expired. percentage_discount is new_price as a share of
+original_price, so an expired offer counts as 100.
+
+New products are folded in as deltas. Updates, deletes and expiring offers can move a group's
+min/max price or newest date in ways a delta cannot undo, so they recompute just the groups they
+touched.
+`rebuild` recomputes everything and reports how many groups had drifted:
+
+    python catalog_stats.py rebuild
+"""
+import argparse
+import asyncio
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from tortoise import BaseDBAsyncClient, Tortoise, timezone
+from tortoise.connection import connections
+from tortoise.transactions import in_transaction
+
+from database import placeholders, read_connection
+
+# Group key expression per scope; business ids are stored as text next to category names.
+SCOPES = {"category": '"category"', "business": 'CAST("business_id" AS TEXT)'}
+COLUMNS = '"scope", "key", "product_count", "min_price", "max_price", "discount_sum", "newest_published"'
+PRICE = 'CASE WHEN "offer_active" THEN "new_price" ELSE "original_price" END'
+DISCOUNT = 'CASE WHEN "offer_active" THEN "percentage_discount" ELSE 100 END'
+
+
+def _aggregates(dialect: str, scope: str) -> str:
+    price = f"CAST({PRICE} AS REAL)" if dialect == "sqlite" else PRICE
+    return (
+        f"SELECT '{scope}', {SCOPES[scope]}, COUNT(*), MIN({price}), MAX({price}), "
+        f'SUM({DISCOUNT}), MAX("date_published") FROM "product"'
+    )
+
+
+async def record_products_added(product_ids: Iterable[int]):
+    """Fold newly inserted products into their groups."""
+    ids = list(product_ids)
+    if not ids:
+        return
+    connection = connections.get("default")
+    dialect = connection.capabilities.dialect
+    least, greatest = ("MIN", "MAX") if dialect == "sqlite" else ("LEAST", "GREATEST")
+    for scope in SCOPES:
+        await connection.execute_query(
+            f'INSERT INTO "catalog_stats" ({COLUMNS}) {_aggregates(dialect, scope)} '
+            f'WHERE "id" IN ({placeholders(dialect, len(ids))}) GROUP BY {SCOPES[scope]} '
+            'ON CONFLICT ("scope", "key") DO UPDATE SET '
+            '"product_count" = "catalog_stats"."product_count" + EXCLUDED."product_count", '
+            f'"min_price" = {least}("catalog_stats"."min_price", EXCLUDED."min_price"), '
+            f'"max_price" = {greatest}("catalog_stats"."max_price", EXCLUDED."max_price"), '
+            '"discount_sum" = "catalog_stats"."discount_sum" + EXCLUDED."discount_sum", '
+            f'"newest_published" = {greatest}("catalog_stats"."newest_published", EXCLUDED."newest_published")',
+            ids,
+        )
+
+
+async def _refresh_group(connection: BaseDBAsyncClient, dialect: str, scope: str, key: str):
+    first, second = ("?", "?") if dialect == "sqlite" else ("$1", "$2")
+    await connection.execute_query(f'DELETE FROM "catalog_stats" WHERE "scope" = {first} AND "key" = {second}', [scope, key])
+    await connection.execute_query(
+        f'INSERT INTO "catalog_stats" ({COLUMNS}) {_aggregates(dialect, scope)} '
+        f"WHERE {SCOPES[scope]} = {first} GROUP BY {SCOPES[scope]}",
+        [key],
+    )
+
+
+async def refresh_stats(categories: Iterable[str] = (), business_ids: Iterable[int] = ()):
+    """Recompute the given groups from the product table; groups left without products disappear."""
+    groups = [("category", category) for category in set(categories)]
+    groups += [("business", str(business_id)) for business_id in set(business_ids)]
+    if not groups:
+        return
+    async with in_transaction("default") as connection:
+        dialect = connection.capabilities.dialect
+        for scope, key in groups:
+            await _refresh_group(connection, dialect, scope, key)
+
+
+def _row(row: dict) -> dict:
+    newest = row["newest_published"]
+    if isinstance(newest, str):
+        # SQLite hands back the stored text, naive like every datetime Tortoise writes there.
+        newest = timezone.make_aware(datetime.fromisoformat(newest))
+    count = row["product_count"]
+    return {
+        "product_count": count,
+        "min_price": row["min_price"],
+        "max_price": row["max_price"],
+        "avg_discount": round(float(row["discount_sum"]) / count, 2) if count else None,
+        "newest_published": newest,
+    }
+
+
+async def fetch_stats(scope: str, key: Optional[str] = None, limit: int = 100, offset: int = 0) -> List[Tuple[str, dict]]:
+    """(key, stats) pairs for one scope, largest groups first."""
+    connection = read_connection()
+    dialect = connection.capabilities.dialect
+    filters: Dict[str, object] = {"scope": scope}
+    if key is not None:
+        filters["key"] = key
+    marks = placeholders(dialect, len(filters) + 2).split(", ")
+    where = " AND ".join(f'"{column}" = {mark}' for column, mark in zip(filters, marks))
+    _, rows = await connection.execute_query(
+        f'SELECT * FROM "catalog_stats" WHERE {where} ORDER BY "product_count" DESC, "key" '
+        f"LIMIT {marks[-2]} OFFSET {marks[-1]}",
+        [*filters.values(), limit, offset],
+    )
+    return [(row["key"], _row(row)) for row in rows]
+
+
+async def rebuild_stats() -> Dict[str, int]:
+    """Recompute every group from scratch. Returns the group count and how many had drifted."""
+    async with in_transaction("default") as connection:
+        dialect = connection.capabilities.dialect
+        _, stored = await connection.execute_query(f'SELECT {COLUMNS} FROM "catalog_stats"')
+        await connection.execute_query('DELETE FROM "catalog_stats"')
+        for scope in SCOPES:
+            await connection.execute_query(
+                f'INSERT INTO "catalog_stats" ({COLUMNS}) {_aggregates(dialect, scope)} GROUP BY {SCOPES[scope]}'
+            )
+        _, fresh = await connection.execute_query(f'SELECT {COLUMNS} FROM "catalog_stats"')
+    before = {(row["scope"], row["key"]): tuple(dict(row).values()) for row in stored}
+    after = {(row["scope"], row["key"]): tuple(dict(row).values()) for row in fresh}
+    drifted = sum(1 for group in before.keys() | after.keys() if before.get(group) != after.get(group))
+    return {"groups": len(after), "drifted": drifted}
+
+
+async def main(command: str):
+    from database import build_tortoise_config
+
+    await Tortoise.init(config=build_tortoise_config())
+    try:
+        result = await rebuild_stats()
+        print(f"rebuilt {result['groups']} groups, {result['drifted']} had drifted")
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["rebuild"])
+    asyncio.run(main(parser.parse_args().command))
@@ -0,0 +1,117 @@
+from decimal import Decimal
+from typing import Callable, Optional, Tuple
+
+from tortoise import BaseDBAsyncClient
+from tortoise.backends.base.client import TransactionalDBClient
+from tortoise.backends.base.config_generator import expand_db_url
+from tortoise.connection import connections
+from tortoise.expressions import F, RawSQL
+
+from settings import settings
+
+DEFAULT_DB_URL = "sqlite://db.sqlite3"
+
+# Applied to every SQLite connection as "PRAGMA key=value". WAL lets readers run alongside the
+# writer; synchronous=NORMAL is durable across app crashes in WAL mode (only an OS crash can
+# lose the last commits); busy_timeout waits for the write lock instead of failing immediately.
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,
+    "temp_store": "MEMORY",
+    "foreign_keys": "ON",
+}
+
+
+def _setting(name: str, default: str) -> str:
+    return settings.get(name, default)
+
+
+class ReadWriteRouter:
+    """Sends reads to the "reader" connection and writes to "default".
+
+    Reads issued inside a transaction stay on "default" so they see the transaction's own writes.
+    """
+
+    def db_for_read(self, model) -> Optional[str]:
+        if isinstance(connections.get("default"), TransactionalDBClient):
+            return "default"
+        return "reader"
+
+    def db_for_write(self, model) -> Optional[str]:
+        return "default"
+
+
+def placeholders(dialect: str, count: int, start: int = 1) -> str:
+    """Comma-separated query parameters: "?" for SQLite, "$n" (numbered from `start`) for PostgreSQL."""
+    if dialect == "sqlite":
+        return ", ".join("?" * count)
+    return ", ".join(f"${i}" for i in range(start, start + count))
+
+
+def read_connection() -> BaseDBAsyncClient:
+    """Connection for raw read-only queries: the SQLite reader when configured, else "default"."""
+    router = ReadWriteRouter()
+    if "reader" in connections.db_config and router.db_for_read(None) == "reader":
+        return connections.get("reader")
+    return connections.get("default")
+
+
+async def open_connections():
+    """Connect every configured client now rather than on first use.
+
+    Tortoise connects lazily while holding the lock that serializes a client's queries; a task
+    cancelled during that first connect never releases it, wedging the client. Background tasks
+    are stopped by cancellation, so they should only ever find connections already open.
+    """
+    for client in connections.all():
+        async with client.acquire_connection():
+            pass
+
+
+def build_tortoise_config(db_url: Optional[str] = None) -> dict:
+    """Tortoise config for DATABASE_URL, with pooling for PostgreSQL and the tuned profile for SQLite."""
+    db_url = db_url or _setting("DATABASE_URL", DEFAULT_DB_URL)
+    default = expand_db_url(db_url)
+    connections_config = {"default": default}
+    routers = []
+
+    if default["engine"] == "tortoise.backends.sqlite":
+        default["credentials"].update(SQLITE_PRAGMAS)
+        if _setting("SQLITE_READ_CONNECTION", "true").lower() == "true" and default["credentials"]["file_path"] != ":memory:":
+            reader = expand_db_url(db_url)
+            reader["credentials"].update(SQLITE_PRAGMAS, query_only="ON")
+            connections_config["reader"] = reader
+            routers.append(ReadWriteRouter)
+    elif default["engine"] in ("tortoise.backends.asyncpg", "tortoise.backends.psycopg"):
+        credentials = default["credentials"]
+        credentials.setdefault("minsize", int(_setting("DB_POOL_MIN", "2")))
+        credentials.setdefault("maxsize", int(_setting("DB_POOL_MAX", "10")))
+        if default["engine"] == "tortoise.backends.asyncpg":
+            # Prepared statements are cached per connection; set 0 behind pgbouncer in transaction mode.
+            # URL query parameters arrive as strings, asyncpg wants numbers.
+            credentials["statement_cache_size"] = int(
+                credentials.get("statement_cache_size", _setting("DB_STATEMENT_CACHE_SIZE", "256"))
+            )
+            credentials["max_inactive_connection_lifetime"] = float(
+                credentials.get("max_inactive_connection_lifetime", _setting("DB_MAX_INACTIVE_CONNECTION_LIFETIME", "300"))
+            )
+
+    return {
+        "connections": connections_config,
+        "apps": {"models": {"models": ["models"], "default_connection": "default"}},
+        "routers": routers,
+    }
+
+
+def decimal_value(column: str) -> Tuple[object, Callable[[Decimal], object]]:
+    """Expression comparing a DecimalField numerically, plus a converter for values compared to it.
+
+    SQLite stores decimals as text, where "10" < "9"; there the column is cast to REAL, which
+    matches the expression index created by migration 0002.
+    """
+    if connections.get("default").capabilities.dialect == "sqlite":
+        return RawSQL(f'CAST("{column}" AS REAL)'), float
+    return F(column), Decimal
@@ -0,0 +1,105 @@
+"""
+Validators for conditional GET on catalog reads.
+
+Write paths bump a per-table version, and a per-row one for rows that have their own resource,
+in the catalog_version table; reads turn the version into a weak ETag and Last-Modified, and
+answer a matching If-None-Match (or If-Modified-Since) with 304 before running the query behind
+the response. Every worker and node reads the same table, so a change made through any of them
+retires the tags all of them have issued.
+
+Bumps run after the write has committed and validators are taken before the read, so a read that
+races a write can only pair fresh data with the old tag, which the next revalidation replaces.
+"""
+import time
+from dataclasses import dataclass
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, Hashable, Optional
+
+from starlette.requests import Request
+from starlette.responses import Response
+from tortoise.transactions import in_transaction
+
+from database import placeholders, read_connection
+from settings import settings
+
+# Reverse proxies may serve a read this many seconds old without asking; clients always revalidate.
+SHARED_MAX_AGE = settings.get_int("HTTP_CACHE_SHARED_MAX_AGE", 5)
+CACHE_CONTROL = f"public, max-age=0, s-maxage={SHARED_MAX_AGE}, must-revalidate"
+
+
+@dataclass(frozen=True)
+class Validator:
+    etag: str
+    last_modified: float
+
+    def headers(self) -> Dict[str, str]:
+        return {
+            "ETag": self.etag,
+            "Last-Modified": formatdate(self.last_modified, usegmt=True),
+            "Cache-Control": CACHE_CONTROL,
+        }
+
+    def matches(self, request: Request) -> bool:
+        """True when the client's copy is current (weak comparison, If-None-Match taking precedence)."""
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            opaque = self.etag[2:]
+            return any(tag.strip() in ("*", opaque, self.etag) for tag in if_none_match.split(","))
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                # Last-Modified goes out in whole seconds.
+                return int(self.last_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def not_modified(self) -> Response:
+        return Response(status_code=304, headers=self.headers())
+
+
+class VersionClock:
+    """Change counters per table and per row, stored in the catalog_version table."""
+
+    # Keys per upsert, well under SQLite's limit on query parameters.
+    BATCH = 300
+
+    async def bump(self, table: str, *rows: Hashable):
+        """Record a change to `table`, and to each of `rows` in it. Call once the change has committed."""
+        keys = [table] + [f"{table}:{row}" for row in rows]
+        now = time.time()
+        async with in_transaction("default") as connection:
+            dialect = connection.capabilities.dialect
+            # Every bump goes through the counter row, so each draws a sequence number no other bump has.
+            await connection.execute_query(
+                f'UPDATE "catalog_version" SET "sequence" = "sequence" + 1, "changed_at" = {placeholders(dialect, 1)} WHERE "key" = \'\'',
+                [now],
+            )
+            _, counter = await connection.execute_query('SELECT "sequence" FROM "catalog_version" WHERE "key" = \'\'')
+            sequence = counter[0]["sequence"]
+            for start in range(0, len(keys), self.BATCH):
+                batch = keys[start:start + self.BATCH]
+                values = ", ".join(f"({placeholders(dialect, 3, 1 + 3 * i)})" for i in range(len(batch)))
+                await connection.execute_query(
+                    f'INSERT INTO "catalog_version" ("key", "sequence", "changed_at") VALUES {values} '
+                    'ON CONFLICT ("key") DO UPDATE SET "sequence" = excluded."sequence", "changed_at" = excluded."changed_at"',
+                    [value for key in batch for value in (key, sequence, now)],
+                )
+
+    async def validator(self, table: str, row: Optional[Hashable] = None) -> Validator:
+        """Validator for the whole table, or for one row of it. Take it before reading the data."""
+        key = table if row is None else f"{table}:{row}"
+        connection = read_connection()
+        _, found = await connection.execute_query(
+            'SELECT "key", "sequence", "changed_at" FROM "catalog_version" '
+            f'WHERE "key" IN ({placeholders(connection.capabilities.dialect, 2)})',
+            ["", key],
+        )
+        versions = {version["key"]: (version["sequence"], version["changed_at"]) for version in found}
+        # A key that was never bumped has not changed since the table was created; the counter's
+        # time (the latest bump of any key) is a safe upper bound for when it last did.
+        sequence, changed = versions.get(key, (0, versions[""][1]))
+        return Validator(f'W/"{sequence}"', changed)
+
+
+catalog_versions = VersionClock()
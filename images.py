@@ -0,0 +1,140 @@
+import contextlib
+import hashlib
+import os
+import secrets
+from typing import Dict, List, Tuple
+
+import aiofiles
+import aiofiles.os
+from fastapi import HTTPException, UploadFile
+
+from settings import settings
+from worker_pool import WorkerPool
+
+ALLOWED_EXTENSIONS = {"jpg": "JPEG", "jpeg": "JPEG", "png": "PNG", "gif": "GIF"}
+CHUNK_SIZE = 64 * 1024
+MAX_UPLOAD_BYTES = settings.get_int("MAX_UPLOAD_BYTES", 10 * 1024 * 1024)
+MAX_IMAGE_PIXELS = settings.get_int("MAX_IMAGE_PIXELS", 40_000_000)
+
+# name -> (size, exact). The "medium" variant keeps the historical 400x400 resize and is stored
+# under the plain file name so existing URLs keep working; the others preserve aspect ratio.
+DERIVATIVES = {
+    "thumb": ((150, 150), False),
+    "medium": ((400, 400), True),
+    "full": ((1200, 1200), False),
+}
+
+image_pool = WorkerPool(
+    name="images",
+    kind=settings.get("IMAGE_EXECUTOR") or "process",
+    workers=settings.get_int("IMAGE_WORKERS", 0) or None,
+)
+
+
+class ImageRejected(Exception):
+    pass
+
+
+def variant_name(stem: str, variant: str, extension: str) -> str:
+    suffix = "" if variant == "medium" else f"_{variant}"
+    return f"{stem}{suffix}.{extension}"
+
+
+def variant_names(stem: str, extension: str) -> Dict[str, str]:
+    """Every file written for one upload: variant name -> file name, with the primary under "medium"."""
+    names = {variant: variant_name(stem, variant, extension) for variant in DERIVATIVES}
+    names.update({f"{variant}_webp": variant_name(stem, variant, "webp") for variant in DERIVATIVES})
+    return names
+
+
+def upload_extension(filename: str) -> str:
+    extension = (filename or "").rsplit(".", 1)[-1].lower()
+    if extension not in ALLOWED_EXTENSIONS:
+        raise HTTPException(status_code=400, detail="Invalid file type")
+    return extension
+
+
+async def stream_to_disk(file: UploadFile, path: str) -> Tuple[int, str]:
+    """Copy an upload to `path` in chunks, aborting once it exceeds MAX_UPLOAD_BYTES.
+
+    Returns the size and the SHA-256 hex digest of the content.
+    """
+    size = 0
+    digest = hashlib.sha256()
+    try:
+        async with aiofiles.open(path, "wb") as out:
+            while chunk := await file.read(CHUNK_SIZE):
+                size += len(chunk)
+                if size > MAX_UPLOAD_BYTES:
+                    raise HTTPException(status_code=413, detail="File too large")
+                digest.update(chunk)
+                await out.write(chunk)
+    except BaseException:
+        await remove_quietly(path)
+        raise
+    return size, digest.hexdigest()
+
+
+async def remove_quietly(path: str):
+    try:
+        await aiofiles.os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def render_derivatives(source: str, directory: str, stem: str, extension: str) -> List[str]:
+    """Decode `source` once and write every derivative in both the upload's format and WebP.
+
+    Runs in the image worker pool, never on the event loop.
+    """
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+    try:
+        with Image.open(source) as img:
+            # Only the header has been parsed so far; refuse oversized images before decoding pixels.
+            width, height = img.size
+            if width * height > MAX_IMAGE_PIXELS:
+                raise ImageRejected("Image dimensions too large")
+            # JPEG can decode at a reduced scale when we never need more than the largest derivative.
+            img.draft("RGB", max(size for size, _ in DERIVATIVES.values()))
+            img = ImageOps.exif_transpose(img)
+            img.load()
+    except Image.DecompressionBombError:
+        raise ImageRejected("Image dimensions too large")
+    except (UnidentifiedImageError, OSError):
+        raise ImageRejected("Unsupported or corrupt image")
+
+    fmt = ALLOWED_EXTENSIONS[extension]
+    if fmt == "JPEG" and img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+
+    written = []
+    for variant, (size, exact) in DERIVATIVES.items():
+        if exact:
+            derived = img.resize(size)
+        else:
+            derived = img.copy()
+            derived.thumbnail(size)
+        for ext, save_format in ((extension, fmt), ("webp", "WEBP")):
+            name = variant_name(stem, variant, ext)
+            # Write then rename, so a concurrent reader never sees a half-written file. The temp name
+            # is per writer: two uploads of the same new image render the same files side by side.
+            path = os.path.join(directory, name)
+            tmp = f"{path}.{secrets.token_hex(8)}.tmp"
+            try:
+                derived.save(tmp, save_format)
+                os.replace(tmp, path)
+            except BaseException:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(tmp)
+                raise
+            written.append(name)
+    return written
+
+
+async def build_derivatives(source: str, directory: str, stem: str, extension: str):
+    try:
+        await image_pool.run(render_derivatives, source, directory, stem, extension)
+    except ImageRejected as e:
+        raise HTTPException(status_code=400, detail=f"Invalid image: {e}")
@@ -0,0 +1,234 @@
+import asyncio
+import logging
+from datetime import timedelta
+from email.message import EmailMessage
+from typing import Callable, Dict, List, Optional
+
+import aiosmtplib
+from tortoise import timezone
+from tortoise.exceptions import IntegrityError
+from tortoise.expressions import Q
+
+from models import OutboundEmail
+from settings import settings
+
+log = logging.getLogger("bazarghat.mail")
+
+# template name -> function(recipient, context) building the message
+TEMPLATES: Dict[str, Callable[[str, dict], EmailMessage]] = {}
+
+
+def register_template(name: str):
+    def decorator(render: Callable[[str, dict], EmailMessage]):
+        TEMPLATES[name] = render
+        return render
+    return decorator
+
+
+async def enqueue_email(recipient: str, template: str, context: dict, dedup_key: str) -> bool:
+    """Persist a message in the outbox. Returns False if one with the same dedup key already exists."""
+    try:
+        await OutboundEmail.create(
+            recipient=recipient,
+            template=template,
+            context=context,
+            dedup_key=dedup_key,
+            next_attempt_at=timezone.now(),
+        )
+    except IntegrityError:
+        return False
+    outbox_worker.notify()
+    return True
+
+
+class SMTPConnection:
+    """One long-lived SMTP session, reopened on demand and closed after sitting idle."""
+
+    def __init__(self, hostname: str, port: int, username: Optional[str], password: Optional[str],
+                 start_tls: bool, idle_timeout: float = 60.0):
+        self.hostname = hostname
+        self.port = port
+        self.username = username
+        self.password = password
+        self.start_tls = start_tls
+        self.idle_timeout = idle_timeout
+        self.connects = 0
+        self._smtp: Optional[aiosmtplib.SMTP] = None
+        self._last_used = 0.0
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        smtp = aiosmtplib.SMTP(
+            hostname=self.hostname,
+            port=self.port,
+            username=self.username,
+            password=self.password,
+            start_tls=self.start_tls,
+        )
+        await smtp.connect()
+        self.connects += 1
+        return smtp
+
+    async def send(self, message: EmailMessage):
+        loop = asyncio.get_running_loop()
+        if self._smtp is None or not self._smtp.is_connected:
+            self._smtp = await self._connect()
+        try:
+            await self._smtp.send_message(message)
+        except (aiosmtplib.SMTPServerDisconnected, ConnectionError):
+            # The server dropped a connection we thought was idle-but-open; retry once on a fresh one.
+            await self.close()
+            self._smtp = await self._connect()
+            await self._smtp.send_message(message)
+        self._last_used = loop.time()
+
+    async def close_if_idle(self):
+        if self._smtp is not None and asyncio.get_running_loop().time() - self._last_used > self.idle_timeout:
+            await self.close()
+
+    async def close(self):
+        smtp, self._smtp = self._smtp, None
+        if smtp is not None and smtp.is_connected:
+            try:
+                await smtp.quit()
+            except aiosmtplib.SMTPException:
+                smtp.close()
+
+
+class OutboxWorker:
+    """Delivers queued OutboundEmail rows in batches over a shared SMTP connection.
+
+    Rows are leased before sending, so several workers (or app nodes) can drain the same outbox,
+    and a worker that dies mid-batch only delays its rows until the lease runs out.
+    """
+
+    def __init__(self, connection: SMTPConnection, batch_size: int = 50, poll_interval: float = 5.0,
+                 max_attempts: int = 8, base_backoff: float = 30.0, max_backoff: float = 3600.0,
+                 lease: float = 300.0):
+        self.connection = connection
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.lease = lease
+        self.sent = 0
+        self.failed = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def notify(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def backoff(self, attempts: int) -> timedelta:
+        return timedelta(seconds=min(self.base_backoff * 2 ** (attempts - 1), self.max_backoff))
+
+    async def claim_batch(self) -> List[OutboundEmail]:
+        now = timezone.now()
+        candidates = await OutboundEmail.filter(
+            Q(status="pending") | Q(status="sending"), next_attempt_at__lte=now
+        ).order_by("next_attempt_at").limit(self.batch_size)
+
+        claimed = []
+        lease_until = now + timedelta(seconds=self.lease)
+        for row in candidates:
+            # Conditional update: the first claimant pushes next_attempt_at past `now`, so others match nothing.
+            won = await OutboundEmail.filter(
+                id=row.id, status=row.status, next_attempt_at__lte=now
+            ).update(status="sending", next_attempt_at=lease_until)
+            if won:
+                claimed.append(row)
+        return claimed
+
+    async def deliver(self, row: OutboundEmail) -> Optional[str]:
+        """Send one row; returns an error message, or None on success."""
+        render = TEMPLATES.get(row.template)
+        if render is None:
+            return f"Unknown template {row.template!r}"
+        try:
+            await self.connection.send(render(row.recipient, row.context))
+        except (aiosmtplib.SMTPException, OSError) as e:
+            return f"{type(e).__name__}: {e}"
+        return None
+
+    async def run_once(self) -> int:
+        """Deliver one batch; returns how many rows were claimed."""
+        batch = await self.claim_batch()
+        sent_ids = []
+        for row in batch:
+            error = await self.deliver(row)
+            if error is None:
+                sent_ids.append(row.id)
+                continue
+
+            attempts = row.attempts + 1
+            if attempts >= self.max_attempts:
+                self.failed += 1
+                log.error("Giving up on email %s to %s: %s", row.id, row.recipient, error)
+                await OutboundEmail.filter(id=row.id).update(status="failed", attempts=attempts, last_error=error)
+            else:
+                log.warning("Email %s to %s failed (attempt %s): %s", row.id, row.recipient, attempts, error)
+                await OutboundEmail.filter(id=row.id).update(
+                    status="pending", attempts=attempts, last_error=error,
+                    next_attempt_at=timezone.now() + self.backoff(attempts),
+                )
+
+        if sent_ids:
+            self.sent += len(sent_ids)
+            await OutboundEmail.filter(id__in=sent_ids).update(status="sent", sent_at=timezone.now())
+        return len(batch)
+
+    async def run_forever(self):
+        self._wakeup = asyncio.Event()
+        while True:
+            self._wakeup.clear()
+            try:
+                claimed = await self.run_once()
+            except Exception:
+                log.exception("Outbox batch failed")
+                claimed = 0
+            if claimed >= self.batch_size:
+                continue
+            await self.connection.close_if_idle()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run_forever(), name="email-outbox")
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._wakeup = None
+        await self.connection.close()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def stats(self) -> dict:
+        return {"sent": self.sent, "failed": self.failed, "smtp_connects": self.connection.connects}
+
+
+smtp_connection = SMTPConnection(
+    hostname=settings.get("SMTP_HOST") or "smtp.gmail.com",
+    port=settings.get_int("SMTP_PORT", 587),
+    username=settings.get("EMAIL") if settings.get_flag("SMTP_USE_CREDENTIALS", True) else None,
+    password=settings.get("PASSWORD") if settings.get_flag("SMTP_USE_CREDENTIALS", True) else None,
+    start_tls=settings.get_flag("SMTP_STARTTLS", True),
+)
+
+outbox_worker = OutboxWorker(
+    smtp_connection,
+    batch_size=settings.get_int("EMAIL_BATCH_SIZE", 50),
+    poll_interval=settings.get_float("EMAIL_POLL_INTERVAL", 5),
+    max_attempts=settings.get_int("EMAIL_MAX_ATTEMPTS", 8),
+)
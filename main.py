@@ -1,25 +1,61 @@
 # Organized FastAPI App with Tags and Routers
-from fastapi import FastAPI, Request, HTTPException, status, BackgroundTasks, Depends, UploadFile, File
-from fastapi.responses import HTMLResponse
-from fastapi.templating import Jinja2Templates
+from fastapi import FastAPI, Request, Response, HTTPException, Depends, UploadFile, File, Query
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 
 from tortoise.contrib.fastapi import register_tortoise
 from tortoise.signals import post_save
 from tortoise import BaseDBAsyncClient
+from tortoise.connection import connections
 from typing import List, Optional, Type
+from contextlib import asynccontextmanager
 
-from PIL import Image
+from decimal import Decimal
+import asyncio
 import os
-import secrets
 
 from models import *
-from authentication import verify_token, get_password_hash, token_generator
+from cache import TTLCache
+from authentication import verify_token, hash_password_async, token_generator, hash_pool, decode_access_token, get_user_by_id, credentials_exception, user_cache, TokenClaims
 from email_utils import send_verification_email
+from mail_queue import outbox_worker
+from rendering import PrecompiledTemplate
+from database import build_tortoise_config, decimal_value, open_connections
+from migrate import check_schema
+from pagination import after_cursor, encode_cursor
+from images import upload_extension, image_pool
+from storage import store_image, release, release_many, ImmutableStaticFiles
+from search import search_product_ids, index_products, index_business, remove_products
+from streaming import stream_list, json_response, batched_rows
+from catalog_stats import record_products_added, refresh_stats, fetch_stats
+from metrics import METRICS_ENABLED, MetricsMiddleware, Collected, register, render as render_metrics, instrument_db_clients, loop_lag_monitor
+from offers import is_active, offer_scheduler
+from catalog_io import FORMATS, discount_percentage, request_format, import_products, export_products
+from ratelimit import RATE_LIMIT_ENABLED, RateLimitMiddleware, rate_limit_store
+from http_cache import catalog_versions
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await check_schema()
+    await open_connections()
+    if METRICS_ENABLED:
+        instrument_db_clients()
+        loop_lag_monitor.start()
+    outbox_worker.start()
+    offer_scheduler.start(on_expired=invalidate_expired_offers)
+    app.state.ready = True
+    yield
+    app.state.ready = False
+    await offer_scheduler.stop()
+    await outbox_worker.stop()
+    await loop_lag_monitor.stop()
+    await rate_limit_store.close()
+    hash_pool.shutdown()
+    image_pool.shutdown()
 
 app = FastAPI(
+    lifespan=lifespan,
     title="E-Commerce API",
     description="API for authentication, product management, and business operations",
     version="1.0.0",
@@ -32,6 +68,11 @@ app = FastAPI(
     ]
 )
 
+# Per-client rate limits, checked before any handler runs. Added first so it sits inside CORS and
+# 429s still carry the CORS headers.
+if RATE_LIMIT_ENABLED:
+    app.add_middleware(RateLimitMiddleware)
+
 # CORS
 app.add_middleware(
     CORSMiddleware,
@@ -39,60 +80,70 @@ app.add_middleware(
     allow_credentials=False,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "ETag", "Last-Modified"],
 )
 
+# Request timing and per-request query counts; outermost, so it times everything below it.
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 # Static files
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-app.mount("/static", StaticFiles(directory=os.path.join(BASE_DIR, "static")), name="static")
+app.mount("/static", ImmutableStaticFiles(directory=os.path.join(BASE_DIR, "static")), name="static")
 
 # Auth scheme
 oauth_to_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-# Templates
-templates = Jinja2Templates(directory="templates")
+# Verification pages: only two outcomes exist, so render each once and substitute the username.
+VERIFY_PAGES = {
+    "verified": PrecompiledTemplate("verify.html", slot="username", message="Account verified successfully!"),
+    "already_verified": PrecompiledTemplate("verify.html", slot="username", message="Account already verified."),
+}
 
 @app.post("/token", tags=["Authentication"])
 async def generate_token(form_data: OAuth2PasswordRequestForm = Depends()):
     token = await token_generator(form_data.username, form_data.password)
     return {"access_token": token, "token_type": "bearer"}
 
-async def get_current_user(token: str = Depends(oauth_to_scheme)) -> User:
-    try:
-        payload = jwt.decode(token, config_credentials["SECRET_KEY"], algorithms=["HS256"])
-        user = await User.get(id=payload.get("id"))
-        return user
-    except:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+async def get_token_claims(token: str = Depends(oauth_to_scheme)) -> TokenClaims:
+    return decode_access_token(token)
+
+async def get_current_user(claims: TokenClaims = Depends(get_token_claims)) -> User:
+    user = await get_user_by_id(claims.id)
+    if user is None:
+        raise credentials_exception()
+    return user
+
+async def get_business_id(claims: TokenClaims = Depends(get_token_claims)) -> int:
+    """The caller's business for paths that add to it. The claim outlives a deleted business, so check it still exists."""
+    if claims.business_id is None or not await Business.exists(id=claims.business_id, owner_id=claims.id):
+        raise HTTPException(status_code=404, detail="Business not found")
+    return claims.business_id
 
 @app.post("/users/", tags=["Authentication"])
-async def create_user(user: user_pydantic_in, background_tasks: BackgroundTasks):
+async def create_user(user: user_pydantic_in):
     user_info = user.dict(exclude_unset=True)
-    user_info["password"] = get_password_hash(user_info["password"])
 
     if await User.get_or_none(email=user_info["email"]):
         raise HTTPException(status_code=409, detail="User with this email already exists.")
     if await User.get_or_none(username=user_info["username"]):
         raise HTTPException(status_code=409, detail="User with this username already exists.")
 
+    user_info["password"] = await hash_password_async(user_info["password"])
+
     user_obj = await User.create(**user_info)
     new_user = await user_pydantic_out.from_tortoise_orm(user_obj)
-
-    background_tasks.add_task(send_verification_email, email_to=new_user.email, instance=user_obj)
     return {"status": "success", "data": f"Thanks for choosing {new_user.username}, check your email to verify your account"}
 
 @app.get("/verify/{token}", response_class=HTMLResponse, tags=["Authentication"])
-async def verify_user(request: Request, token: str):
+async def verify_user(token: str):
     user = await verify_token(token)
     if user and not user.is_verified:
         user.is_verified = True
         await user.save()
-        return templates.TemplateResponse("verify.html", {"request": request, "username": user.username, "message": "Account verified successfully!"})
+        return HTMLResponse(VERIFY_PAGES["verified"].render(user.username))
     elif user and user.is_verified:
-        return templates.TemplateResponse("verify.html", {"request": request, "username": user.username, "message": "Account already verified."})
+        return HTMLResponse(VERIFY_PAGES["already_verified"].render(user.username))
     raise HTTPException(status_code=401, detail="Invalid or expired token.")
 
 @app.post("/user/me", tags=["Authentication"])
@@ -113,87 +164,213 @@ async def user_login(user=Depends(get_current_user)):
     }
 
 @app.post("/uploadfiles/profile", tags=["Uploads"])
-async def upload_image(file: UploadFile = File(...), current_user: User = Depends(get_current_user)):
+async def upload_image(file: UploadFile = File(...), claims: TokenClaims = Depends(get_token_claims)):
     FILE_PATH = "static/images/business"
-    extension = file.filename.split(".")[-1]
-    if extension not in ["jpg", "jpeg", "png", "gif"]:
-        raise HTTPException(status_code=400, detail="Invalid file type")
-
-    token_name_img = secrets.token_hex(10) + "." + extension
-    generated_img_name = f"{FILE_PATH}/{token_name_img}"
-    with open(generated_img_name, "wb") as f:
-        f.write(await file.read())
+    upload_extension(file.filename)
 
-    img = Image.open(generated_img_name).resize((400, 400))
-    img.save(generated_img_name)
-
-    business = await Business.get_or_none(owner=current_user)
-    if await business.owner != current_user:
+    business = await Business.get_or_none(owner_id=claims.id)
+    if not business:
         raise HTTPException(status_code=400, detail="You are not the owner of this business")
 
-    business.logo = token_name_img
-    await business.save()
+    images = await store_image(file, FILE_PATH)
+    previous_logo = business.logo
+    business.logo = images["medium"]
+    await business.save(update_fields=["logo"])
+    invalidate_product_details(business_id=business.id)
+    await business_changed(business.id)
+    await release(FILE_PATH, previous_logo)
 
     return {
         "status": "success",
-        "filename": f"https://e-com-fastapi.onrender.com/static/images/business/{token_name_img}",
+        "filename": f"https://e-com-fastapi.onrender.com/static/images/business/{business.logo}",
+        "variants": {name: f"https://e-com-fastapi.onrender.com/static/images/business/{img}" for name, img in images.items()},
         "message": "Image uploaded successfully"
     }
 
 @app.post("/uploadfiles/product/{product_id}", tags=["Uploads"])
-async def upload_product_image(product_id: int, file: UploadFile = File(...), current_user: User = Depends(get_current_user)):
+async def upload_product_image(product_id: int, file: UploadFile = File(...), claims: TokenClaims = Depends(get_token_claims)):
     FILE_PATH = "static/images/products"
-    extension = file.filename.split(".")[-1]
-    if extension not in ["jpg", "jpeg", "png", "gif"]:
-        raise HTTPException(status_code=400, detail="Invalid file type")
-
-    token_name_img = secrets.token_hex(10) + "." + extension
-    generated_img_name = f"{FILE_PATH}/{token_name_img}"
-    with open(generated_img_name, "wb") as f:
-        f.write(await file.read())
+    upload_extension(file.filename)
 
-    img = Image.open(generated_img_name).resize((400, 400))
-    img.save(generated_img_name)
-
-    product = await Product.get(id=product_id).prefetch_related("business")
-    if (await product.business).owner.id != current_user.id:
+    product = await Product.get_or_none(id=product_id)
+    if not product or product.business_id != claims.business_id:
         raise HTTPException(status_code=401, detail="Unauthorized")
 
-    product.product_image = token_name_img
+    images = await store_image(file, FILE_PATH)
+    previous_image = product.product_image
+    product.product_image = images["medium"]
     await product.save(update_fields=["product_image"])
+    invalidate_product_details(product_id=product_id)
+    await catalog_versions.bump("product", product_id)
+    await release(FILE_PATH, previous_image)
 
     return {
         "status": "success",
-        "filename": f"https://e-com-fastapi.onrender.com/static/images/products/{token_name_img}",
+        "filename": f"https://e-com-fastapi.onrender.com/static/images/products/{product.product_image}",
+        "variants": {name: f"https://e-com-fastapi.onrender.com/static/images/products/{img}" for name, img in images.items()},
         "message": "Image uploaded successfully"
     }
 
 @app.post("/products/", tags=["Products"])
-async def create_product(product: product_pydantic_in, current_user: User = Depends(get_current_user)):
+async def create_product(product: product_pydantic_in, business_id: int = Depends(get_business_id)):
     product = product.dict(exclude_unset=True)
-    business = await Business.get_or_none(owner=current_user)
-    if not business:
-        raise HTTPException(status_code=404, detail="Business not found")
-
-    product['percentage_discount'] = round((product['new_price'] / product['original_price']) * 100) if product['original_price'] > 0 else 0
-    product_obj = await Product.create(**product, business=business)
+    product['percentage_discount'] = discount_percentage(product['original_price'], product['new_price'])
+    product_obj = Product(**product, business_id=business_id)
+    product_obj.offer_active = is_active(product_obj.offer_expires)
+    await product_obj.save()
+    if product_obj.offer_active:
+        offer_scheduler.schedule(product_obj.offer_expires)
+    await index_products([product_obj.id])
+    await record_products_added([product_obj.id])
+    await catalog_versions.bump("product", product_obj.id)
     return {"status": "success", "data": await product_pydantic.from_tortoise_orm(product_obj)}
 
+@app.post("/products/bulk", tags=["Products"])
+async def bulk_import_products(
+    request: Request,
+    format: Optional[str] = Query(None, description="csv or ndjson; defaults to the Content-Type"),
+    business_id: int = Depends(get_business_id),
+):
+    report = await import_products(request, request_format(request, format), business_id)
+    if report.created:
+        await index_products(report.product_ids)
+        await refresh_stats(report.categories, [business_id])
+        await catalog_versions.bump("product")
+    return {"status": "success", **report.as_dict()}
+
+@app.get("/products/export", tags=["Products"])
+async def export_product_catalog(
+    format: str = Query("ndjson", pattern="^(csv|ndjson)$"),
+    business_id: Optional[int] = None,
+    category: Optional[str] = None,
+):
+    filters = {key: value for key, value in {"business_id": business_id, "category": category}.items() if value is not None}
+    return StreamingResponse(
+        export_products(format, **filters),
+        media_type=FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="products.{format}"'},
+    )
+
+PRODUCT_FIELDS = list(product_pydantic.model_fields) + ["business_id"]
+
 @app.get("/products/", tags=["Products"])
-async def get_products():
-    return {"status": "success", "data": await product_pydantic.from_queryset(Product.all())}
+async def get_products(
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    category: Optional[str] = None,
+    product_name: Optional[str] = None,
+    min_price: Optional[Decimal] = Query(None, ge=0),
+    max_price: Optional[Decimal] = Query(None, ge=0),
+    business_id: Optional[int] = None,
+    active_offers_only: bool = Query(False, description="Only products whose offer has not expired"),
+    fields: Optional[str] = Query(None, description="Comma-separated list of product fields to return"),
+    stream: bool = Query(False, description="Stream the response body as it is encoded"),
+):
+    validator = await catalog_versions.validator("product")
+    if validator.matches(request):
+        return validator.not_modified()
+
+    selected = [f.strip() for f in fields.split(",") if f.strip()] if fields else [f for f in PRODUCT_FIELDS if f != "business_id"]
+    unknown = set(selected) - set(PRODUCT_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+
+    queryset = Product.filter(after_cursor(cursor))
+    if category is not None:
+        queryset = queryset.filter(category=category)
+    if product_name is not None:
+        queryset = queryset.filter(product_name__startswith=product_name)
+    if min_price is not None or max_price is not None:
+        price, to_param = decimal_value("new_price")
+        queryset = queryset.annotate(price_value=price)
+        if min_price is not None:
+            queryset = queryset.filter(price_value__gte=to_param(min_price))
+        if max_price is not None:
+            queryset = queryset.filter(price_value__lte=to_param(max_price))
+    if business_id is not None:
+        queryset = queryset.filter(business_id=business_id)
+    if active_offers_only:
+        # Served in page order by the (offer_active, date_published, id) index. The scheduler clears
+        # the flag as each deadline passes; an offer_expires range here would tempt the planner
+        # into the expiry index and a sort.
+        queryset = queryset.filter(offer_active=True)
+
+    # The sort key is always fetched so the next cursor can be built, then dropped if not requested.
+    columns = list(dict.fromkeys(selected + ["date_published", "id"]))
+    rows = await queryset.order_by("-date_published", "-id").limit(limit + 1).values(*columns)
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["date_published"], rows[-1]["id"])
+
+    # Encoded as product_pydantic would encode them, like every product response before paging.
+    data = [{field: row[field] for field in selected} for row in rows]
+    if stream:
+        return stream_list(data, {"next_cursor": next_cursor}, as_models=True, headers=validator.headers())
+    return json_response(data, {"next_cursor": next_cursor}, as_models=True, headers=validator.headers())
+
+@app.get("/products/search", tags=["Products"])
+async def search_products(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=10000),
+):
+    ids, relaxed = await search_product_ids(q, limit + 1, offset)
+    next_offset = offset + limit if len(ids) > limit else None
+    ids = ids[:limit]
+    fields = [f for f in PRODUCT_FIELDS if f != "business_id"]
+    rows = {row["id"]: row for row in await Product.filter(id__in=ids).values(*fields)}
+    # Keep the rank order; skip ids whose product vanished between the two queries.
+    data = [rows[product_id] for product_id in ids if product_id in rows]
+    return json_response(data, {"relaxed": relaxed, "next_offset": next_offset}, as_models=True)
+
+# product id -> (business id, ETag it was built under, assembled detail response). Entries are only
+# served while the ETag is current, so changes made through other workers are never answered from here.
+product_detail_cache = TTLCache(maxsize=5000, ttl=300)
+
+def invalidate_product_details(product_id: Optional[int] = None, business_id: Optional[int] = None):
+    if product_id is not None:
+        product_detail_cache.pop(product_id)
+    if business_id is not None:
+        product_detail_cache.discard_where(lambda _, entry: entry[0] == business_id)
+
+async def invalidate_expired_offers(product_ids: List[int]):
+    for product_id in product_ids:
+        invalidate_product_details(product_id=product_id)
+    groups = await Product.filter(id__in=product_ids).values_list("category", "business_id")
+    await refresh_stats({category for category, _ in groups}, {business_id for _, business_id in groups})
+    await catalog_versions.bump("product", *product_ids)
+
+async def business_changed(business_id: int, product_ids: Optional[List[int]] = None):
+    """Business details are part of every one of its product pages."""
+    if product_ids is None:
+        product_ids = await Product.filter(business_id=business_id).values_list("id", flat=True)
+    await catalog_versions.bump("business")
+    await catalog_versions.bump("product", *product_ids)
 
 @app.get("/products/{product_id}", tags=["Products"])
-async def get_product(product_id: int):
-    product = await Product.get_or_none(id=product_id)
+async def get_product(product_id: int, request: Request, response: Response):
+    validator = await catalog_versions.validator("product", product_id)
+    if validator.matches(request):
+        return validator.not_modified()
+    response.headers.update(validator.headers())
+
+    cached = product_detail_cache.get(product_id)
+    if cached is not None and cached[1] == validator.etag:
+        return cached[2]
+    generation = product_detail_cache.generation
+
+    product = await Product.get_or_none(id=product_id).select_related("business__owner")
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
-    business = await product.business
-    owner = await business.owner
-    return {
+    business = product.business
+    owner = business.owner
+    response = {
         "status": "success",
         "data": {
-            "product_details": await product_pydantic.from_queryset_single(Product.get(id=product_id)),
+            "product_details": await product_pydantic.from_tortoise_orm(product),
             "business_details": {
                 "business_name": business.businessname,
                 "owner_name": owner.username,
@@ -206,71 +383,170 @@ async def get_product(product_id: int):
             }
         }
     }
+    product_detail_cache.set(product_id, (business.id, validator.etag, response), generation=generation)
+    return response
 
 @app.delete("/products/{product_id}", tags=["Products"])
-async def delete_product(product_id: int, current_user: User = Depends(get_current_user)):
+async def delete_product(product_id: int, claims: TokenClaims = Depends(get_token_claims)):
     product = await Product.get_or_none(id=product_id)
-    if await (await product.business).owner != current_user:
+    if not product or product.business_id != claims.business_id:
         raise HTTPException(status_code=403, detail="Unauthorized")
     await product.delete()
+    await remove_products([product_id])
+    await refresh_stats([product.category], [product.business_id])
+    invalidate_product_details(product_id=product_id)
+    await catalog_versions.bump("product", product_id)
+    await release("static/images/products", product.product_image)
     return {"status": "success", "message": f"Product {product_id} deleted successfully"}
 
 @app.put("/products/{product_id}", tags=["Products"])
-async def update_product(product_id: int, product: product_pydantic_in, current_user: User = Depends(get_current_user)):
+async def update_product(product_id: int, product: product_pydantic_in, claims: TokenClaims = Depends(get_token_claims)):
     product_data = product.dict(exclude_unset=True)
-    business = await Business.get_or_none(owner=current_user)
-    product_in_db = await Product.get_or_none(id=product_id).prefetch_related("business")
+    product_in_db = await Product.get_or_none(id=product_id)
 
-    if not product_in_db or product_in_db.business_id != business.id:
+    if not product_in_db or product_in_db.business_id != claims.business_id:
         raise HTTPException(status_code=403, detail="Unauthorized")
 
     if 'original_price' in product_data and 'new_price' in product_data:
-        product_data['percentage_discount'] = round((product_data['new_price'] / product_data['original_price']) * 100)
+        product_data['percentage_discount'] = discount_percentage(product_data['original_price'], product_data['new_price'])
+    if 'offer_expires' in product_data:
+        product_data['offer_active'] = is_active(product_data['offer_expires'])
+        if product_data['offer_active']:
+            offer_scheduler.schedule(product_data['offer_expires'])
 
     await Product.filter(id=product_id).update(**product_data)
+    await index_products([product_id])
+    await refresh_stats({product_in_db.category, product_data.get("category", product_in_db.category)}, [product_in_db.business_id])
+    invalidate_product_details(product_id=product_id)
+    await catalog_versions.bump("product", product_id)
     return {"status": "success", "data": await product_pydantic.from_tortoise_orm(await Product.get(id=product_id))}
 
 @app.get("/business/", tags=["Business"])
-async def get_businesses():
+async def get_businesses(
+    request: Request,
+    response: Response,
+    stream: bool = Query(False, description="Stream the response body as rows are fetched"),
+):
+    validator = await catalog_versions.validator("business")
+    if validator.matches(request):
+        return validator.not_modified()
+    response.headers.update(validator.headers())
+    if stream:
+        rows = batched_rows(Business.all(), list(business_pydantic.model_fields))
+        return stream_list(rows, as_models=True, headers=validator.headers())
     return {"status": "success", "data": await business_pydantic.from_queryset(Business.all())}
 
 @app.delete("/business/{business_id}", tags=["Business"])
-async def delete_business(business_id: int, current_user: User = Depends(get_current_user)):
+async def delete_business(business_id: int, claims: TokenClaims = Depends(get_token_claims)):
     business = await Business.get_or_none(id=business_id)
-    if not business or business.owner_id != current_user.id:
+    if not business or business.owner_id != claims.id:
         raise HTTPException(status_code=403, detail="Unauthorized")
+    products = await Product.filter(business_id=business_id).values_list("id", "product_image", "category")
     await business.delete()
+    await remove_products([product_id for product_id, _, _ in products])
+    await refresh_stats({category for _, _, category in products}, [business_id])
+    invalidate_product_details(business_id=business_id)
+    await business_changed(business_id, [product_id for product_id, _, _ in products])
+    await release_many("static/images/products", [image for _, image, _ in products])
+    await release("static/images/business", business.logo)
     return {"status": "success", "message": f"Business {business_id} deleted successfully"}
 
 @app.put("/business/{business_id}", tags=["Business"])
-async def update_business(business_id: int, business: business_pydantic_in, current_user: User = Depends(get_current_user)):
+async def update_business(business_id: int, business: business_pydantic_in, claims: TokenClaims = Depends(get_token_claims)):
     data = business.dict(exclude_unset=True)
     biz = await Business.get_or_none(id=business_id)
-    if not biz or biz.owner_id != current_user.id:
+    if not biz or biz.owner_id != claims.id:
         raise HTTPException(status_code=403, detail="Unauthorized")
     await Business.filter(id=business_id).update(**data)
+    await index_business(business_id)
+    invalidate_product_details(business_id=business_id)
+    await business_changed(business_id)
     return {"status": "success", "data": await business_pydantic.from_tortoise_orm(await Business.get(id=business_id))}
 
+@app.get("/catalog/stats", tags=["Products"])
+async def get_catalog_stats(
+    by: str = Query("category", pattern="^(category|business)$"),
+    category: Optional[str] = None,
+    business_id: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+):
+    key = category if by == "category" else (str(business_id) if business_id is not None else None)
+    groups = await fetch_stats(by, key, limit, offset)
+    if by == "category":
+        data = [{"category": key, **stats} for key, stats in groups]
+    else:
+        names = dict(await Business.filter(id__in=[int(key) for key, _ in groups]).values_list("id", "businessname"))
+        data = [{"business_id": int(key), "business_name": names.get(int(key)), **stats} for key, stats in groups]
+    return {"status": "success", "data": data}
+
+register(Collected(
+    "worker_pool_tasks", "Tasks waiting for or running in a worker pool.", "gauge", ("pool", "state"),
+    lambda: {(pool.name, state): pool.stats()[state] for pool in (hash_pool, image_pool) for state in ("queued", "in_flight")},
+))
+register(Collected(
+    "cache_lookups_total", "In-process cache lookups.", "counter", ("cache", "result"),
+    lambda: {
+        (name, result): getattr(cache, result)
+        for name, cache in (("user", user_cache), ("product_detail", product_detail_cache))
+        for result in ("hits", "misses")
+    },
+))
+register(Collected(
+    "offers_expired_total", "Product offers flagged as expired by the scheduler.", "counter", (),
+    lambda: {(): offer_scheduler.expired},
+))
+register(Collected(
+    "outbox_emails_total", "Outbound emails by final outcome.", "counter", ("outcome",),
+    lambda: {(outcome,): count for outcome, count in outbox_worker.stats().items() if outcome in ("sent", "failed")},
+))
+
+@app.get("/metrics", response_class=PlainTextResponse, tags=["Root"])
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 @app.get("/", tags=["Root"])
 async def root():
     return {"message": "Hello World"}
 
+@app.get("/ready", tags=["Root"])
+async def ready():
+    """Readiness probe: 503 until startup has finished, and whenever the database or a background worker is down."""
+    checks = {
+        "started": getattr(app.state, "ready", False),
+        "outbox_worker": outbox_worker.running,
+        "offer_scheduler": offer_scheduler.running,
+    }
+    try:
+        await asyncio.wait_for(connections.get("default").execute_query("SELECT 1"), timeout=2)
+        checks["database"] = True
+    except Exception:
+        checks["database"] = False
+    is_ready = all(checks.values())
+    return JSONResponse(
+        {"status": "ready" if is_ready else "unavailable", "pid": os.getpid(), "checks": checks},
+        status_code=200 if is_ready else 503,
+    )
+
 @app.get("/users/", tags=["Users"])
-async def get_users():
+async def get_users(stream: bool = Query(False, description="Stream the response body as rows are fetched")):
+    if stream:
+        return stream_list(batched_rows(User.all(), list(user_pydantic.model_fields)), as_models=True)
     return {"status": "success", "data": await user_pydantic.from_queryset(User.all())}
 
 @post_save(User)
 async def create_business_and_send_verification_email(sender: Type[User], instance: User, created: bool, using_db: Optional[BaseDBAsyncClient], update_fields: List[str]) -> None:
+    user_cache.pop(instance.id)
     if created:
         business_obj = await Business.create(businessname=instance.username, owner=instance)
+        await catalog_versions.bump("business")
         await business_pydantic.from_tortoise_orm(business_obj)
         await send_verification_email(email_to=instance.email, instance=instance)
 
 register_tortoise(
     app,
-    db_url="sqlite://db.sqlite3",
-    modules={"models": ["models"]},
-    generate_schemas=True,
+    config=build_tortoise_config(),
+    generate_schemas=False,
     add_exception_handlers=True,
 )
 
@@ -0,0 +1,265 @@
+"""
+In-process request metrics in the Prometheus text format.
+
+MetricsMiddleware times every request per route template, counts and times the Tortoise queries
+each request issues (flagging statements repeated past N_PLUS_ONE_THRESHOLD, the usual sign of
+an N+1 loop), and adds a Server-Timing header. LoopLagMonitor samples event-loop lag. Values are
+per process; with several workers, scrape each one.
+"""
+import asyncio
+import logging
+import re
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from functools import wraps
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from tortoise import BaseDBAsyncClient
+
+from settings import settings
+
+METRICS_ENABLED = settings.get_flag("METRICS_ENABLED", True)
+N_PLUS_ONE_THRESHOLD = settings.get_int("N_PLUS_ONE_THRESHOLD", 10)
+LOOP_LAG_INTERVAL = settings.get_float("LOOP_LAG_INTERVAL", 0.5)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+logger = logging.getLogger("metrics")
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name, self.help, self.label_names = name, help, tuple(labels)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def samples(self) -> Iterable[str]:
+        for labels, value in self.values.items():
+            yield f"{self.name}{_labels(self.label_names, labels)} {value}"
+
+
+class Collected:
+    """A counter or gauge owned elsewhere, read at scrape time from `collect` ({label values: value})."""
+
+    def __init__(self, name: str, help: str, kind: str, labels: Sequence[str], collect: Callable[[], Dict[Tuple[str, ...], float]]):
+        self.name, self.help, self.kind, self.label_names, self.collect = name, help, kind, tuple(labels), collect
+
+    def samples(self) -> Iterable[str]:
+        for labels, value in self.collect().items():
+            yield f"{self.name}{_labels(self.label_names, labels)} {value}"
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name, self.help, self.label_names = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (last is +Inf), sum]
+        self.series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def samples(self) -> Iterable[str]:
+        names = self.label_names + ("le",)
+        for labels, (counts, total) in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                yield f"{self.name}_bucket{_labels(names, labels + (le,))} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.label_names, labels)} {total}"
+            yield f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}"
+
+
+REGISTRY: List[object] = []
+
+
+def register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+http_requests = register(Counter("http_requests_total", "HTTP requests served.", ("method", "route", "status")))
+http_duration = register(Histogram("http_request_duration_seconds", "Time to the end of the response.", ("method", "route")))
+db_queries = register(Histogram("db_queries_per_request", "ORM queries issued per request.", ("route",), COUNT_BUCKETS))
+db_duration = register(Histogram("db_time_per_request_seconds", "Time spent waiting on ORM queries per request.", ("route",)))
+db_repeated = register(Counter(
+    "db_repeated_query_total", f"Requests that ran one statement at least {N_PLUS_ONE_THRESHOLD} times.", ("route",)
+))
+loop_lag = register(Histogram("event_loop_lag_seconds", "How late the event loop ran a timer.", (), LAG_BUCKETS))
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_time", "statements", "repeated")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.statements: Dict[str, int] = {}
+        # First statement to reach N_PLUS_ONE_THRESHOLD; reported once the route is known.
+        self.repeated: Optional[str] = None
+
+
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+_in_query: ContextVar[bool] = ContextVar("in_query", default=False)
+
+QUERY_METHODS = ("execute_query", "execute_query_dict", "execute_insert", "execute_many", "execute_script")
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+def _record(stats: RequestStats, query: str, elapsed: float):
+    stats.queries += 1
+    stats.db_time += elapsed
+    statement = LITERALS.sub("?", query)
+    seen = stats.statements.get(statement, 0) + 1
+    stats.statements[statement] = seen
+    if seen == N_PLUS_ONE_THRESHOLD and stats.repeated is None:
+        stats.repeated = statement
+
+
+def _instrument(method):
+    @wraps(method)
+    async def wrapper(self, query, *args, **kwargs):
+        stats = current_request.get()
+        # Outside a request, or a client method delegating to another one: don't count twice.
+        if stats is None or _in_query.get():
+            return await method(self, query, *args, **kwargs)
+        token = _in_query.set(True)
+        start = time.perf_counter()
+        try:
+            return await method(self, query, *args, **kwargs)
+        finally:
+            _record(stats, query, time.perf_counter() - start)
+            _in_query.reset(token)
+
+    wrapper.instrumented = True
+    return wrapper
+
+
+def instrument_db_clients():
+    """Wrap the query methods of every loaded Tortoise client class (call after the ORM is initialised)."""
+    pending = [BaseDBAsyncClient]
+    while pending:
+        cls = pending.pop()
+        pending.extend(cls.__subclasses__())
+        for name in QUERY_METHODS:
+            method = cls.__dict__.get(name)
+            if method is not None and not getattr(method, "instrumented", False) and not getattr(method, "__isabstractmethod__", False):
+                setattr(cls, name, _instrument(method))
+
+
+class MetricsMiddleware:
+    """ASGI middleware: per-route latency and query counts, plus a Server-Timing response header."""
+
+    def __init__(self, app):
+        self.app = app
+        self.routes: Dict[object, str] = {}
+
+    def route_name(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        name = self.routes.get(endpoint)
+        if name is None:
+            router = scope["app"].router
+            # One label per route template (and mount), never per concrete path.
+            self.routes = {getattr(route, "endpoint", getattr(route, "app", None)): route.path for route in router.routes}
+            name = self.routes.get(endpoint, "unmatched")
+        return name
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        stats = RequestStats()
+        token = current_request.set(stats)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                elapsed = (time.perf_counter() - start) * 1000
+                timing = f'app;dur={elapsed:.1f}, db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries"'
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", timing.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_request.reset(token)
+            route = self.route_name(scope)
+            method = scope["method"]
+            if stats.repeated is not None:
+                db_repeated.inc(route)
+                logger.warning(
+                    "%s %s ran one statement %d+ times (%d queries): %.200s",
+                    method, route, N_PLUS_ONE_THRESHOLD, stats.queries, stats.repeated,
+                )
+            http_requests.inc(method, route, str(status))
+            http_duration.observe(time.perf_counter() - start, method, route)
+            db_queries.observe(stats.queries, route)
+            db_duration.observe(stats.db_time, route)
+
+
+class LoopLagMonitor:
+    """Sleeps `interval` seconds at a time and records how much later than that it woke up."""
+
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            loop_lag.observe(max(0.0, loop.time() - start - self.interval))
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+loop_lag_monitor = LoopLagMonitor()
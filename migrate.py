@@ -0,0 +1,167 @@
+"""
+Versioned schema migrations for models.py.
+
+Migrations live in migrations/NNNN_name.py and define `async def upgrade(connection, dialect)`.
+Applied names are recorded in the schema_migrations table. The app never migrates on boot;
+it checks on startup and refuses to serve while any migration is pending or any table lacks a
+column that models.py or a migration declares.
+
+    python migrate.py status
+    python migrate.py upgrade
+"""
+import argparse
+import asyncio
+import importlib
+import os
+import re
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Set
+
+from tortoise import BaseDBAsyncClient, Tortoise
+from tortoise.connection import connections
+from tortoise.transactions import in_transaction
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+MIGRATION_FILE = re.compile(r"^\d{4}_\w+\.py$")
+CREATE_TABLE = re.compile(r'CREATE TABLE IF NOT EXISTS "(\w+)" \((.*?)\n\);', re.S)
+COLUMN = re.compile(r'^\s*"(\w+)"', re.M)
+SUPPORTED_DIALECTS = ("sqlite", "postgres")
+
+
+class SchemaOutOfDate(RuntimeError):
+    pass
+
+
+def discover() -> List[str]:
+    return sorted(name[:-3] for name in os.listdir(MIGRATIONS_DIR) if MIGRATION_FILE.match(name))
+
+
+def dialect_of(connection: BaseDBAsyncClient) -> str:
+    dialect = connection.capabilities.dialect
+    if dialect not in SUPPORTED_DIALECTS:
+        raise RuntimeError(f"Migrations are not written for the {dialect} dialect")
+    return dialect
+
+
+async def run_sql(connection: BaseDBAsyncClient, sql: str):
+    """Run a script one statement at a time (executescript would commit behind the transaction's back)."""
+    for statement in re.split(r";\s*\n", sql):
+        if statement.strip():
+            await connection.execute_query(statement.strip().rstrip(";"))
+
+
+def declared_columns(sql: str) -> Dict[str, Set[str]]:
+    """Columns of each CREATE TABLE IF NOT EXISTS in a migration script, by table."""
+    return {table: set(COLUMN.findall(body)) for table, body in CREATE_TABLE.findall(sql)}
+
+
+async def table_columns(connection: BaseDBAsyncClient, table: str) -> Set[str]:
+    """Columns the table has in the database; empty when it does not exist."""
+    if dialect_of(connection) == "sqlite":
+        _, rows = await connection.execute_query(f'PRAGMA table_info("{table}")')
+        return {row["name"] for row in rows}
+    _, rows = await connection.execute_query(
+        "SELECT column_name FROM information_schema.columns WHERE table_schema = current_schema() AND table_name = $1",
+        [table],
+    )
+    return {row["column_name"] for row in rows}
+
+
+async def missing_columns(connection: BaseDBAsyncClient, expected: Dict[str, Iterable[str]]) -> List[str]:
+    """"table.column" for each expected column the database lacks."""
+    missing = []
+    for table, columns in sorted(expected.items()):
+        present = await table_columns(connection, table)
+        missing.extend(f"{table}.{column}" for column in sorted(set(columns) - present))
+    return missing
+
+
+async def adopt_tables(connection: BaseDBAsyncClient, sql: str):
+    """Check that tables the script's CREATE TABLE IF NOT EXISTS skipped have the columns it declares.
+
+    SQLite reads an unknown double-quoted name as a string literal, so later migrations would
+    otherwise index and backfill constants instead of failing on a table from an older schema.
+    """
+    missing = await missing_columns(connection, declared_columns(sql))
+    if missing:
+        raise SchemaOutOfDate(
+            f"Existing tables lack columns this schema needs: {', '.join(missing)}. "
+            "Add them (or start from an empty database) and run `python migrate.py upgrade` again."
+        )
+
+
+async def applied(connection: BaseDBAsyncClient) -> List[str]:
+    await connection.execute_script(
+        'CREATE TABLE IF NOT EXISTS "schema_migrations" ("name" VARCHAR(255) NOT NULL PRIMARY KEY, "applied_at" VARCHAR(40) NOT NULL)'
+    )
+    _, rows = await connection.execute_query('SELECT "name" FROM "schema_migrations"')
+    return [row["name"] for row in rows]
+
+
+async def pending(connection: Optional[BaseDBAsyncClient] = None) -> List[str]:
+    done = set(await applied(connection or connections.get("default")))
+    return [name for name in discover() if name not in done]
+
+
+async def upgrade(connection_name: str = "default") -> List[str]:
+    """Apply pending migrations in order, each in its own transaction. Returns the names applied."""
+    connection = connections.get(connection_name)
+    dialect = dialect_of(connection)
+    placeholders = "?, ?" if dialect == "sqlite" else "$1, $2"
+    names = await pending(connection)
+    for name in names:
+        module = importlib.import_module(f"migrations.{name}")
+        async with in_transaction(connection_name) as conn:
+            await module.upgrade(conn, dialect)
+            await conn.execute_query(
+                f'INSERT INTO "schema_migrations" ("name", "applied_at") VALUES ({placeholders})',
+                [name, datetime.now(timezone.utc).isoformat()],
+            )
+    return names
+
+
+def expected_columns(dialect: str) -> Dict[str, Set[str]]:
+    """Columns of every model's table, plus those of the tables migrations create without a model."""
+    expected: Dict[str, Set[str]] = {}
+    for name in discover():
+        sql = getattr(importlib.import_module(f"migrations.{name}"), "SQL", {}).get(dialect, "")
+        for table, columns in declared_columns(sql).items():
+            expected.setdefault(table, set()).update(columns)
+    for model in Tortoise.apps["models"].values():
+        expected.setdefault(model._meta.db_table, set()).update(model._meta.db_fields)
+    return expected
+
+
+async def check_schema():
+    """Fail fast when the database is behind models.py."""
+    missing = await pending()
+    if missing:
+        raise SchemaOutOfDate(
+            f"Database schema is out of date; pending migrations: {', '.join(missing)}. Run `python migrate.py upgrade`."
+        )
+    connection = connections.get("default")
+    missing = await missing_columns(connection, expected_columns(dialect_of(connection)))
+    if missing:
+        raise SchemaOutOfDate(f"Database schema does not match models.py; missing columns: {', '.join(missing)}.")
+
+
+async def main(command: str):
+    from database import build_tortoise_config
+
+    await Tortoise.init(config=build_tortoise_config())
+    try:
+        if command == "upgrade":
+            names = await upgrade()
+            print("\n".join(f"applied {name}" for name in names) or "already up to date")
+        else:
+            done = set(await applied(connections.get("default")))
+            for name in discover():
+                print(f"[{'x' if name in done else ' '}] {name}")
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["status", "upgrade"])
+    asyncio.run(main(parser.parse_args().command))
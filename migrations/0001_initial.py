@@ -0,0 +1,120 @@
+"""Initial schema: users, businesses, products, image blobs and the email outbox.
+
+Uses IF NOT EXISTS throughout so databases created by the old generate_schemas=True boot are adopted,
+once their tables are checked for every column declared here.
+Each dialect's DDL is what Tortoise's schema generator emits for it (sqlite, asyncpg), minus the
+column defaults it bakes in from models.py's import-time datetime.now(); inserts always set those.
+"""
+from migrate import adopt_tables, run_sql
+
+SQL = {
+    "sqlite": """
+CREATE TABLE IF NOT EXISTS "imageblob" (
+    "path" VARCHAR(255) NOT NULL PRIMARY KEY,
+    "refcount" INT NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS "outboundemail" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    "dedup_key" VARCHAR(255) NOT NULL UNIQUE,
+    "recipient" VARCHAR(255) NOT NULL,
+    "template" VARCHAR(100) NOT NULL,
+    "context" JSON NOT NULL,
+    "status" VARCHAR(20) NOT NULL DEFAULT 'pending',
+    "attempts" INT NOT NULL DEFAULT 0,
+    "next_attempt_at" TIMESTAMP NOT NULL,
+    "last_error" TEXT,
+    "created_at" TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "sent_at" TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS "idx_outboundema_status_7c5d95" ON "outboundemail" ("status");
+CREATE INDEX IF NOT EXISTS "idx_outboundema_next_at_068a0c" ON "outboundemail" ("next_attempt_at");
+CREATE TABLE IF NOT EXISTS "user" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    "username" VARCHAR(200) NOT NULL UNIQUE,
+    "email" VARCHAR(255) NOT NULL UNIQUE,
+    "password" VARCHAR(255) NOT NULL,
+    "is_verified" INT NOT NULL DEFAULT 0,
+    "join_data" TIMESTAMP NOT NULL
+);
+CREATE TABLE IF NOT EXISTS "business" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    "businessname" VARCHAR(200) NOT NULL UNIQUE,
+    "city" VARCHAR(255) NOT NULL DEFAULT 'unspecified',
+    "region" VARCHAR(255) NOT NULL DEFAULT 'unspecified',
+    "business_description" TEXT,
+    "logo" VARCHAR(255) NOT NULL DEFAULT 'default.jpg',
+    "owner_id" INT NOT NULL REFERENCES "user" ("id") ON DELETE CASCADE
+);
+CREATE TABLE IF NOT EXISTS "product" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    "product_name" VARCHAR(200) NOT NULL,
+    "category" VARCHAR(255) NOT NULL DEFAULT 'unspecified',
+    "original_price" VARCHAR(40) NOT NULL,
+    "new_price" VARCHAR(40) NOT NULL,
+    "percentage_discount" INT NOT NULL,
+    "offer_expires" TIMESTAMP NOT NULL,
+    "product_image" VARCHAR(255) NOT NULL DEFAULT 'productDefault.jpg',
+    "date_published" TIMESTAMP NOT NULL,
+    "business_id" INT NOT NULL REFERENCES "business" ("id") ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS "idx_product_product_c4a22f" ON "product" ("product_name");
+CREATE INDEX IF NOT EXISTS "idx_product_categor_5402db" ON "product" ("category");
+""",
+    "postgres": """
+CREATE TABLE IF NOT EXISTS "imageblob" (
+    "path" VARCHAR(255) NOT NULL PRIMARY KEY,
+    "refcount" INT NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS "outboundemail" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "dedup_key" VARCHAR(255) NOT NULL UNIQUE,
+    "recipient" VARCHAR(255) NOT NULL,
+    "template" VARCHAR(100) NOT NULL,
+    "context" JSONB NOT NULL,
+    "status" VARCHAR(20) NOT NULL DEFAULT 'pending',
+    "attempts" INT NOT NULL DEFAULT 0,
+    "next_attempt_at" TIMESTAMPTZ NOT NULL,
+    "last_error" TEXT,
+    "created_at" TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "sent_at" TIMESTAMPTZ
+);
+CREATE INDEX IF NOT EXISTS "idx_outboundema_status_7c5d95" ON "outboundemail" ("status");
+CREATE INDEX IF NOT EXISTS "idx_outboundema_next_at_068a0c" ON "outboundemail" ("next_attempt_at");
+CREATE TABLE IF NOT EXISTS "user" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "username" VARCHAR(200) NOT NULL UNIQUE,
+    "email" VARCHAR(255) NOT NULL UNIQUE,
+    "password" VARCHAR(255) NOT NULL,
+    "is_verified" BOOL NOT NULL DEFAULT False,
+    "join_data" TIMESTAMPTZ NOT NULL
+);
+CREATE TABLE IF NOT EXISTS "business" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "businessname" VARCHAR(200) NOT NULL UNIQUE,
+    "city" VARCHAR(255) NOT NULL DEFAULT 'unspecified',
+    "region" VARCHAR(255) NOT NULL DEFAULT 'unspecified',
+    "business_description" TEXT,
+    "logo" VARCHAR(255) NOT NULL DEFAULT 'default.jpg',
+    "owner_id" INT NOT NULL REFERENCES "user" ("id") ON DELETE CASCADE
+);
+CREATE TABLE IF NOT EXISTS "product" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "product_name" VARCHAR(200) NOT NULL,
+    "category" VARCHAR(255) NOT NULL DEFAULT 'unspecified',
+    "original_price" DECIMAL(10,2) NOT NULL,
+    "new_price" DECIMAL(10,2) NOT NULL,
+    "percentage_discount" INT NOT NULL,
+    "offer_expires" TIMESTAMPTZ NOT NULL,
+    "product_image" VARCHAR(255) NOT NULL DEFAULT 'productDefault.jpg',
+    "date_published" TIMESTAMPTZ NOT NULL,
+    "business_id" INT NOT NULL REFERENCES "business" ("id") ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS "idx_product_product_c4a22f" ON "product" ("product_name");
+CREATE INDEX IF NOT EXISTS "idx_product_categor_5402db" ON "product" ("category");
+""",
+}
+
+
+async def upgrade(connection, dialect: str):
+    await run_sql(connection, SQL[dialect])
+    await adopt_tables(connection, SQL[dialect])
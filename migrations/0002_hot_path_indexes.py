@@ -0,0 +1,27 @@
+"""Indexes for the product listing/filtering queries, the outbox poller, and one business per owner.
+
+SQLite stores DecimalField as text, so price comparisons go through CAST(... AS REAL); the
+expression index matches the expression the listing query uses (see database.decimal_value).
+"""
+from migrate import run_sql
+
+COMMON = """
+CREATE UNIQUE INDEX IF NOT EXISTS "uid_business_owner" ON "business" ("owner_id");
+CREATE INDEX IF NOT EXISTS "idx_product_published" ON "product" ("date_published", "id");
+CREATE INDEX IF NOT EXISTS "idx_product_business_published" ON "product" ("business_id", "date_published", "id");
+CREATE INDEX IF NOT EXISTS "idx_product_category_published" ON "product" ("category", "date_published", "id");
+CREATE INDEX IF NOT EXISTS "idx_outboundemail_due" ON "outboundemail" ("status", "next_attempt_at");
+"""
+
+SQL = {
+    "sqlite": COMMON + """
+CREATE INDEX IF NOT EXISTS "idx_product_category_price" ON "product" ("category", CAST("new_price" AS REAL));
+""",
+    "postgres": COMMON + """
+CREATE INDEX IF NOT EXISTS "idx_product_category_price" ON "product" ("category", "new_price");
+""",
+}
+
+
+async def upgrade(connection, dialect: str):
+    await run_sql(connection, SQL[dialect])
@@ -0,0 +1,37 @@
+"""Full-text index over product name and category plus the owning business's name, city and description.
+
+SQLite uses an FTS5 table keyed by product id (rowid); PostgreSQL a weighted tsvector per product
+with a GIN index. search.py keeps both in sync as products and businesses change.
+"""
+from migrate import run_sql
+
+SQL = {
+    "sqlite": """
+CREATE VIRTUAL TABLE IF NOT EXISTS "product_search" USING fts5(
+    "product_name", "category", "businessname", "city", "business_description",
+    tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+);
+INSERT INTO "product_search" (rowid, "product_name", "category", "businessname", "city", "business_description")
+SELECT p."id", p."product_name", p."category", b."businessname", b."city", COALESCE(b."business_description", '')
+FROM "product" p JOIN "business" b ON b."id" = p."business_id";
+""",
+    "postgres": """
+CREATE TABLE IF NOT EXISTS "product_search" (
+    "product_id" INT NOT NULL PRIMARY KEY REFERENCES "product" ("id") ON DELETE CASCADE,
+    "document" TSVECTOR NOT NULL
+);
+CREATE INDEX IF NOT EXISTS "idx_product_search_document" ON "product_search" USING GIN ("document");
+INSERT INTO "product_search" ("product_id", "document")
+SELECT p."id",
+    setweight(to_tsvector('simple', p."product_name"), 'A')
+    || setweight(to_tsvector('simple', p."category"), 'B')
+    || setweight(to_tsvector('simple', b."businessname" || ' ' || b."city"), 'C')
+    || setweight(to_tsvector('simple', COALESCE(b."business_description", '')), 'D')
+FROM "product" p JOIN "business" b ON b."id" = p."business_id"
+ON CONFLICT ("product_id") DO NOTHING;
+""",
+}
+
+
+async def upgrade(connection, dialect: str):
+    await run_sql(connection, SQL[dialect])
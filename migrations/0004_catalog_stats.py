@@ -0,0 +1,54 @@
+"""Per-category and per-business product aggregates behind GET /catalog/stats.
+
+One row per group: scope is "category" or "business", key the category name or business id.
+The mean discount is discount_sum / product_count, so inserts can be applied as deltas.
+SQLite keeps prices as REAL here so MIN/MAX compare numerically.
+"""
+from migrate import run_sql
+
+SQL = {
+    "sqlite": """
+CREATE TABLE IF NOT EXISTS "catalog_stats" (
+    "scope" VARCHAR(16) NOT NULL,
+    "key" VARCHAR(255) NOT NULL,
+    "product_count" INT NOT NULL,
+    "min_price" REAL,
+    "max_price" REAL,
+    "discount_sum" BIGINT NOT NULL,
+    "newest_published" TIMESTAMP,
+    PRIMARY KEY ("scope", "key")
+);
+INSERT INTO "catalog_stats"
+SELECT 'category', "category", COUNT(*), MIN(CAST("new_price" AS REAL)), MAX(CAST("new_price" AS REAL)),
+    SUM("percentage_discount"), MAX("date_published")
+FROM "product" GROUP BY "category";
+INSERT INTO "catalog_stats"
+SELECT 'business', CAST("business_id" AS TEXT), COUNT(*), MIN(CAST("new_price" AS REAL)), MAX(CAST("new_price" AS REAL)),
+    SUM("percentage_discount"), MAX("date_published")
+FROM "product" GROUP BY "business_id";
+""",
+    "postgres": """
+CREATE TABLE IF NOT EXISTS "catalog_stats" (
+    "scope" VARCHAR(16) NOT NULL,
+    "key" VARCHAR(255) NOT NULL,
+    "product_count" INT NOT NULL,
+    "min_price" DECIMAL(10,2),
+    "max_price" DECIMAL(10,2),
+    "discount_sum" BIGINT NOT NULL,
+    "newest_published" TIMESTAMPTZ,
+    PRIMARY KEY ("scope", "key")
+);
+INSERT INTO "catalog_stats"
+SELECT 'category', "category", COUNT(*), MIN("new_price"), MAX("new_price"), SUM("percentage_discount"), MAX("date_published")
+FROM "product" GROUP BY "category"
+ON CONFLICT DO NOTHING;
+INSERT INTO "catalog_stats"
+SELECT 'business', CAST("business_id" AS TEXT), COUNT(*), MIN("new_price"), MAX("new_price"), SUM("percentage_discount"), MAX("date_published")
+FROM "product" GROUP BY "business_id"
+ON CONFLICT DO NOTHING;
+""",
+}
+
+
+async def upgrade(connection, dialect: str):
+    await run_sql(connection, SQL[dialect])
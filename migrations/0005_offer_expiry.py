@@ -0,0 +1,23 @@
+"""Product.offer_active, cleared by the offer expiry scheduler once offer_expires has passed.
+
+Existing rows start active; the scheduler's first pass on startup flags the ones already expired.
+"""
+from migrate import run_sql
+
+INDEXES = """
+CREATE INDEX IF NOT EXISTS "idx_product_offer_published" ON "product" ("offer_active", "date_published", "id");
+CREATE INDEX IF NOT EXISTS "idx_product_offer_expires" ON "product" ("offer_active", "offer_expires");
+"""
+
+SQL = {
+    "sqlite": """
+ALTER TABLE "product" ADD COLUMN "offer_active" INT NOT NULL DEFAULT 1;
+""" + INDEXES,
+    "postgres": """
+ALTER TABLE "product" ADD COLUMN IF NOT EXISTS "offer_active" BOOL NOT NULL DEFAULT TRUE;
+""" + INDEXES,
+}
+
+
+async def upgrade(connection, dialect: str):
+    await run_sql(connection, SQL[dialect])
@@ -0,0 +1,34 @@
+"""Change counters behind the catalog ETags, shared by every worker and node.
+
+One row per table ("product") and per row with its own resource ("product:42"). The row with
+the empty key is the counter every bump draws its sequence number from; changed_at is Unix time.
+"""
+import time
+
+from migrate import run_sql
+
+SQL = {
+    "sqlite": """
+CREATE TABLE IF NOT EXISTS "catalog_version" (
+    "key" VARCHAR(255) NOT NULL PRIMARY KEY,
+    "sequence" BIGINT NOT NULL,
+    "changed_at" REAL NOT NULL
+);
+""",
+    "postgres": """
+CREATE TABLE IF NOT EXISTS "catalog_version" (
+    "key" VARCHAR(255) NOT NULL PRIMARY KEY,
+    "sequence" BIGINT NOT NULL,
+    "changed_at" DOUBLE PRECISION NOT NULL
+);
+""",
+}
+
+
+async def upgrade(connection, dialect: str):
+    await run_sql(connection, SQL[dialect])
+    mark = "?" if dialect == "sqlite" else "$1"
+    await connection.execute_query(
+        f'INSERT INTO "catalog_version" ("key", "sequence", "changed_at") VALUES (\'\', 0, {mark}) ON CONFLICT DO NOTHING',
+        [time.time()],
+    )
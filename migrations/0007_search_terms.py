@@ -0,0 +1,49 @@
+"""Vocabulary of the search index, trigram-indexed so misspelled query words can be corrected.
+
+One row per distinct word of the indexed columns. SQLite indexes it with an external-content FTS5
+table using the trigram tokenizer (SQLite 3.34+), kept in step by a trigger; PostgreSQL with a
+pg_trgm GIN index, which needs the extension to be available to the migrating role. search.py adds
+the words of every product it indexes; rebuilding the index rebuilds the vocabulary.
+"""
+from migrate import run_sql
+
+SQL = {
+    "sqlite": """
+CREATE TABLE IF NOT EXISTS "search_term" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    "term" TEXT NOT NULL UNIQUE
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS "search_term_trigram" USING fts5(
+    "term", content = 'search_term', content_rowid = 'id', tokenize = 'trigram'
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS "product_search_vocab" USING fts5vocab('product_search', 'row');
+CREATE TRIGGER IF NOT EXISTS "search_term_indexed" AFTER INSERT ON "search_term" BEGIN INSERT INTO "search_term_trigram" (rowid, "term") VALUES (new."id", new."term"); END;
+""",
+    "postgres": """
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE TABLE IF NOT EXISTS "search_term" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "term" TEXT NOT NULL UNIQUE
+);
+CREATE INDEX IF NOT EXISTS "idx_search_term_trigram" ON "search_term" USING GIN ("term" gin_trgm_ops);
+""",
+}
+
+# Backfill from the words already in the search index.
+BACKFILL = {
+    "sqlite": """
+INSERT INTO "search_term" ("term")
+SELECT "term" FROM "product_search_vocab" WHERE length("term") BETWEEN 3 AND 40 ORDER BY "term"
+ON CONFLICT DO NOTHING
+""",
+    "postgres": """
+INSERT INTO "search_term" ("term")
+SELECT word FROM ts_stat('SELECT "document" FROM "product_search"') WHERE length(word) BETWEEN 3 AND 40 ORDER BY word
+ON CONFLICT DO NOTHING
+""",
+}
+
+
+async def upgrade(connection, dialect: str):
+    await run_sql(connection, SQL[dialect])
+    await connection.execute_query(BACKFILL[dialect])
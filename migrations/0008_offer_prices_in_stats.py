@@ -0,0 +1,38 @@
+"""Recompute catalog_stats now that prices follow the offer: new_price while offer_active, else
+original_price, and an expired offer's percentage_discount (new_price as a share of original_price)
+counted as 100.
+
+Rows still flagged active past their deadline are caught up by the scheduler's first pass, which
+refreshes the groups it touches.
+"""
+from migrate import run_sql
+
+PRICE = 'CASE WHEN "offer_active" THEN "new_price" ELSE "original_price" END'
+DISCOUNT = 'CASE WHEN "offer_active" THEN "percentage_discount" ELSE 100 END'
+
+SQL = {
+    "sqlite": f"""
+DELETE FROM "catalog_stats";
+INSERT INTO "catalog_stats"
+SELECT 'category', "category", COUNT(*), MIN(CAST({PRICE} AS REAL)), MAX(CAST({PRICE} AS REAL)),
+    SUM({DISCOUNT}), MAX("date_published")
+FROM "product" GROUP BY "category";
+INSERT INTO "catalog_stats"
+SELECT 'business', CAST("business_id" AS TEXT), COUNT(*), MIN(CAST({PRICE} AS REAL)), MAX(CAST({PRICE} AS REAL)),
+    SUM({DISCOUNT}), MAX("date_published")
+FROM "product" GROUP BY "business_id";
+""",
+    "postgres": f"""
+DELETE FROM "catalog_stats";
+INSERT INTO "catalog_stats"
+SELECT 'category', "category", COUNT(*), MIN({PRICE}), MAX({PRICE}), SUM({DISCOUNT}), MAX("date_published")
+FROM "product" GROUP BY "category";
+INSERT INTO "catalog_stats"
+SELECT 'business', CAST("business_id" AS TEXT), COUNT(*), MIN({PRICE}), MAX({PRICE}), SUM({DISCOUNT}), MAX("date_published")
+FROM "product" GROUP BY "business_id";
+""",
+}
+
+
+async def upgrade(connection, dialect: str):
+    await run_sql(connection, SQL[dialect])
@@ -4,6 +4,8 @@ from tortoise.contrib.pydantic import pydantic_model_creator
 from pydantic import BaseModel
 from datetime import datetime
 
+# The database schema is owned by migrations/ (see migrate.py): any field, table or index change
+# here needs a matching migration file.
 
 
 class User(Model):
@@ -32,10 +34,31 @@ class Product(Model):
     new_price = fields.DecimalField(max_digits=10, decimal_places=2)
     percentage_discount = fields.IntField()
     offer_expires = fields.DatetimeField(default=datetime.now())
+    # Cleared by the offer expiry scheduler (offers.py) once offer_expires has passed.
+    offer_active = fields.BooleanField(default=True)
     product_image = fields.CharField(max_length=255, null=False, default="productDefault.jpg")
     business = fields.ForeignKeyField("models.Business", related_name="products")
     date_published = fields.DatetimeField(default=datetime.now())
 
+class OutboundEmail(Model):
+    id = fields.IntField(pk=True)
+    # One message per (template, subject entity), e.g. "verification:42"; re-enqueueing is a no-op.
+    dedup_key = fields.CharField(max_length=255, unique=True)
+    recipient = fields.CharField(max_length=255)
+    template = fields.CharField(max_length=100)
+    context = fields.JSONField(default=dict)
+    status = fields.CharField(max_length=20, default="pending", index=True)
+    attempts = fields.IntField(default=0)
+    next_attempt_at = fields.DatetimeField(index=True)
+    last_error = fields.TextField(null=True)
+    created_at = fields.DatetimeField(auto_now_add=True)
+    sent_at = fields.DatetimeField(null=True)
+
+class ImageBlob(Model):
+    # "<directory>/<content-hash>.<ext>" of an uploaded image; its derivatives share the stem.
+    path = fields.CharField(max_length=255, pk=True)
+    refcount = fields.IntField(default=0)
+
 user_pydantic = pydantic_model_creator(User, name="User", exclude=("is_verified",))
 user_pydantic_in = pydantic_model_creator(User, name="UserIn", exclude_readonly=True,exclude=("is_verified","join_data"))
 user_pydantic_out = pydantic_model_creator(User, name="UserOut", exclude=("password",))
@@ -46,5 +69,5 @@ business_pydantic_in = pydantic_model_creator(Business, name="BusinessIn", exclu
 
 
 product_pydantic = pydantic_model_creator(Product, name="Product")
-product_pydantic_in = pydantic_model_creator(Product, name="ProductIn", exclude=("percentage_discount", "id", "product_image","date_published"))
+product_pydantic_in = pydantic_model_creator(Product, name="ProductIn", exclude=("percentage_discount", "id", "product_image","date_published","offer_active"))
 
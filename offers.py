@@ -0,0 +1,129 @@
+"""
+Offer expiry.
+
+OfferExpiryScheduler keeps a min-heap of upcoming Product.offer_expires deadlines, sleeps until
+the earliest one and then clears offer_active on every product whose offer has run out, in one
+UPDATE. The heap is filled with up to HEAP_SIZE distinct deadlines from the database whenever it
+runs dry; new or edited offers are pushed with schedule(). Expired offers keep their prices so a
+merchant can renew them by moving offer_expires forward.
+"""
+import asyncio
+import heapq
+import logging
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, List, Optional
+
+from tortoise.connection import connections
+
+from database import placeholders
+from models import Product
+from settings import settings
+
+HEAP_SIZE = settings.get_int("OFFER_HEAP_SIZE", 1000)
+# Upper bound on one sleep, so deadlines beyond the loaded window are picked up eventually.
+MAX_SLEEP = settings.get_float("OFFER_MAX_SLEEP", 3600)
+
+logger = logging.getLogger("offers")
+
+
+def utc(value: datetime) -> datetime:
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def is_active(offer_expires: Optional[datetime]) -> bool:
+    return offer_expires is None or utc(offer_expires) > datetime.now(timezone.utc)
+
+
+class OfferExpiryScheduler:
+    def __init__(self, heap_size: int = HEAP_SIZE, max_sleep: float = MAX_SLEEP):
+        self.heap_size = heap_size
+        self.max_sleep = max_sleep
+        self.deadlines: List[datetime] = []
+        self.expired = 0
+        self.on_expired: Optional[Callable[[List[int]], Awaitable[None]]] = None
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def schedule(self, offer_expires: Optional[datetime]):
+        """Make sure a (new or moved) deadline is acted on."""
+        if offer_expires is None:
+            return
+        deadline = utc(offer_expires)
+        heapq.heappush(self.deadlines, deadline)
+        if self.deadlines[0] == deadline:
+            self._wakeup.set()
+
+    async def load(self):
+        """Refill the heap with the earliest deadlines of offers that are still active."""
+        upcoming = await (
+            Product.filter(offer_active=True)
+            .order_by("offer_expires")
+            .distinct()
+            .limit(self.heap_size)
+            .values_list("offer_expires", flat=True)
+        )
+        self.deadlines = [utc(deadline) for deadline in upcoming if deadline is not None]
+        heapq.heapify(self.deadlines)
+
+    async def expire_due(self) -> List[int]:
+        """Flag every active offer that has run out; returns the affected product ids."""
+        now = datetime.now(timezone.utc)
+        connection = connections.get("default")
+        # One statement, so the ids reported are exactly the rows it changed (SQLite 3.35+). The dict
+        # variant, as asyncpg's execute_query drops the rows of anything starting with UPDATE.
+        rows = await connection.execute_query_dict(
+            'UPDATE "product" SET "offer_active" = FALSE WHERE "offer_active" = TRUE '
+            f'AND "offer_expires" <= {placeholders(connection.capabilities.dialect, 1)} RETURNING "id"',
+            [now],
+        )
+        ids = [row["id"] for row in rows]
+        if ids:
+            self.expired += len(ids)
+            if self.on_expired is not None:
+                await self.on_expired(ids)
+        while self.deadlines and self.deadlines[0] <= now:
+            heapq.heappop(self.deadlines)
+        return ids
+
+    async def run_forever(self):
+        while True:
+            # Cleared before the pass, so a deadline pushed during it still wakes the next wait.
+            self._wakeup.clear()
+            try:
+                await self.expire_due()
+                if not self.deadlines:
+                    await self.load()
+            except Exception:
+                logger.exception("Offer expiry pass failed")
+            timeout = self.max_sleep
+            if self.deadlines:
+                timeout = min(timeout, max(0.0, (self.deadlines[0] - datetime.now(timezone.utc)).total_seconds()))
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self, on_expired: Optional[Callable[[List[int]], Awaitable[None]]] = None):
+        self.on_expired = on_expired
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self.run_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def stats(self) -> dict:
+        return {"scheduled": len(self.deadlines), "expired": self.expired}
+
+
+offer_scheduler = OfferExpiryScheduler()
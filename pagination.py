@@ -0,0 +1,35 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+from tortoise import timezone
+from tortoise.expressions import Q
+
+
+def encode_cursor(date_published: datetime, product_id: int) -> str:
+    """Pack the sort key of the last row on a page into an opaque token."""
+    raw = json.dumps([date_published.isoformat(), product_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        published, product_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(published), int(product_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def after_cursor(cursor: Optional[str]) -> Q:
+    """Keyset condition for rows that sort after `cursor` in (-date_published, -id) order."""
+    if not cursor:
+        return Q()
+    published, product_id = decode_cursor(cursor)
+    if not timezone.get_use_tz() and timezone.is_aware(published):
+        # Rows come back aware, but without use_tz the column holds naive values in the configured
+        # zone; SQLite compares them as text, so the bound has to be written the same way.
+        published = timezone.make_naive(published)
+    return Q(date_published__lt=published) | Q(date_published=published, id__lt=product_id)
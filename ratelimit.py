@@ -0,0 +1,369 @@
+"""
+Token-bucket rate limiting, applied by an ASGI middleware before the request reaches a handler.
+
+Every request spends a token from its client's bucket for the route's OpenAPI tag. POST /token
+and POST /users/ have their own, tighter per-client buckets, and failed logins also drain a bucket
+per username tried, so credential stuffing is turned away before bcrypt and a signup flood before
+the uniqueness queries and the verification mail. Limits are "N/period" strings ("0" turns one off):
+
+    RATE_LIMIT_ENABLED=true
+    RATE_LIMIT_DEFAULT=600/minute            tags without a limit of their own
+    RATE_LIMIT_AUTHENTICATION=60/minute      RATE_LIMIT_<TAG> for any route tag
+    RATE_LIMIT_LOGIN=20/minute               POST /token, per client
+    RATE_LIMIT_LOGIN_FAILURES=10/15minute    failed POST /token, per username
+    RATE_LIMIT_SIGNUP=5/hour                 POST /users/, per client
+
+Buckets live in this process (MemoryStore) unless RATE_LIMIT_STORE points at a shared bucket
+server, which several nodes can use so that a limit holds across all of them:
+
+    python ratelimit.py serve --port 7379
+    RATE_LIMIT_STORE=tcp://10.0.0.5:7379
+"""
+import argparse
+import asyncio
+import logging
+import math
+import re
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+from starlette.routing import Match
+
+from metrics import Counter, register
+from settings import settings
+
+RATE_LIMIT_ENABLED = settings.get_flag("RATE_LIMIT_ENABLED", True)
+# Behind a reverse proxy every request comes from the proxy; use the address it forwards instead.
+TRUST_FORWARDED = settings.get_flag("RATE_LIMIT_TRUST_FORWARDED", False)
+# Login forms are tiny; anything larger is passed through without the per-username check.
+MAX_FORM_BYTES = 16384
+
+logger = logging.getLogger("ratelimit")
+
+rate_limited = register(Counter("rate_limited_total", "Requests rejected by the rate limiter.", ("route", "bucket")))
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+LIMIT_FORMAT = re.compile(r"^\s*(\d+)\s*/\s*(\d*)\s*(second|minute|hour|day)s?\s*$")
+
+
+@dataclass(frozen=True)
+class Limit:
+    burst: int
+    rate: float  # tokens per second
+
+
+def parse_limit(text: str) -> Optional[Limit]:
+    """"20/minute" or "10/15minute" -> Limit; "0" or "" -> None (unlimited)."""
+    if not text or text.strip() == "0":
+        return None
+    match = LIMIT_FORMAT.match(text)
+    if match is None:
+        raise ValueError(f"Invalid rate limit {text!r}, expected e.g. '20/minute'")
+    count, multiple, unit = int(match[1]), int(match[2] or 1), match[3]
+    return Limit(burst=count, rate=count / (multiple * PERIODS[unit])) if count else None
+
+
+def _limit(name: str, default: str) -> Optional[Limit]:
+    return parse_limit(settings.get(f"RATE_LIMIT_{name}") or default)
+
+
+DEFAULT_LIMIT = _limit("DEFAULT", "600/minute")
+TAG_DEFAULTS = {"Authentication": "60/minute", "Uploads": "60/minute"}
+# Route-specific client buckets, replacing the tag's: (method, path template) -> limit.
+ROUTE_LIMITS = {("POST", "/token"): _limit("LOGIN", "20/minute"), ("POST", "/users/"): _limit("SIGNUP", "5/hour")}
+LOGIN_FAILURE_LIMIT = _limit("LOGIN_FAILURES", "10/15minute")
+
+
+def tag_limit(tag: str) -> Optional[Limit]:
+    """RATE_LIMIT_<TAG>, else the tag's entry in TAG_DEFAULTS, else DEFAULT_LIMIT."""
+    name = re.sub(r"\W", "_", tag).upper()
+    if tag and (settings.get(f"RATE_LIMIT_{name}") or tag in TAG_DEFAULTS):
+        return _limit(name, TAG_DEFAULTS.get(tag, ""))
+    return DEFAULT_LIMIT
+
+
+class MemoryStore:
+    """Buckets for this process, spread over shards so stale ones are pruned a shard at a time."""
+
+    def __init__(self, shards: int = 16, max_keys: int = 100000):
+        self.shards: List[Dict[str, Tuple[float, float, float]]] = [{} for _ in range(shards)]
+        self.max_per_shard = max(1, max_keys // shards)
+
+    async def take(self, key: str, limit: Limit, cost: float = 1.0) -> float:
+        return self.take_now(key, limit, cost)
+
+    def take_now(self, key: str, limit: Limit, cost: float = 1.0) -> float:
+        """Spend `cost` tokens if at least one is left (cost 0 only checks). Returns 0, or seconds to wait."""
+        shard = self.shards[hash(key) % len(self.shards)]
+        now = time.monotonic()
+        entry = shard.get(key)
+        tokens = limit.burst if entry is None else min(limit.burst, entry[0] + (now - entry[1]) * limit.rate)
+        if tokens < 1:
+            return (1 - tokens) / limit.rate
+        if cost:
+            tokens -= cost
+            # (tokens, updated, when the bucket is full again and so no different from a missing one)
+            shard[key] = (tokens, now, now + (limit.burst - tokens) / limit.rate)
+            if len(shard) > self.max_per_shard:
+                self._prune(shard, now)
+        return 0.0
+
+    def _prune(self, shard: dict, now: float):
+        for key in [key for key, entry in shard.items() if entry[2] <= now]:
+            del shard[key]
+        # Still over: forget the oldest buckets. Forgetting only ever lets a client through early.
+        while len(shard) > self.max_per_shard * 3 // 4:
+            del shard[next(iter(shard))]
+
+    def __len__(self):
+        return sum(len(shard) for shard in self.shards)
+
+    async def close(self):
+        pass
+
+
+class RemoteStore:
+    """Client for a shared bucket server. Requests are pipelined over one connection; fails open."""
+
+    def __init__(self, host: str, port: int, timeout: float = 0.5, retry_after: float = 5.0):
+        self.host, self.port, self.timeout, self.retry_after = host, port, timeout, retry_after
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._pending: Deque[asyncio.Future] = deque()
+        self._connecting: Optional[asyncio.Lock] = None
+        self._down_until = 0.0
+
+    async def _connect(self) -> bool:
+        if self._connecting is None:
+            self._connecting = asyncio.Lock()
+        async with self._connecting:
+            if self._writer is not None:
+                return True
+            if time.monotonic() < self._down_until:
+                return False
+            try:
+                reader, self._writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.timeout)
+            except (OSError, asyncio.TimeoutError):
+                self._down_until = time.monotonic() + self.retry_after
+                logger.warning("Rate limit store %s:%d unreachable; not limiting for %.0fs", self.host, self.port, self.retry_after)
+                return False
+            self._reader_task = asyncio.create_task(self._read_replies(reader))
+            return True
+
+    async def _read_replies(self, reader: asyncio.StreamReader):
+        try:
+            while line := await reader.readline():
+                future = self._pending.popleft()
+                if not future.done():
+                    future.set_result(float(line))
+        except (ConnectionError, ValueError, IndexError):
+            pass
+        finally:
+            self._disconnect()
+
+    def _disconnect(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        while self._pending:
+            future = self._pending.popleft()
+            if not future.done():
+                future.set_result(0.0)
+
+    async def take(self, key: str, limit: Limit, cost: float = 1.0) -> float:
+        if self._writer is None and not await self._connect():
+            return 0.0
+        writer = self._writer
+        if writer is None:
+            return 0.0
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(future)
+        writer.write(f"TAKE {quote(key, safe='')} {limit.burst} {limit.rate!r} {cost!r}\n".encode())
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            # Replies are matched by order, so a lost one means the connection is no good any more.
+            self._disconnect()
+            return 0.0
+
+    async def close(self):
+        self._disconnect()
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            self._reader_task = None
+
+
+def build_store(url: Optional[str] = None):
+    url = url or settings.get("RATE_LIMIT_STORE") or "memory"
+    if url == "memory":
+        return MemoryStore()
+    parts = urlsplit(url)
+    if parts.scheme != "tcp" or not parts.hostname or not parts.port:
+        raise ValueError(f"Invalid RATE_LIMIT_STORE {url!r}, expected 'memory' or tcp://host:port")
+    return RemoteStore(parts.hostname, parts.port)
+
+
+rate_limit_store = build_store()
+
+
+async def _receive_form(receive) -> Tuple[List[dict], bytes]:
+    """Read a small request body, keeping the messages so they can be replayed to the app."""
+    messages, body = [], b""
+    while True:
+        message = await receive()
+        messages.append(message)
+        if message["type"] != "http.request":
+            return messages, b""
+        body += message.get("body", b"")
+        if len(body) > MAX_FORM_BYTES:
+            return messages, b""
+        if not message.get("more_body", False):
+            return messages, body
+
+
+class RateLimitMiddleware:
+    """ASGI middleware: rejects over-limit requests with 429 before routing reaches a handler."""
+
+    def __init__(self, app, store=None):
+        self.app = app
+        self.store = store or rate_limit_store
+        self.routes: Optional[list] = None
+
+    def route_limits(self, scope):
+        """(route, client bucket name, client limit) for the API route the request is headed to."""
+        if self.routes is None:
+            self.routes = []
+            for route in scope["app"].router.routes:
+                tags = getattr(route, "tags", None)
+                if tags is None:
+                    continue  # mounts (static files) are not limited here
+                for method in route.methods:
+                    if (method, route.path) in ROUTE_LIMITS:
+                        bucket, limit = f"{method} {route.path}", ROUTE_LIMITS[method, route.path]
+                        break
+                else:
+                    bucket = tags[0] if tags else "default"
+                    limit = tag_limit(tags[0] if tags else "")
+                self.routes.append((route, bucket, limit))
+        for route, bucket, limit in self.routes:
+            match, child_scope = route.matches(scope)
+            if match is Match.FULL:
+                return route, child_scope, bucket, limit
+        return None
+
+    def client(self, scope) -> str:
+        if TRUST_FORWARDED:
+            for name, value in scope["headers"]:
+                if name == b"x-forwarded-for":
+                    # The last hop is the one our proxy saw; earlier entries are client-supplied.
+                    return value.decode("latin-1").rsplit(",", 1)[-1].strip()
+        return scope["client"][0] if scope.get("client") else "unknown"
+
+    async def reject(self, scope, send, route, child_scope: dict, bucket: str, wait: float):
+        # Lets the metrics middleware file the 429 under the route rather than "unmatched".
+        scope.update(child_scope)
+        rate_limited.inc(route.path, bucket)
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [(b"content-type", b"application/json"), (b"retry-after", str(max(1, math.ceil(wait))).encode())],
+        })
+        await send({"type": "http.response.body", "body": b'{"detail":"Too many requests, slow down."}'})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        matched = self.route_limits(scope)
+        if matched is None:
+            return await self.app(scope, receive, send)
+        route, child_scope, bucket, limit = matched
+        client = self.client(scope)
+        if limit is not None:
+            wait = await self.store.take(f"{bucket}|{client}", limit)
+            if wait:
+                return await self.reject(scope, send, route, child_scope, bucket, wait)
+
+        if route.path != "/token" or LOGIN_FAILURE_LIMIT is None:
+            return await self.app(scope, receive, send)
+
+        messages, body = await _receive_form(receive)
+        username = (parse_qs(body.decode("latin-1")).get("username") or [""])[0]
+        key = f"login-failures|{username}"
+        if username:
+            wait = await self.store.take(key, LOGIN_FAILURE_LIMIT, cost=0)
+            if wait:
+                return await self.reject(scope, send, route, child_scope, "login-failures", wait)
+        replay = deque(messages)
+
+        async def replay_receive():
+            return replay.popleft() if replay else await receive()
+
+        status = 0
+
+        async def capture_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        await self.app(scope, replay_receive, capture_status)
+        if username and status == 401:
+            await self.store.take(key, LOGIN_FAILURE_LIMIT)
+
+
+class BucketServer:
+    """Shared buckets for several app nodes: one "TAKE key burst rate cost" line in, the wait out."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 7379, max_keys: int = 1000000):
+        self.host, self.port = host, port
+        self.store = MemoryStore(max_keys=max_keys)
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> "BucketServer":
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while line := await reader.readline():
+                try:
+                    command, key, burst, rate, cost = line.decode().split()
+                    wait = self.store.take_now(unquote(key), Limit(int(burst), float(rate)), float(cost))
+                except ValueError:
+                    wait = 0.0
+                writer.write(f"{wait!r}\n".encode())
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(host: str, port: int):
+    server = await BucketServer(host, port).start()
+    print(f"Rate limit buckets served on {server.host}:{server.port}")
+    try:
+        while True:
+            await asyncio.sleep(60)
+            print(f"{len(server.store)} active buckets")
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["serve"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7379)
+    args = parser.parse_args()
+    asyncio.run(serve(args.host, args.port))
@@ -0,0 +1,46 @@
+import os
+from functools import lru_cache
+from typing import List, Optional
+
+from markupsafe import escape
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+
+
+@lru_cache(maxsize=None)
+def jinja_environment():
+    """Created on first use, once per process; compiled templates are cached by the environment."""
+    from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+    return Environment(
+        loader=FileSystemLoader(TEMPLATE_DIR),
+        autoescape=select_autoescape(["html"]),
+        auto_reload=False,
+    )
+
+_SLOT = "\x00slot\x00"
+
+
+class PrecompiledTemplate:
+    """A template rendered once around a single per-message slot.
+
+    Everything except `slot` is rendered the first time it is needed; after that `render()`
+    only joins the static fragments around the (escaped, for HTML) value.
+    """
+
+    def __init__(self, name: str, slot: str, **context):
+        self.name = name
+        self.escape = name.endswith(".html")
+        self.slot = slot
+        self.context = context
+        self._parts: Optional[List[str]] = None
+
+    @property
+    def parts(self) -> List[str]:
+        if self._parts is None:
+            template = jinja_environment().get_template(self.name)
+            self._parts = template.render(**self.context, **{self.slot: _SLOT}).split(_SLOT)
+        return self._parts
+
+    def render(self, value: str) -> str:
+        return str(escape(value) if self.escape else value).join(self.parts)
@@ -0,0 +1,249 @@
+import re
+from typing import Iterable, List, Optional, Set, Tuple
+
+from tortoise import BaseDBAsyncClient
+from tortoise.connection import connections
+
+from database import placeholders, read_connection
+from settings import settings
+
+# Column weights, most to least important: product name, category, business name, city, description.
+SQLITE_WEIGHTS = "10.0, 5.0, 3.0, 2.0, 1.0"
+
+MAX_TERMS = 8
+
+# Words the vocabulary (search_term) keeps; shorter words are never corrected.
+MIN_TERM_LENGTH = 3
+MAX_TERM_LENGTH = 40
+# Vocabulary words sharing the most trigrams with a query word are checked for edit distance,
+# and up to MAX_CORRECTIONS of the closest are searched in its place.
+CORRECTION_CANDIDATES = 100
+MAX_CORRECTIONS = 3
+TERM_BATCH = 500
+
+# Ranking scores every candidate, so a very common term would rank a large share of the catalog.
+# Only the most recent SEARCH_CANDIDATES matches (highest ids) are ranked. FTS5 walks matches in
+# id order and stops there; on PostgreSQL it bounds the ranking work.
+SEARCH_CANDIDATES = settings.get_int("SEARCH_CANDIDATES", 2000)
+
+# Source rows for the index: one per product, with its business's searchable fields.
+SQLITE_SOURCE = """
+    SELECT p."id", p."product_name", p."category", b."businessname", b."city", COALESCE(b."business_description", '')
+    FROM "product" p JOIN "business" b ON b."id" = p."business_id"
+"""
+
+POSTGRES_DOCUMENT = """
+    SELECT p."id",
+        setweight(to_tsvector('simple', p."product_name"), 'A')
+        || setweight(to_tsvector('simple', p."category"), 'B')
+        || setweight(to_tsvector('simple', b."businessname" || ' ' || b."city"), 'C')
+        || setweight(to_tsvector('simple', COALESCE(b."business_description", '')), 'D')
+    FROM "product" p JOIN "business" b ON b."id" = p."business_id"
+"""
+
+
+# Text the vocabulary is taken from, per product.
+TERM_SOURCE = """
+    SELECT DISTINCT p."product_name", p."category", b."businessname", b."city", b."business_description"
+    FROM "product" p JOIN "business" b ON b."id" = p."business_id"
+"""
+
+# The whole vocabulary, read back from the index itself.
+VOCABULARY_FROM_INDEX = {
+    "sqlite": f"""
+        INSERT INTO "search_term" ("term")
+        SELECT "term" FROM "product_search_vocab" WHERE length("term") BETWEEN {MIN_TERM_LENGTH} AND {MAX_TERM_LENGTH}
+        ORDER BY "term" ON CONFLICT DO NOTHING
+    """,
+    "postgres": f"""
+        INSERT INTO "search_term" ("term")
+        SELECT word FROM ts_stat('SELECT "document" FROM "product_search"')
+        WHERE length(word) BETWEEN {MIN_TERM_LENGTH} AND {MAX_TERM_LENGTH}
+        ORDER BY word ON CONFLICT DO NOTHING
+    """,
+}
+
+
+def _writer() -> BaseDBAsyncClient:
+    return connections.get("default")
+
+
+async def index_products(product_ids: Iterable[int]):
+    """(Re)index the given products from their current rows."""
+    ids = list(product_ids)
+    if ids:
+        await _reindex('p."id" IN ({})', ids)
+
+
+async def index_business(business_id: int):
+    """Reindex every product of a business after its name, city or description changed."""
+    await _reindex('p."business_id" = {}', [business_id])
+
+
+async def _reindex(condition: str, params: list):
+    connection = _writer()
+    dialect = connection.capabilities.dialect
+    where = condition.format(placeholders(dialect, len(params)))
+    if dialect == "sqlite":
+        await connection.execute_query(
+            f'DELETE FROM "product_search" WHERE rowid IN (SELECT p."id" FROM "product" p WHERE {where})', params
+        )
+        await connection.execute_query(
+            f'INSERT INTO "product_search" (rowid, "product_name", "category", "businessname", "city", "business_description") '
+            f"{SQLITE_SOURCE} WHERE {where}",
+            params,
+        )
+    else:
+        await connection.execute_query(
+            f'INSERT INTO "product_search" ("product_id", "document") {POSTGRES_DOCUMENT} WHERE {where} '
+            'ON CONFLICT ("product_id") DO UPDATE SET "document" = EXCLUDED."document"',
+            params,
+        )
+    await _add_terms(connection, where, params)
+
+
+def vocabulary(texts: Iterable[Optional[str]]) -> Set[str]:
+    return {
+        term
+        for text in texts
+        for term in re.findall(r"\w+", (text or "").lower())
+        if MIN_TERM_LENGTH <= len(term) <= MAX_TERM_LENGTH
+    }
+
+
+async def _add_terms(connection: BaseDBAsyncClient, where: str, params: list):
+    """Add the words of the matching products to the vocabulary.
+
+    Words are never removed as products change: a stale word only makes a correction that finds
+    nothing. rebuild_index starts the vocabulary over.
+    """
+    dialect = connection.capabilities.dialect
+    _, rows = await connection.execute_query(f"{TERM_SOURCE} WHERE {where}", params)
+    terms = sorted(vocabulary(value for row in rows for value in row))
+    for start in range(0, len(terms), TERM_BATCH):
+        batch = terms[start:start + TERM_BATCH]
+        values = ", ".join(f"({mark})" for mark in placeholders(dialect, len(batch)).split(", "))
+        await connection.execute_query(f'INSERT INTO "search_term" ("term") VALUES {values} ON CONFLICT DO NOTHING', batch)
+
+
+async def remove_products(product_ids: Iterable[int]):
+    ids = list(product_ids)
+    if not ids:
+        return
+    connection = _writer()
+    dialect = connection.capabilities.dialect
+    column = "rowid" if dialect == "sqlite" else '"product_id"'
+    await connection.execute_query(
+        f'DELETE FROM "product_search" WHERE {column} IN ({placeholders(dialect, len(ids))})', ids
+    )
+
+
+async def rebuild_index():
+    """Drop and rebuild the whole index, and its vocabulary, from the product and business tables."""
+    connection = _writer()
+    dialect = connection.capabilities.dialect
+    if dialect == "sqlite":
+        await connection.execute_query('DELETE FROM "product_search"')
+        await connection.execute_query(
+            'INSERT INTO "product_search" (rowid, "product_name", "category", "businessname", "city", "business_description") '
+            + SQLITE_SOURCE
+        )
+        await connection.execute_query('DELETE FROM "search_term"')
+        await connection.execute_query('INSERT INTO "search_term_trigram" ("search_term_trigram") VALUES (\'delete-all\')')
+    else:
+        await connection.execute_query('DELETE FROM "product_search"')
+        await connection.execute_query(f'INSERT INTO "product_search" ("product_id", "document") {POSTGRES_DOCUMENT}')
+        await connection.execute_query('DELETE FROM "search_term"')
+    await connection.execute_query(VOCABULARY_FROM_INDEX[dialect])
+
+
+def query_terms(q: str) -> List[str]:
+    return re.findall(r"\w+", q.lower())[:MAX_TERMS]
+
+
+def edit_distance(a: str, b: str) -> int:
+    """Insertions, deletions, substitutions and swaps of adjacent letters needed to turn `a` into `b`."""
+    before, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], before[j - 2] + 1)
+        before, previous = previous, current
+    return previous[-1]
+
+
+def max_edits(term: str) -> int:
+    return 1 if len(term) < 6 else 2
+
+
+async def corrections(connection: BaseDBAsyncClient, term: str) -> List[str]:
+    """Vocabulary words within a typo or two of `term`, closest first."""
+    if len(term) < MIN_TERM_LENGTH:
+        return []
+    if connection.capabilities.dialect == "sqlite":
+        trigrams = dict.fromkeys(term[i:i + 3] for i in range(len(term) - 2))
+        _, rows = await connection.execute_query(
+            'SELECT "term" FROM "search_term_trigram" WHERE "search_term_trigram" MATCH ? ORDER BY rank LIMIT ?',
+            [" OR ".join(f'"{trigram}"' for trigram in trigrams), CORRECTION_CANDIDATES],
+        )
+    else:
+        _, rows = await connection.execute_query(
+            'SELECT "term" FROM "search_term" WHERE "term" % $1 ORDER BY similarity("term", $1) DESC LIMIT $2',
+            [term, CORRECTION_CANDIDATES],
+        )
+    scored = sorted((edit_distance(term, row["term"]), row["term"]) for row in rows)
+    return [word for distance, word in scored if 0 < distance <= max_edits(term)][:MAX_CORRECTIONS]
+
+
+def build_match(dialect: str, terms: List[str], corrections: Optional[List[str]] = None) -> str:
+    """Every term as a prefix, all required; with `corrections`, any term or corrected word will do."""
+    if corrections is None:
+        if dialect == "sqlite":
+            return " AND ".join(f'"{term}"*' for term in terms)
+        return " & ".join(f"{term}:*" for term in terms)
+    if dialect == "sqlite":
+        return " OR ".join([f'"{term}"*' for term in terms] + [f'"{word}"' for word in corrections])
+    return " | ".join([f"{term}:*" for term in terms] + corrections)
+
+
+async def search_product_ids(q: str, limit: int, offset: int) -> Tuple[List[int], bool]:
+    """Ranked product ids for `q`; falls back to a relaxed match when the strict one finds nothing.
+
+    The relaxed match accepts any of the terms, or any vocabulary word a typo or two away from one.
+    Returns the ids and whether the relaxed match was used.
+    """
+    terms = query_terms(q)
+    if not terms:
+        return [], False
+
+    connection = read_connection()
+    dialect = connection.capabilities.dialect
+    for relaxed in (False, True):
+        fixes = None
+        if relaxed:
+            fixes = []
+            for term in terms:
+                fixes += await corrections(connection, term)
+        match = build_match(dialect, terms, fixes)
+        if dialect == "sqlite":
+            _, rows = await connection.execute_query(
+                'SELECT "id" FROM ('
+                f'SELECT rowid AS "id", bm25("product_search", {SQLITE_WEIGHTS}) AS "score" FROM "product_search" '
+                'WHERE "product_search" MATCH ? ORDER BY rowid DESC LIMIT ?'
+                ') ORDER BY "score", "id" DESC LIMIT ? OFFSET ?',
+                [match, SEARCH_CANDIDATES, limit, offset],
+            )
+        else:
+            _, rows = await connection.execute_query(
+                'SELECT "id" FROM ('
+                'SELECT "product_id" AS "id", ts_rank_cd("document", query) AS "score" '
+                'FROM "product_search", to_tsquery(\'simple\', $1) AS query '
+                'WHERE "document" @@ query ORDER BY "product_id" DESC LIMIT $2'
+                ') AS candidates ORDER BY "score" DESC, "id" DESC LIMIT $3 OFFSET $4',
+                [match, SEARCH_CANDIDATES, limit, offset],
+            )
+        if rows or offset:
+            return [row["id"] for row in rows], relaxed
+    return [], True
@@ -0,0 +1,123 @@
+"""
+Preforking server: import the app once, then fork the workers from that process image.
+
+`uvicorn --workers N` spawns every worker as a fresh interpreter that imports FastAPI, Tortoise,
+the models and the routes all over again. Here the parent does that once, also loads what the
+app otherwise defers to the first request (passlib, jinja2, Pillow), and forks the workers,
+which start serving within milliseconds and share the imported code and objects copy-on-write.
+Nothing that holds connections, threads or an event loop exists before the fork: each worker
+runs the app's lifespan (database pools, outbox worker, offer scheduler) for itself. A worker
+that dies is replaced; SIGTERM or SIGINT stops them all.
+
+    python serve.py --workers 4 --port 8000
+"""
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import time
+
+import uvicorn
+
+logger = logging.getLogger("serve")
+
+
+def preload():
+    """Import the app and everything it would otherwise import on first use."""
+    import PIL.Image  # noqa: F401  preload before fork
+    import PIL.ImageOps  # noqa: F401  preload before fork
+
+    import main
+    from authentication import password_context
+    from rendering import jinja_environment
+
+    # passlib picks and imports its bcrypt backend on the first hash, not when the context is built.
+    password_context().handler("bcrypt").get_backend()
+    jinja_environment()
+    return main.app
+
+
+def listen(host: str, port: int, backlog: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(app, sock: socket.socket, args):
+    # The parent's handlers were inherited; uvicorn installs its own for a graceful shutdown.
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    config = uvicorn.Config(app, log_level=args.log_level, access_log=args.access_log, proxy_headers=args.proxy_headers)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def main(args):
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(name)s %(message)s")
+    sock = listen(args.host, args.port, args.backlog)
+    start = time.perf_counter()
+    app = preload()
+    logger.info("Preloaded the app in %.2fs", time.perf_counter() - start)
+    # Imported objects are never freed; keeping them out of the collector's generations stops
+    # each worker's first collection from writing to (and so copying) every shared page.
+    gc.freeze()
+
+    children = {}
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(app, sock, args)
+            except BaseException:
+                logger.exception("Worker %d failed", os.getpid())
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = time.monotonic()
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(args.workers):
+        spawn()
+    logger.info("Serving on %s:%d with %d workers", args.host, args.port, args.workers)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        started = children.pop(pid, None)
+        if stopping or started is None:
+            continue
+        logger.warning("Worker %d exited with status %d; starting another", pid, os.waitstatus_to_exitcode(status))
+        if time.monotonic() - started < 1:
+            time.sleep(1)  # a worker that cannot start should not turn into a fork loop
+        spawn()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--access-log", action="store_true")
+    parser.add_argument("--proxy-headers", action="store_true", help="trust X-Forwarded-* from the proxy in front")
+    main(parser.parse_args())
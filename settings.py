@@ -0,0 +1,34 @@
+"""
+Configuration from .env, parsed once per process.
+
+Modules read their settings from `settings` rather than parsing the file themselves, so a worker
+reads .env once at boot and workers forked from a preloaded parent (serve.py) read it not at all.
+Empty values count as unset, as they always have.
+"""
+from typing import Dict, Optional
+
+from dotenv import dotenv_values
+
+
+class Settings:
+    def __init__(self, values: Dict[str, Optional[str]]):
+        self.values = values
+
+    def get(self, name: str, default: Optional[str] = None) -> Optional[str]:
+        return self.values.get(name) or default
+
+    def __getitem__(self, name: str) -> str:
+        return self.values[name]
+
+    def get_int(self, name: str, default: int) -> int:
+        return int(self.get(name) or default)
+
+    def get_float(self, name: str, default: float) -> float:
+        return float(self.get(name) or default)
+
+    def get_flag(self, name: str, default: bool) -> bool:
+        value = self.get(name)
+        return default if value is None else value.lower() == "true"
+
+
+settings = Settings(dotenv_values(".env"))
@@ -0,0 +1,86 @@
+"""
+A local SMTP stand-in that accepts every message and keeps it in memory.
+
+Point the outbox at it for tests and throughput runs instead of a real mail server:
+
+    python smtp_sink.py --port 1025
+    SMTP_HOST=127.0.0.1 SMTP_PORT=1025 SMTP_STARTTLS=false SMTP_USE_CREDENTIALS=false
+"""
+import argparse
+import asyncio
+from email import message_from_bytes
+from email.message import Message
+from typing import List, Optional
+
+
+class SMTPSink:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.messages: List[Message] = []
+        self.sessions = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> "SMTPSink":
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _reply(self, writer: asyncio.StreamWriter, line: str):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        writer.write(line.encode() + b"\r\n")
+        await writer.drain()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.sessions += 1
+        await self._reply(writer, "220 smtp-sink ready")
+        try:
+            while line := await reader.readline():
+                command = line.decode(errors="replace").strip().split(" ", 1)[0].upper()
+                if command == "EHLO":
+                    await self._reply(writer, "250-smtp-sink\r\n250-8BITMIME\r\n250 SMTPUTF8")
+                elif command in ("HELO", "MAIL", "RCPT", "RSET", "NOOP"):
+                    await self._reply(writer, "250 OK")
+                elif command == "DATA":
+                    await self._reply(writer, "354 End data with <CR><LF>.<CR><LF>")
+                    lines = []
+                    while (data := await reader.readline()) not in (b".\r\n", b".\n", b""):
+                        lines.append(data[1:] if data.startswith(b"..") else data)
+                    self.messages.append(message_from_bytes(b"".join(lines)))
+                    await self._reply(writer, "250 OK queued")
+                elif command == "QUIT":
+                    await self._reply(writer, "221 Bye")
+                    break
+                else:
+                    await self._reply(writer, "502 Command not implemented")
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(host: str, port: int):
+    sink = await SMTPSink(host, port).start()
+    print(f"SMTP sink listening on {sink.host}:{sink.port}")
+    try:
+        while True:
+            await asyncio.sleep(10)
+            print(f"{len(sink.messages)} messages over {sink.sessions} sessions")
+    finally:
+        await sink.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1025)
+    args = parser.parse_args()
+    asyncio.run(serve(args.host, args.port))
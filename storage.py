@@ -0,0 +1,95 @@
+import os
+import re
+import secrets
+from typing import Dict, Iterable
+
+from fastapi import UploadFile
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse
+from tortoise.connection import connections
+from tortoise.expressions import F
+from tortoise.transactions import in_transaction
+
+from database import placeholders
+from images import build_derivatives, remove_quietly, stream_to_disk, upload_extension, variant_names
+from models import ImageBlob
+
+# Content-addressed names are the first 32 hex chars of the upload's SHA-256.
+DIGEST_LENGTH = 32
+CONTENT_ADDRESSED = re.compile(r"^[0-9a-f]{%d}(_[a-z]+)?\.[a-z]+$" % DIGEST_LENGTH)
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+async def store_image(file: UploadFile, directory: str) -> Dict[str, str]:
+    """Store an upload under its content hash and take a reference on it.
+
+    Identical uploads share one set of files; derivatives are only rendered the first time.
+    Returns variant name -> file name, with the primary name under "medium".
+    """
+    extension = upload_extension(file.filename)
+    upload_path = os.path.join(directory, f".{secrets.token_hex(8)}.upload")
+    try:
+        _, digest = await stream_to_disk(file, upload_path)
+        stem = digest[:DIGEST_LENGTH]
+        names = variant_names(stem, extension)
+
+        # Reference first, then check the files. A release that dropped the last reference removes
+        # the files before it lets go of the row, so by the time the reference is taken they are
+        # either gone (and rendered again below) or safe.
+        await acquire(directory, names["medium"])
+        try:
+            if not all(os.path.exists(os.path.join(directory, name)) for name in names.values()):
+                await build_derivatives(upload_path, directory, stem, extension)
+        except BaseException:
+            await release(directory, names["medium"])
+            raise
+    finally:
+        await remove_quietly(upload_path)
+    return names
+
+
+async def acquire(directory: str, name: str):
+    # One statement: it waits on a release holding the row, rather than slipping in between
+    # that release's delete and its file removal.
+    connection = connections.get("default")
+    await connection.execute_query(
+        f'INSERT INTO "imageblob" ("path", "refcount") VALUES ({placeholders(connection.capabilities.dialect, 1)}, 1) '
+        'ON CONFLICT ("path") DO UPDATE SET "refcount" = "imageblob"."refcount" + 1',
+        [f"{directory}/{name}"],
+    )
+
+
+async def release(directory: str, name: str):
+    """Drop one reference; files are deleted with the last one. Untracked (legacy/default) names are left alone."""
+    path = f"{directory}/{name}"
+    # The files go before the transaction ends, so the row stays locked until they are gone.
+    async with in_transaction("default"):
+        if not await ImageBlob.filter(path=path).update(refcount=F("refcount") - 1):
+            return
+        if not await ImageBlob.filter(path=path, refcount__lte=0).delete():
+            return
+        stem, extension = name.rsplit(".", 1)
+        for file_name in variant_names(stem, extension).values():
+            await remove_quietly(os.path.join(directory, file_name))
+
+
+async def release_many(directory: str, names: Iterable[str]):
+    for name in names:
+        await release(directory, name)
+
+
+class ImmutableStaticFiles(StaticFiles):
+    """StaticFiles that marks content-addressed images as immutable with a strong, content-derived ETag."""
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope, status_code: int = 200) -> Response:
+        response = FileResponse(full_path, status_code=status_code, stat_result=stat_result)
+        file_name = os.path.basename(full_path)
+        if CONTENT_ADDRESSED.match(file_name):
+            # The name is derived from the source bytes and each variant is rendered only once.
+            response.headers["etag"] = f'"{file_name}"'
+            response.headers["cache-control"] = IMMUTABLE_CACHE_CONTROL
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
@@ -0,0 +1,94 @@
+"""
+Incremental JSON for list endpoints.
+
+The usual {"status": "success", "data": [...]} envelope is written as rows are fetched, one
+batch per query, instead of after the whole list has been built as pydantic objects. Rows are
+encoded with orjson when it is installed (the "fast" extra) and with the stdlib encoder
+otherwise. Endpoints whose rows stand in for pydantic models pass as_models=True, so the JSON
+matches what the models would have produced.
+"""
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from functools import partial
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Union
+
+from fastapi.responses import Response, StreamingResponse
+from tortoise.queryset import QuerySet
+
+from settings import settings
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+STREAM_BATCH_SIZE = settings.get_int("STREAM_BATCH_SIZE", 1000)
+
+
+def _default(value, as_models: bool = False):
+    if isinstance(value, Decimal):
+        if as_models:
+            return str(value)
+        # Same as FastAPI's jsonable_encoder: whole numbers stay integers.
+        return int(value) if value.as_tuple().exponent >= 0 else float(value)
+    if isinstance(value, (datetime, date)):
+        text = value.isoformat()
+        return text[:-6] + "Z" if as_models and text.endswith("+00:00") else text
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(value, as_models: bool = False) -> bytes:
+    """Compact JSON. as_models writes values as pydantic models serialize them: UTC datetimes
+    as "...Z" and decimals as strings."""
+    if orjson is not None:
+        return orjson.dumps(value, default=partial(_default, as_models=as_models), option=orjson.OPT_UTC_Z if as_models else 0)
+    return json.dumps(value, default=partial(_default, as_models=as_models), separators=(",", ":")).encode()
+
+
+async def batched_rows(queryset: QuerySet, fields: Sequence[str], batch_size: int = STREAM_BATCH_SIZE) -> AsyncIterator[List[dict]]:
+    """Rows of `queryset` in id order, one query per batch (keyset on id, so every query is an index seek)."""
+    fields = list(dict.fromkeys(list(fields) + ["id"]))
+    last_id = None
+    while True:
+        page = queryset if last_id is None else queryset.filter(id__gt=last_id)
+        batch = await page.order_by("id").limit(batch_size).values(*fields)
+        if batch:
+            yield batch
+        if len(batch) < batch_size:
+            return
+        last_id = batch[-1]["id"]
+
+
+async def _envelope(rows: Union[List[dict], AsyncIterator[List[dict]]], extra: Dict[str, object], as_models: bool) -> AsyncIterator[bytes]:
+    yield b'{"status":"success","data":['
+    if isinstance(rows, list):
+        if rows:
+            yield dumps(rows, as_models)[1:-1]
+    else:
+        separator = b""
+        async for batch in rows:
+            yield separator + dumps(batch, as_models)[1:-1]
+            separator = b","
+    yield b"]" + b"".join(b"," + dumps(key) + b":" + dumps(value, as_models) for key, value in extra.items()) + b"}"
+
+
+def stream_list(
+    rows: Union[List[dict], AsyncIterator[List[dict]]],
+    extra: Optional[Dict[str, object]] = None,
+    as_models: bool = False,
+    headers: Optional[Dict[str, str]] = None,
+) -> StreamingResponse:
+    """Stream `rows` (a list, or batches from batched_rows) inside the success envelope; `extra`
+    keys such as next_cursor follow "data"."""
+    return StreamingResponse(_envelope(rows, extra or {}, as_models), media_type="application/json", headers=headers)
+
+
+def json_response(
+    rows: List[dict],
+    extra: Optional[Dict[str, object]] = None,
+    as_models: bool = False,
+    headers: Optional[Dict[str, str]] = None,
+) -> Response:
+    """The envelope stream_list writes, encoded in one piece."""
+    return Response(dumps({"status": "success", "data": rows, **(extra or {})}, as_models), media_type="application/json", headers=headers)
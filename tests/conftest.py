@@ -0,0 +1,97 @@
+"""
+The app runs in-process against a scratch SQLite database.
+
+settings.py reads .env from the working directory and uploads are written under static/ relative
+to it, so the session moves into a temporary directory with its own .env (placeholder credentials,
+SMTP pointed at a closed port, cheap bcrypt) before anything imports the app.
+
+Set TEST_DATABASE_URL to run the suite against an empty PostgreSQL database instead.
+"""
+import asyncio
+import itertools
+import os
+import tempfile
+
+import pytest
+
+WORKDIR = tempfile.mkdtemp(prefix="bazarghat_tests_")
+ENV = {
+    "DATABASE_URL": os.environ.get("TEST_DATABASE_URL") or f"sqlite://{os.path.join(WORKDIR, 'test.sqlite3')}",
+    "SECRET_KEY": "test-secret",
+    "EMAIL": "tests@example.com",
+    "PASSWORD": "unused",
+    "SMTP_HOST": "127.0.0.1",
+    "SMTP_PORT": "2",
+    "SMTP_STARTTLS": "false",
+    "SMTP_USE_CREDENTIALS": "false",
+    "BCRYPT_ROUNDS": "4",
+    "IMAGE_EXECUTOR": "thread",
+    "RATE_LIMIT_ENABLED": "false",
+}
+
+with open(os.path.join(WORKDIR, ".env"), "w") as env:
+    env.writelines(f"{key}={value}\n" for key, value in ENV.items())
+for directory in ("business", "products"):
+    os.makedirs(os.path.join(WORKDIR, "static", "images", directory), exist_ok=True)
+os.chdir(WORKDIR)
+
+
+async def _migrate():
+    from tortoise import Tortoise
+
+    import migrate
+    from database import build_tortoise_config
+
+    await Tortoise.init(config=build_tortoise_config())
+    await migrate.upgrade()
+    await Tortoise.close_connections()
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+
+    import main
+
+    asyncio.run(_migrate())
+    with TestClient(main.app) as client:
+        yield client
+
+
+@pytest.fixture
+def run(client):
+    """Run a coroutine function on the app's event loop, where its database connections live."""
+    return lambda fn, *args: client.portal.call(fn, *args)
+
+
+_usernames = (f"user{i}" for i in itertools.count())
+
+
+class Account:
+    def __init__(self, client, username: str, password: str = "pw123456"):
+        from authentication import decode_access_token
+
+        response = client.post("/users/", json={"username": username, "email": f"{username}@example.com", "password": password})
+        assert response.status_code == 200, response.text
+        token = client.post("/token", data={"username": username, "password": password}).json()["access_token"]
+        self.username = username
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.business_id = decode_access_token(token).business_id
+
+    def add_product(self, client, **fields) -> dict:
+        product = {"product_name": "lamp", "category": "home", "original_price": 100, "new_price": 80, **fields}
+        response = client.post("/products/", headers=self.headers, json=product)
+        assert response.status_code == 200, response.text
+        return response.json()["data"]
+
+
+@pytest.fixture
+def make_account(client):
+    """Creates accounts like `account`, for tests that need more than one."""
+    return lambda: Account(client, next(_usernames))
+
+
+@pytest.fixture
+def account(make_account):
+    """A new user, logged in, with the business created on signup."""
+    return make_account()
@@ -0,0 +1,158 @@
+import csv
+import io
+import json
+
+import pytest
+
+import catalog_io
+import main
+
+
+def import_ndjson(client, account, body: str) -> dict:
+    response = client.post("/products/bulk", headers={**account.headers, "Content-Type": "application/x-ndjson"}, content=body)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_import_indexes_only_the_rows_it_created(client, account, monkeypatch):
+    existing = account.add_product(client, product_name="marimba")
+    indexed = []
+    index_products = main.index_products
+
+    async def record(product_ids):
+        indexed.append(sorted(product_ids))
+        await index_products(product_ids)
+
+    monkeypatch.setattr(main, "index_products", record)
+    report = import_ndjson(client, account, "".join(
+        f'{{"product_name": "kalimba {n}", "category": "music", "original_price": 100, "new_price": 80}}\n' for n in range(3)
+    ))
+
+    created = sorted(row["id"] for row in client.get("/products/", params={"business_id": account.business_id, "category": "music"}).json()["data"])
+    assert report["created"] == 3 and len(created) == 3 and existing["id"] not in created
+    assert indexed == [created]
+    assert sorted(product["id"] for product in client.get("/products/search", params={"q": "kalimba"}).json()["data"]) == created
+
+
+class StreamedBody:
+    """Stands in for the request: the body arrives in the given chunks."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    async def stream(self):
+        for chunk in self.chunks:
+            yield chunk
+
+
+def parse(run, parser, *chunks: bytes) -> list:
+    async def collect():
+        return [row async for row in parser(StreamedBody(chunks))]
+
+    return run(collect)
+
+
+def split_at(body: bytes, *offsets: int) -> list:
+    edges = [0, *offsets, len(body)]
+    return [body[start:end] for start, end in zip(edges, edges[1:])]
+
+
+CSV = (
+    "\ufeffproduct_name,category,new_price\r\n"
+    '"desk, oak",home,10\r\n'
+    '"two\r\nlines",home,11\r\n'
+    '"say ""hi""",home,12\r\n'
+    "café,,13\r\n"
+    "\r\n"
+    "short,row\r\n"
+).encode()
+
+CSV_ROWS = [
+    (2, {"product_name": "desk, oak", "category": "home", "new_price": "10"}),
+    (4, {"product_name": "two\r\nlines", "category": "home", "new_price": "11"}),
+    (5, {"product_name": 'say "hi"', "category": "home", "new_price": "12"}),
+    (6, {"product_name": "café", "new_price": "13"}),
+    (8, "Expected 3 columns, got 2"),
+]
+
+
+@pytest.mark.parametrize("chunks", [
+    [CSV],
+    split_at(CSV, 1),  # inside the byte order mark
+    split_at(CSV, CSV.index(b"oak")),  # inside a quoted field
+    split_at(CSV, CSV.index(b"lines")),  # between the lines of a quoted field
+    split_at(CSV, CSV.index(b'hi""') + 3),  # between the quotes of an escaped quote
+    split_at(CSV, CSV.index("é".encode()) + 1),  # inside a multi-byte character
+    split_at(CSV, CSV.index(b"\r\n") + 1),  # between CR and LF
+    [CSV[i:i + 1] for i in range(len(CSV))],
+], ids=["whole", "bom", "quoted", "quoted-newline", "escaped-quote", "utf-8", "crlf", "bytewise"])
+def test_csv_rows_across_chunk_boundaries(run, chunks):
+    assert parse(run, catalog_io._csv_rows, *chunks) == CSV_ROWS
+
+
+def test_csv_unterminated_quote(run):
+    assert parse(run, catalog_io._csv_rows, b'product_name,category\n"open,home\nnext,home\n') == [(3, "Unterminated quoted field")]
+
+
+def test_ndjson_rows(run):
+    body = b'{"product_name": "a"}\n\nnot json\n[1, 2]\n{"product_name": "b"}'
+
+    rows = parse(run, catalog_io._ndjson_rows, *split_at(body, 5, body.index(b"json") + 2))
+
+    assert [number for number, _ in rows] == [1, 3, 4, 5]
+    assert rows[0][1] == {"product_name": "a"} and rows[3][1] == {"product_name": "b"}
+    assert rows[1][1].startswith("Invalid JSON") and rows[2][1] == "Expected a JSON object"
+
+
+def test_import_reports_bad_rows_and_keeps_the_rest(client, account):
+    body = (
+        "product_name,category,original_price,new_price\n"
+        "guitar,music,100,80\n"
+        "drum,music,100,cheap\n"
+        "bass,music\n"
+        "piano,,200,150\n"
+    )
+    response = client.post("/products/bulk", params={"format": "csv"}, headers=account.headers, content=body)
+    report = response.json()
+
+    assert (report["created"], report["failed"], report["errors_truncated"]) == (2, 2, False)
+    assert [error["row"] for error in report["errors"]] == [3, 4]
+    assert report["errors"][0]["error"].startswith("new_price:")
+    names = {row["product_name"]: row for row in client.get("/products/", params={"business_id": account.business_id}).json()["data"]}
+    assert set(names) == {"guitar", "piano"}
+    assert names["piano"]["category"] == "unspecified" and names["piano"]["percentage_discount"] == 75
+
+
+def test_import_rejects_unknown_formats(client, account):
+    response = client.post("/products/bulk", headers={**account.headers, "Content-Type": "application/xml"}, content="<products/>")
+
+    assert response.status_code == 415
+
+
+@pytest.mark.parametrize("format", ["csv", "ndjson"])
+def test_export_round_trips_through_import(client, make_account, monkeypatch, format):
+    monkeypatch.setattr(catalog_io, "EXPORT_BATCH_SIZE", 2)
+    source, target = make_account(), make_account()
+    for name in ("plain", "comma, quoted", 'say "hi"', "two\nlines", "café"):
+        source.add_product(client, product_name=name, original_price="99.99", new_price="49.50", offer_expires="2030-01-01T00:00:00Z")
+
+    def export(account):
+        response = client.get("/products/export", params={"format": format, "business_id": account.business_id})
+        assert response.status_code == 200
+        return response.text
+
+    exported = export(source)
+    report = client.post(
+        "/products/bulk", params={"format": format}, headers=target.headers, content=exported.encode()
+    ).json()
+
+    assert (report["created"], report["failed"]) == (5, 0)
+    kept = [field for field in catalog_io.EXPORT_FIELDS if field not in ("id", "business_id", "date_published")]
+
+    def rows(text):
+        if format == "csv":
+            return [{field: row[field] for field in kept} for row in csv.DictReader(io.StringIO(text))]
+        return [{field: json.loads(line)[field] for field in kept} for line in text.splitlines()]
+
+    assert rows(export(target)) == rows(exported)
+    assert [row["product_name"] for row in rows(exported)] == ["plain", "comma, quoted", 'say "hi"', "two\nlines", "café"]
@@ -0,0 +1,80 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+from catalog_stats import rebuild_stats
+
+LATER = "2030-01-01T00:00:00Z"
+
+
+def stats(client, account, category=None) -> dict:
+    params = {"by": "category", "category": category} if category else {"by": "business", "business_id": account.business_id}
+    data = client.get("/catalog/stats", params=params).json()["data"]
+    if not data:
+        return {}
+    row = data[0]
+    return {
+        "count": row["product_count"],
+        "min": float(row["min_price"]),
+        "max": float(row["max_price"]),
+        "avg_discount": row["avg_discount"],
+    }
+
+
+def test_stats_follow_create_update_and_delete(client, account, run):
+    category, moved_to = f"harps {account.business_id}", f"lutes {account.business_id}"
+    cheap = account.add_product(client, category=category, new_price=50, offer_expires=LATER)
+    account.add_product(client, category=category, new_price=80, offer_expires=LATER)
+    account.add_product(client, category=category, original_price=200, new_price=120, offer_expires=LATER)
+
+    assert stats(client, account) == {"count": 3, "min": 50, "max": 120, "avg_discount": 63.33}
+    assert stats(client, account, category) == stats(client, account)
+
+    client.put(
+        f"/products/{cheap['id']}", headers=account.headers,
+        json={"product_name": "lamp", "category": moved_to, "original_price": 300, "new_price": 250, "offer_expires": LATER},
+    )
+    assert stats(client, account) == {"count": 3, "min": 80, "max": 250, "avg_discount": 74.33}
+    assert stats(client, account, category) == {"count": 2, "min": 80, "max": 120, "avg_discount": 70}
+    assert stats(client, account, moved_to) == {"count": 1, "min": 250, "max": 250, "avg_discount": 83}
+
+    client.delete(f"/products/{cheap['id']}", headers=account.headers)
+    assert stats(client, account, moved_to) == {}
+    assert stats(client, account) == {"count": 2, "min": 80, "max": 120, "avg_discount": 70}
+
+    assert run(rebuild_stats)["drifted"] == 0
+
+
+def test_products_without_a_live_offer_count_at_their_original_price(client, account):
+    account.add_product(client, original_price=100, new_price=60, offer_expires=LATER)
+    account.add_product(client, original_price=90, new_price=10)
+
+    assert stats(client, account) == {"count": 2, "min": 60, "max": 90, "avg_discount": 80}
+
+
+def test_bulk_import_adds_to_the_stats(client, account, run):
+    account.add_product(client, new_price=80, offer_expires=LATER)
+    body = "".join(
+        f'{{"product_name": "kazoo", "category": "music", "original_price": 100, "new_price": {price}, "offer_expires": "{LATER}"}}\n'
+        for price in (20, 95)
+    )
+    client.post("/products/bulk", headers={**account.headers, "Content-Type": "application/x-ndjson"}, content=body)
+
+    assert stats(client, account) == {"count": 3, "min": 20, "max": 95, "avg_discount": 65}
+    assert run(rebuild_stats)["drifted"] == 0
+
+
+def test_expired_offers_revert_to_their_original_price(client, account, run):
+    account.add_product(client, original_price=100, new_price=70, offer_expires=LATER)
+    expiring = account.add_product(
+        client, original_price=200, new_price=40,
+        offer_expires=(datetime.now(timezone.utc) + timedelta(seconds=0.3)).isoformat(),
+    )
+    assert stats(client, account) == {"count": 2, "min": 40, "max": 70, "avg_discount": 45}
+
+    deadline = time.monotonic() + 5
+    while stats(client, account) != {"count": 2, "min": 70, "max": 200, "avg_discount": 85}:
+        assert time.monotonic() < deadline, stats(client, account)
+        time.sleep(0.05)
+
+    assert not client.get(f"/products/{expiring['id']}").json()["data"]["product_details"]["offer_active"]
+    assert run(rebuild_stats)["drifted"] == 0
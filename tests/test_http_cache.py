@@ -0,0 +1,84 @@
+from email.utils import formatdate
+
+from http_cache import VersionClock, catalog_versions
+from models import Product
+
+
+def revalidate(client, path, etag):
+    return client.get(path, headers={"If-None-Match": etag})
+
+
+def test_detail_answers_304_until_the_product_changes(client, account):
+    product = account.add_product(client)
+    path = f"/products/{product['id']}"
+
+    first = client.get(path)
+    etag = first.headers["etag"]
+
+    assert etag.startswith('W/"') and "s-maxage" in first.headers["cache-control"]
+    assert revalidate(client, path, etag).status_code == 304
+
+    client.put(path, headers=account.headers, json={"product_name": "lamp", "category": "home", "original_price": 100, "new_price": 70})
+    changed = revalidate(client, path, etag)
+
+    assert changed.status_code == 200 and changed.headers["etag"] != etag
+    assert float(changed.json()["data"]["product_details"]["new_price"]) == 70
+
+
+def test_list_tag_changes_when_a_product_is_added(client, account):
+    etag = client.get("/products/").headers["etag"]
+    assert revalidate(client, "/products/", etag).status_code == 304
+
+    account.add_product(client)
+
+    assert revalidate(client, "/products/", etag).status_code == 200
+
+
+def test_business_update_retires_its_product_pages(client, account):
+    product = account.add_product(client)
+    path = f"/products/{product['id']}"
+    etag = client.get(path).headers["etag"]
+    businesses = client.get("/business/").headers["etag"]
+
+    client.put(f"/business/{account.business_id}", headers=account.headers, json={"businessname": "renamed", "city": "Dhaka", "region": "Dhaka"})
+
+    assert revalidate(client, "/business/", businesses).status_code == 200
+    renamed = revalidate(client, path, etag)
+    assert renamed.status_code == 200 and renamed.json()["data"]["business_details"]["business_name"] == "renamed"
+
+
+def test_if_modified_since(client, account):
+    product = account.add_product(client)
+    path = f"/products/{product['id']}"
+    last_modified = client.get(path).headers["last-modified"]
+
+    assert client.get(path, headers={"If-Modified-Since": last_modified}).status_code == 304
+    assert client.get(path, headers={"If-Modified-Since": formatdate(0, usegmt=True)}).status_code == 200
+
+
+def test_change_made_by_another_worker_is_seen(client, account, run):
+    product = account.add_product(client)
+    path = f"/products/{product['id']}"
+    etag = client.get(path).headers["etag"]  # now also in this worker's detail cache
+
+    # Another worker writes and bumps the shared version; nothing in this process is invalidated.
+    async def elsewhere():
+        await Product.filter(id=product["id"]).update(product_name="desk")
+        await VersionClock().bump("product", product["id"])
+
+    run(elsewhere)
+    response = revalidate(client, path, etag)
+
+    assert response.status_code == 200
+    assert response.json()["data"]["product_details"]["product_name"] == "desk"
+
+
+def test_clocks_share_their_versions(run):
+    other = VersionClock()
+    before = run(catalog_versions.validator, "product", "shared")
+
+    run(other.bump, "product", "shared")
+    after = run(catalog_versions.validator, "product", "shared")
+
+    assert after.etag != before.etag
+    assert after == run(other.validator, "product", "shared")
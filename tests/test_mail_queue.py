@@ -0,0 +1,120 @@
+import itertools
+from datetime import timedelta
+
+import pytest
+from tortoise import timezone
+
+from mail_queue import OutboxWorker, SMTPConnection, enqueue_email, outbox_worker
+from models import OutboundEmail
+from smtp_sink import SMTPSink
+
+_keys = (f"outbox-test:{i}" for i in itertools.count())
+CLOSED_PORT = 2
+
+
+def seconds_from_now(moment) -> float:
+    def aware(value):
+        return value if timezone.is_aware(value) else timezone.make_aware(value)
+
+    return (aware(moment) - aware(timezone.now())).total_seconds()
+
+
+@pytest.fixture
+def outbox(run):
+    """The outbox to ourselves: the app's worker is stopped and messages queued earlier are parked."""
+    run(outbox_worker.stop)
+    parked = run(lambda: OutboundEmail.filter(status__in=["pending", "sending"]).values_list("id", flat=True))
+    run(lambda: OutboundEmail.filter(id__in=parked).update(next_attempt_at=timezone.now() + timedelta(days=1)))
+
+    async def enqueue(count: int = 1, dedup_key: str = None) -> list:
+        ids = []
+        for _ in range(count):
+            key = dedup_key or next(_keys)
+            await enqueue_email("someone@example.com", "verification", {"id": 1, "username": "someone"}, key)
+            ids.append(await OutboundEmail.get(dedup_key=key).values_list("id", flat=True))
+        return ids
+
+    yield lambda *args: run(enqueue, *args)
+
+    async def restart():
+        outbox_worker.start()
+
+    run(lambda: OutboundEmail.filter(id__in=parked).update(next_attempt_at=timezone.now()))
+    run(restart)
+
+
+@pytest.fixture
+def sink(run):
+    sink = run(SMTPSink().start)
+    yield sink
+    run(sink.stop)
+
+
+def worker(port: int, **options) -> OutboxWorker:
+    return OutboxWorker(SMTPConnection("127.0.0.1", port, None, None, start_tls=False), **options)
+
+
+def rows(run, ids) -> list:
+    return run(lambda: OutboundEmail.filter(id__in=ids).order_by("id"))
+
+
+def test_batches_are_sent_over_one_connection(run, outbox, sink):
+    ids = outbox(3)
+    sender = worker(sink.port, batch_size=2)
+
+    assert [run(sender.run_once) for _ in range(3)] == [2, 1, 0]
+    run(sender.connection.close)
+
+    assert [row.status for row in rows(run, ids)] == ["sent"] * 3
+    assert all(row.sent_at is not None for row in rows(run, ids))
+    assert len(sink.messages) == 3 and sink.sessions == 1
+    assert sink.messages[0]["To"] == "someone@example.com"
+    assert sender.stats() == {"sent": 3, "failed": 0, "smtp_connects": 1}
+
+
+def test_enqueueing_the_same_dedup_key_again_is_a_no_op(run, outbox):
+    key = next(_keys)
+    outbox(1, key)
+
+    assert run(enqueue_email, "other@example.com", "verification", {"id": 2, "username": "other"}, key) is False
+    assert run(lambda: OutboundEmail.filter(dedup_key=key).count()) == 1
+
+
+def test_leased_rows_are_not_claimed_twice_until_the_lease_runs_out(run, outbox):
+    ids = outbox(2)
+    first, second = worker(CLOSED_PORT, lease=300), worker(CLOSED_PORT)
+
+    assert sorted(row.id for row in run(first.claim_batch)) == ids
+    assert run(second.claim_batch) == []
+    assert all(row.status == "sending" and 299 < seconds_from_now(row.next_attempt_at) <= 300 for row in rows(run, ids))
+
+    # The first worker died mid-batch; once its lease lapses the rows are up for grabs again.
+    run(lambda: OutboundEmail.filter(id__in=ids).update(next_attempt_at=timezone.now() - timedelta(seconds=1)))
+    assert sorted(row.id for row in run(second.claim_batch)) == ids
+
+
+def test_failed_sends_back_off_exponentially(run, outbox):
+    [row_id] = outbox(1)
+    sender = worker(CLOSED_PORT, base_backoff=30, max_backoff=100)
+
+    for attempt, delay in ((1, 30), (2, 60), (3, 100)):
+        assert run(sender.run_once) == 1
+        [row] = rows(run, [row_id])
+        assert (row.status, row.attempts) == ("pending", attempt)
+        assert row.last_error.startswith("SMTPConnectError")
+        assert delay - 1 < seconds_from_now(row.next_attempt_at) <= delay
+        assert run(sender.run_once) == 0
+        run(lambda: OutboundEmail.filter(id=row_id).update(next_attempt_at=timezone.now()))
+
+
+def test_messages_are_dead_lettered_after_max_attempts(run, outbox, sink):
+    [row_id] = outbox(1)
+    failing = worker(CLOSED_PORT, max_attempts=2)
+
+    for _ in range(2):
+        run(failing.run_once)
+        run(lambda: OutboundEmail.filter(id=row_id).update(next_attempt_at=timezone.now()))
+
+    [row] = rows(run, [row_id])
+    assert (row.status, row.attempts, failing.failed) == ("failed", 2, 1)
+    assert run(worker(sink.port).run_once) == 0 and sink.messages == []
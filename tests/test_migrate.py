@@ -0,0 +1,79 @@
+import importlib
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+import migrate
+from models import Product
+
+# A product table from before date_published existed, as the old generate_schemas boot left it.
+LEGACY_SCHEMA = """
+CREATE TABLE "user" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    "username" VARCHAR(200) NOT NULL UNIQUE,
+    "email" VARCHAR(255) NOT NULL UNIQUE,
+    "password" VARCHAR(255) NOT NULL,
+    "is_verified" INT NOT NULL DEFAULT 0,
+    "join_data" TIMESTAMP NOT NULL
+);
+CREATE TABLE "business" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    "businessname" VARCHAR(200) NOT NULL UNIQUE,
+    "city" VARCHAR(255) NOT NULL DEFAULT 'unspecified',
+    "region" VARCHAR(255) NOT NULL DEFAULT 'unspecified',
+    "business_description" TEXT,
+    "logo" VARCHAR(255) NOT NULL DEFAULT 'default.jpg',
+    "owner_id" INT NOT NULL REFERENCES "user" ("id") ON DELETE CASCADE
+);
+CREATE TABLE "product" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    "product_name" VARCHAR(200) NOT NULL,
+    "category" VARCHAR(255) NOT NULL DEFAULT 'unspecified',
+    "original_price" VARCHAR(40) NOT NULL,
+    "new_price" VARCHAR(40) NOT NULL,
+    "percentage_discount" INT NOT NULL,
+    "offer_expires" TIMESTAMP NOT NULL,
+    "product_image" VARCHAR(255) NOT NULL DEFAULT 'productDefault.jpg',
+    "business_id" INT NOT NULL REFERENCES "business" ("id") ON DELETE CASCADE
+);
+"""
+
+
+def test_declared_columns():
+    sql = importlib.import_module("migrations.0004_catalog_stats").SQL["sqlite"]
+
+    assert migrate.declared_columns(sql) == {
+        "catalog_stats": {"scope", "key", "product_count", "min_price", "max_price", "discount_sum", "newest_published"},
+    }
+
+
+def test_upgrade_refuses_to_adopt_tables_missing_columns(tmp_path):
+    database = tmp_path / "legacy.sqlite3"
+    with sqlite3.connect(database) as legacy:
+        legacy.executescript(LEGACY_SCHEMA)
+    (tmp_path / ".env").write_text(f"DATABASE_URL=sqlite://{database}\n")
+
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(migrate.__file__), "upgrade"],
+        cwd=tmp_path, capture_output=True, text=True,
+    )
+
+    assert result.returncode != 0
+    assert "product.date_published" in result.stderr
+    with sqlite3.connect(database) as legacy:
+        assert legacy.execute('SELECT COUNT(*) FROM "schema_migrations"').fetchone() == (0,)
+        assert not legacy.execute("SELECT name FROM sqlite_master WHERE name = 'idx_product_published'").fetchall()
+
+
+def test_check_schema_passes_on_a_migrated_database(run):
+    run(migrate.check_schema)
+
+
+def test_check_schema_reports_columns_the_database_lacks(run, monkeypatch):
+    monkeypatch.setattr(Product._meta, "db_fields", Product._meta.db_fields | {"colour"})
+
+    with pytest.raises(migrate.SchemaOutOfDate, match=r"product\.colour"):
+        run(migrate.check_schema)
@@ -0,0 +1,102 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import main
+from models import Product
+from offers import OfferExpiryScheduler, offer_scheduler
+
+
+def in_seconds(seconds: float) -> str:
+    return (datetime.now(timezone.utc) + timedelta(seconds=seconds)).isoformat()
+
+
+def offer_active(client, product_id: int) -> bool:
+    return client.get(f"/products/{product_id}").json()["data"]["product_details"]["offer_active"]
+
+
+def wait_until_expired(client, product_id: int, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while offer_active(client, product_id):
+        assert time.monotonic() < deadline, f"offer of product {product_id} never expired"
+        time.sleep(0.05)
+
+
+def move_offer(client, account, product_id: int, offer_expires: str):
+    response = client.put(
+        f"/products/{product_id}", headers=account.headers,
+        json={"product_name": "lamp", "category": "home", "original_price": 100, "new_price": 80, "offer_expires": offer_expires},
+    )
+    assert response.status_code == 200, response.text
+
+
+@pytest.fixture
+def stopped_scheduler(run):
+    """The app's scheduler, stopped for the test and started again afterwards, as on a restart."""
+    run(offer_scheduler.stop)
+
+    async def restart():
+        offer_scheduler.start(on_expired=main.invalidate_expired_offers)
+
+    yield restart
+    run(restart)
+
+
+def test_offer_expires_at_its_deadline(client, account):
+    product = account.add_product(client, offer_expires=in_seconds(0.3))
+    assert offer_active(client, product["id"])
+
+    wait_until_expired(client, product["id"])
+
+    listed = client.get("/products/", params={"business_id": account.business_id, "active_offers_only": "true"}).json()["data"]
+    assert product["id"] not in [row["id"] for row in listed]
+
+
+def test_editing_an_offer_reschedules_it(client, account):
+    product = account.add_product(client, offer_expires=in_seconds(0.3))
+    move_offer(client, account, product["id"], in_seconds(3600))
+
+    time.sleep(0.6)
+    assert offer_active(client, product["id"])
+
+    move_offer(client, account, product["id"], in_seconds(0.3))
+    wait_until_expired(client, product["id"])
+
+
+def test_deleted_offer_passes_quietly(client, account):
+    deleted = account.add_product(client, offer_expires=in_seconds(0.2))
+    client.delete(f"/products/{deleted['id']}", headers=account.headers)
+    time.sleep(0.4)
+
+    later = account.add_product(client, offer_expires=in_seconds(0.2))
+
+    assert offer_scheduler.running
+    wait_until_expired(client, later["id"])
+
+
+def test_restart_catches_up_on_offers_that_ran_out_while_down(client, account, stopped_scheduler, run):
+    product = account.add_product(client, offer_expires=in_seconds(0.2))
+    time.sleep(0.4)
+    assert offer_active(client, product["id"])
+
+    run(stopped_scheduler)
+
+    wait_until_expired(client, product["id"])
+
+
+def test_expire_due_reports_exactly_the_offers_it_cleared(client, account, stopped_scheduler, run):
+    past, future = account.add_product(client), account.add_product(client, offer_expires=in_seconds(3600))
+    run(lambda: Product.filter(id=past["id"]).update(offer_active=True, offer_expires=datetime.now(timezone.utc) - timedelta(minutes=1)))
+    expired = []
+
+    async def record(product_ids):
+        expired.append(product_ids)
+        await main.invalidate_expired_offers(product_ids)
+
+    scheduler = OfferExpiryScheduler()
+    scheduler.on_expired = record
+
+    assert run(scheduler.expire_due) == [past["id"]] and expired == [[past["id"]]]
+    assert run(scheduler.expire_due) == [] and len(expired) == 1
+    assert run(lambda: Product.get(id=future["id"])).offer_active
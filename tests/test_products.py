@@ -0,0 +1,58 @@
+import pytest
+
+import streaming
+
+
+def list_products(client, **params):
+    return client.get("/products/", params=params).json()["data"]
+
+
+@pytest.mark.parametrize("encoder", ["orjson", "json"])
+def test_list_matches_the_product_model(client, account, monkeypatch, encoder):
+    if encoder == "json":
+        monkeypatch.setattr(streaming, "orjson", None)
+    created = account.add_product(client, original_price=100, new_price="89.50", offer_expires="2030-01-01T00:00:00Z")
+
+    listed = list_products(client, business_id=account.business_id)
+    streamed = client.get("/products/", params={"business_id": account.business_id, "stream": "true"}).json()["data"]
+    detail = client.get(f"/products/{created['id']}").json()["data"]["product_details"]
+
+    assert listed == streamed == [detail]
+    assert isinstance(detail["new_price"], str) and detail["date_published"].endswith("Z")
+
+
+def test_price_filter_compares_numbers(client, account):
+    for price in (9, 10, 95):
+        account.add_product(client, original_price=100, new_price=price)
+
+    def prices(**params):
+        return sorted(float(row["new_price"]) for row in list_products(client, business_id=account.business_id, **params))
+
+    assert prices(min_price=10) == [10, 95]
+    assert prices(max_price="9.5") == [9]
+    assert prices(min_price=9, max_price=10) == [9, 10]
+
+
+def test_token_of_deleted_business_cannot_add_products(client, account):
+    assert client.delete(f"/business/{account.business_id}", headers=account.headers).status_code == 200
+
+    created = client.post("/products/", headers=account.headers, json={"product_name": "lamp", "category": "home", "original_price": 100, "new_price": 80})
+    imported = client.post(
+        "/products/bulk", headers={**account.headers, "Content-Type": "application/x-ndjson"},
+        content='{"product_name": "lamp", "category": "home", "original_price": 100, "new_price": 80}\n',
+    )
+
+    assert (created.status_code, created.json()["detail"]) == (404, "Business not found")
+    assert imported.status_code == 404
+
+
+def test_update_with_zero_original_price(client, account):
+    product = account.add_product(client, original_price=100, new_price=80)
+
+    response = client.put(
+        f"/products/{product['id']}", headers=account.headers,
+        json={"product_name": "lamp", "category": "home", "original_price": 0, "new_price": 0},
+    )
+
+    assert response.status_code == 200
+    assert response.json()["data"]["percentage_discount"] == 0
@@ -0,0 +1,102 @@
+import pytest
+from fastapi import FastAPI, Form, HTTPException
+from fastapi.testclient import TestClient
+
+import ratelimit
+from ratelimit import DEFAULT_LIMIT, Limit, MemoryStore, RateLimitMiddleware, parse_limit, tag_limit
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("20/minute", Limit(20, 20 / 60)),
+    ("10/15minutes", Limit(10, 10 / 900)),
+    (" 5 / hour ", Limit(5, 5 / 3600)),
+    ("0", None),
+    ("", None),
+])
+def test_parse_limit(text, expected):
+    assert parse_limit(text) == expected
+
+
+def test_parse_limit_rejects_nonsense():
+    with pytest.raises(ValueError):
+        parse_limit("fast")
+
+
+def test_tags_without_a_limit_of_their_own_get_the_default():
+    for tag in ("Products", "Business", "Users", "Root", ""):
+        assert tag_limit(tag) == DEFAULT_LIMIT is not None
+    assert tag_limit("Authentication") == Limit(60, 1.0)
+
+
+def test_tag_limit_from_settings(monkeypatch):
+    monkeypatch.setitem(ratelimit.settings.values, "RATE_LIMIT_PRODUCTS", "5/minute")
+    monkeypatch.setitem(ratelimit.settings.values, "RATE_LIMIT_UPLOADS", "0")
+
+    assert tag_limit("Products") == Limit(5, 5 / 60)
+    assert tag_limit("Uploads") is None
+
+
+@pytest.mark.parametrize("method, path, bucket, limit", [
+    ("GET", "/products/", "Products", DEFAULT_LIMIT),
+    ("POST", "/products/bulk", "Products", DEFAULT_LIMIT),
+    ("GET", "/products/export", "Products", DEFAULT_LIMIT),
+    ("GET", "/products/search", "Products", DEFAULT_LIMIT),
+    ("GET", "/business/", "Business", DEFAULT_LIMIT),
+    ("POST", "/uploadfiles/profile", "Uploads", Limit(60, 1.0)),
+    ("POST", "/token", "POST /token", ratelimit.ROUTE_LIMITS["POST", "/token"]),
+    ("POST", "/users/", "POST /users/", ratelimit.ROUTE_LIMITS["POST", "/users/"]),
+])
+def test_every_api_route_is_limited(client, method, path, bucket, limit):
+    import main
+
+    middleware = RateLimitMiddleware(main.app, store=MemoryStore())
+    scope = {"type": "http", "method": method, "path": path, "root_path": "", "app": main.app}
+
+    _, _, matched_bucket, matched_limit = middleware.route_limits(scope)
+
+    assert (matched_bucket, matched_limit) == (bucket, limit)
+
+
+def test_static_files_are_not_limited(client):
+    import main
+
+    middleware = RateLimitMiddleware(main.app, store=MemoryStore())
+    scope = {"type": "http", "method": "GET", "path": "/static/images/logo.png", "root_path": "", "app": main.app}
+
+    assert middleware.route_limits(scope) is None
+
+
+@pytest.fixture
+def limited_app(monkeypatch):
+    monkeypatch.setattr(ratelimit, "DEFAULT_LIMIT", Limit(2, 0.01))
+    monkeypatch.setattr(ratelimit, "LOGIN_FAILURE_LIMIT", Limit(2, 0.01))
+    app = FastAPI()
+
+    @app.get("/items", tags=["Items"])
+    async def items():
+        return {"items": []}
+
+    @app.post("/token", tags=["Authentication"])
+    async def token(username: str = Form(""), password: str = Form("")):
+        if password != "right":
+            raise HTTPException(status_code=401)
+        return {"access_token": "token"}
+
+    app.add_middleware(RateLimitMiddleware, store=MemoryStore())
+    return TestClient(app)
+
+
+def test_requests_over_the_limit_get_429(limited_app):
+    statuses = [limited_app.get("/items").status_code for _ in range(3)]
+
+    assert statuses == [200, 200, 429]
+    assert int(limited_app.get("/items").headers["retry-after"]) >= 1
+
+
+def test_failed_logins_lock_out_only_that_username(limited_app):
+    def login(username, password):
+        return limited_app.post("/token", data={"username": username, "password": password}).status_code
+
+    assert [login("victim", "wrong") for _ in range(3)] == [401, 401, 429]
+    assert login("victim", "right") == 429
+    assert login("someone", "right") == 200
@@ -0,0 +1,68 @@
+import pytest
+
+from search import edit_distance, rebuild_index
+
+
+def search(client, q):
+    body = client.get("/products/search", params={"q": q}).json()
+    return [product["id"] for product in body["data"]], body["relaxed"]
+
+
+@pytest.mark.parametrize("a, b, distance", [
+    ("keyboard", "keyboard", 0),
+    ("keybaord", "keyboard", 1),
+    ("kyeboard", "keyboard", 1),
+    ("keyboards", "keyboard", 1),
+    ("keybrd", "keyboard", 2),
+    ("lamp", "", 4),
+])
+def test_edit_distance(a, b, distance):
+    assert edit_distance(a, b) == distance
+
+
+def test_name_matches_rank_above_category_matches(client, account):
+    in_category = account.add_product(client, product_name="stand", category="bassoon")
+    in_name = account.add_product(client, product_name="bassoon reed", category="music")
+
+    assert search(client, "bassoon") == ([in_name["id"], in_category["id"]], False)
+    assert search(client, "bass reed") == ([in_name["id"]], False)
+
+
+def test_typos_anywhere_in_a_word_are_tolerated(client, account):
+    product = account.add_product(client, product_name="xylophone mallets")
+
+    for q in ("xylophnoe", "xlyophone", "xylophones", "ylophone", "mallets xylophnoe"):
+        assert search(client, q) == ([product["id"]], True), q
+
+
+def test_index_follows_create_update_and_delete(client, account):
+    product = account.add_product(client, product_name="harpsichord")
+    assert search(client, "harpsichord") == ([product["id"]], False)
+
+    client.put(
+        f"/products/{product['id']}", headers=account.headers,
+        json={"product_name": "clavichord", "category": "home", "original_price": 100, "new_price": 80},
+    )
+    assert search(client, "clavichord") == ([product["id"]], False)
+    assert search(client, "harpsichord")[0] == []
+
+    client.delete(f"/products/{product['id']}", headers=account.headers)
+    assert search(client, "clavichord")[0] == []
+
+
+def test_index_follows_business_changes(client, account):
+    product = account.add_product(client, product_name="ocarina")
+
+    client.put(f"/business/{account.business_id}", headers=account.headers, json={"businessname": "Tanpura House", "city": "Sylhet"})
+
+    assert search(client, "tanpura ocarina") == ([product["id"]], False)
+    assert search(client, "tanpuar") == ([product["id"]], True)
+
+
+def test_rebuilt_index_keeps_its_vocabulary(client, account, run):
+    product = account.add_product(client, product_name="walnut keyboard")
+
+    run(rebuild_index)
+
+    assert search(client, "keybaord") == ([product["id"]], True)
+    assert search(client, "walnut keyboard") == ([product["id"]], False)
@@ -0,0 +1,111 @@
+import asyncio
+import io
+import os
+import threading
+
+from fastapi import UploadFile
+from PIL import Image
+
+import images
+import storage
+from images import variant_names
+from models import ImageBlob
+from worker_pool import WorkerPool
+
+DIRECTORY = "static/images/products"
+
+
+def png(color) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 48), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def upload(content: bytes) -> UploadFile:
+    return UploadFile(io.BytesIO(content), filename="photo.png")
+
+
+def files_of(names: dict) -> list:
+    return [os.path.exists(os.path.join(DIRECTORY, name)) for name in names.values()]
+
+
+def refcount(run, names: dict):
+    blob = run(lambda: ImageBlob.get_or_none(path=f"{DIRECTORY}/{names['medium']}"))
+    return blob and blob.refcount
+
+
+def test_identical_uploads_share_files_until_the_last_release(run):
+    content = png("red")
+    first = run(storage.store_image, upload(content), DIRECTORY)
+    second = run(storage.store_image, upload(content), DIRECTORY)
+
+    assert first == second == variant_names(first["medium"].rsplit(".", 1)[0], "png")
+    assert refcount(run, first) == 2 and all(files_of(first))
+
+    run(storage.release, DIRECTORY, first["medium"])
+    assert refcount(run, first) == 1 and all(files_of(first))
+
+    run(storage.release, DIRECTORY, first["medium"])
+    assert refcount(run, first) is None and not any(files_of(first))
+
+
+def test_release_leaves_untracked_images_alone(run):
+    with open(os.path.join(DIRECTORY, "productDefault.jpg"), "wb") as default:
+        default.write(b"placeholder")
+
+    run(storage.release, DIRECTORY, "productDefault.jpg")
+
+    assert os.path.exists(os.path.join(DIRECTORY, "productDefault.jpg"))
+
+
+def test_upload_during_last_release_keeps_its_files(run, monkeypatch):
+    remove = storage.remove_quietly
+
+    async def slow_remove(path):
+        await asyncio.sleep(0.02)
+        await remove(path)
+
+    monkeypatch.setattr(storage, "remove_quietly", slow_remove)
+    content = png("blue")
+
+    async def scenario():
+        names = await storage.store_image(upload(content), DIRECTORY)
+        releasing = asyncio.create_task(storage.release(DIRECTORY, names["medium"]))
+        await asyncio.sleep(0.01)  # the release has dropped the row and is removing files
+        again = await storage.store_image(upload(content), DIRECTORY)
+        await releasing
+        return again
+
+    names = run(scenario)
+
+    assert refcount(run, names) == 1
+    assert all(files_of(names))
+
+
+def test_concurrent_uploads_of_a_new_image(run, monkeypatch):
+    content = png("green")
+    # Both renders write each file before either moves it into place.
+    in_step = threading.Barrier(2, timeout=5)
+    save = Image.Image.save
+
+    def save_in_step(image, *args, **kwargs):
+        save(image, *args, **kwargs)
+        in_step.wait()
+
+    monkeypatch.setattr(Image.Image, "save", save_in_step)
+    pool = WorkerPool("images", workers=2)
+    monkeypatch.setattr(images, "image_pool", pool)
+
+    async def scenario():
+        return await asyncio.gather(*(storage.store_image(upload(content), DIRECTORY) for _ in range(2)))
+
+    try:
+        first, second = run(scenario)
+    finally:
+        pool.shutdown()
+
+    assert first == second
+    assert refcount(run, first) == 2 and all(files_of(first))
+    assert not [name for name in os.listdir(DIRECTORY) if name.endswith(".tmp")]
+    with Image.open(os.path.join(DIRECTORY, first["full"])) as image:
+        image.load()
@@ -0,0 +1,58 @@
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+import asyncio
+import os
+
+
+class WorkerPool:
+    """Runs blocking work off the event loop, with at most `max_concurrency` jobs submitted at once."""
+
+    def __init__(self, name: str, kind: str = "thread", workers: int = None, max_concurrency: int = None):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown executor kind for {name}: {kind}")
+        self.name = name
+        self.kind = kind
+        self.workers = workers or os.cpu_count() or 1
+        self.max_concurrency = max_concurrency or self.workers
+        self.queued = 0
+        self.in_flight = 0
+        self.completed = 0
+        self._executor: Executor = None
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=self.name)
+        return self._executor
+
+    async def run(self, fn, *args):
+        self.queued += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.queued -= 1
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "kind": self.kind,
+            "workers": self.workers,
+            "max_concurrency": self.max_concurrency,
+            "queued": self.queued,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None